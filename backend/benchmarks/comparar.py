@@ -0,0 +1,58 @@
+"""
+Compara dos resultados de benchmarks.suite y marca las regresiones.
+
+    python -m benchmarks.comparar base.json nuevo.json --tolerancia 10
+
+Para las latencias (p50_ms, p99_ms) más es peor; para filas_por_segundo,
+menos es peor. Termina con código 1 si alguna métrica empeora más que la
+tolerancia (en porcentaje), para poder usarlo en CI.
+"""
+
+import argparse
+import json
+import sys
+
+# Métricas comparadas y si un valor mayor es mejor
+METRICAS = {'p50_ms': False, 'p99_ms': False, 'filas_por_segundo': True}
+
+
+def _aplanar(resultados, prefijo=''):
+    for clave, valor in resultados.items():
+        if isinstance(valor, dict) and not (METRICAS.keys() & valor.keys()):
+            yield from _aplanar(valor, f'{prefijo}{clave}.')
+        elif isinstance(valor, dict):
+            yield f'{prefijo}{clave}', valor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('nuevo')
+    parser.add_argument('--tolerancia', type=float, default=10.0, help='Empeoramiento permitido, en porcentaje.')
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = dict(_aplanar(json.load(f)['resultados']))
+    with open(args.nuevo) as f:
+        nuevo = dict(_aplanar(json.load(f)['resultados']))
+
+    regresiones = 0
+    for escenario in sorted(base.keys() & nuevo.keys()):
+        for metrica, mayor_es_mejor in METRICAS.items():
+            antes = base[escenario].get(metrica)
+            despues = nuevo[escenario].get(metrica)
+            if not antes or despues is None:
+                continue
+            cambio = (despues - antes) / antes * 100
+            empeora = -cambio if mayor_es_mejor else cambio
+            marca = ''
+            if empeora > args.tolerancia:
+                marca = '  <-- REGRESIÓN'
+                regresiones += 1
+            print(f'{escenario:45} {metrica:18} {antes:>12} -> {despues:>12} ({cambio:+.1f}%){marca}')
+
+    sys.exit(1 if regresiones else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Generación de datos para los benchmarks.
+
+Los productos siguen la forma de inicial_test.csv (id_venta, price, cost,
+id_fabrica, qty, description) y los códigos el formato BI0000AA. Los
+movimientos se reparten entre tipos y ubicaciones con un generador
+aleatorio con semilla fija, así dos corridas siembran los mismos datos.
+"""
+
+import csv
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.utils import timezone
+
+from inventario.models import MovimientoInventario, Producto, Stock, Ubicacion
+from inventario.servicios import TAMANO_LOTE
+
+SEMILLA = 20250101
+
+# Largos de historial de los productos usados para medir el Kardex
+HISTORIALES_KARDEX = (10, 100, 1_000, 10_000)
+
+# Tipos de movimiento sembrados y su peso relativo
+PESOS_TIPOS = {
+    MovimientoInventario.TIPO_VENTA: 5,
+    MovimientoInventario.TIPO_TRANSFERENCIA_SALIDA: 2,
+    MovimientoInventario.TIPO_ENTRADA_COMPRA: 2,
+    MovimientoInventario.TIPO_MERMA: 1,
+}
+
+PALABRAS = ('Vestido', 'Gorra', 'Polera', 'Pantalón', 'Chaqueta', 'Falda', 'Zapatilla', 'Bufanda')
+COLORES = ('Azul', 'Rojo', 'Negro', 'Blanco', 'Verde', 'Floral', 'Estampado', 'Beige')
+
+
+def codigo_producto(i):
+    """Código de venta número `i`: BI0000AA, BI0001AA, ..., BI9999AA, BI0000BA, ..."""
+    return f'BI{i % 10000:04d}{chr(65 + (i // 10000) % 26)}{chr(65 + (i // 260000) % 26)}'
+
+
+def fila_producto(i, rnd):
+    precio = rnd.randrange(1000, 60000, 10)
+    return {
+        'id_venta': codigo_producto(i),
+        'price': f'{precio:.2f}',
+        'cost': f'{precio * 0.45:.2f}',
+        'id_fabrica': f'FAB-{i:06d}-{chr(65 + i % 26)}',
+        'qty': rnd.randint(0, 500),
+        'description': f'{rnd.choice(PALABRAS)} {rnd.choice(COLORES)} {i}',
+    }
+
+
+def _csv(columnas, filas):
+    salida = io.StringIO()
+    escritor = csv.DictWriter(salida, fieldnames=columnas)
+    escritor.writeheader()
+    escritor.writerows(filas)
+    return salida.getvalue().encode()
+
+
+def csv_carga_inicial(desde, cantidad):
+    rnd = random.Random(SEMILLA + desde)
+    return _csv(
+        ['id_venta', 'price', 'cost', 'id_fabrica', 'qty', 'description'],
+        (fila_producto(i, rnd) for i in range(desde, desde + cantidad)),
+    )
+
+
+def csv_transferencia(codigos):
+    return _csv(
+        ['cod_venta', 'description', 'price', 'qty'],
+        ({'cod_venta': codigo, 'description': '', 'price': '0', 'qty': 1} for codigo in codigos),
+    )
+
+
+def csv_ventas(codigos, lugar):
+    fecha = timezone.localdate().isoformat()
+    return _csv(
+        ['timestamp', 'lugar', 'id_fabrica', 'id_venta', 'description', 'price'],
+        (
+            {'timestamp': f'{fecha} 12:00', 'lugar': lugar, 'id_fabrica': '', 'id_venta': codigo, 'description': '', 'price': '0'}
+            for codigo in codigos
+        ),
+    )
+
+
+@contextmanager
+def _fecha_hora_manual():
+    # fecha_hora es auto_now_add: se desactiva mientras se siembra para repartir las fechas
+    campo = MovimientoInventario._meta.get_field('fecha_hora')
+    campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        campo.auto_now_add = True
+
+
+def sembrar(productos, ubicaciones, movimientos, dias=365):
+    """
+    Crea `productos` productos, `ubicaciones` ubicaciones (una bodega principal
+    y puntos de venta) con stock y `movimientos` movimientos repartidos en los
+    últimos `dias` días. Los primeros productos reciben exactamente los
+    historiales de HISTORIALES_KARDEX. Devuelve (bodega, puntos de venta).
+    """
+    rnd = random.Random(SEMILLA)
+
+    bodega = Ubicacion.objects.create(nombre='Bodega Central', tipo=Ubicacion.TIPO_BODEGA_PRINCIPAL)
+    puntos = [
+        Ubicacion.objects.create(nombre=f'Tienda {n}', tipo=Ubicacion.TIPO_PUNTO_FIJO)
+        for n in range(1, max(ubicaciones, 2))
+    ]
+
+    for desde in range(0, productos, TAMANO_LOTE):
+        filas = [fila_producto(i, rnd) for i in range(desde, min(desde + TAMANO_LOTE, productos))]
+        Producto.objects.bulk_create([
+            Producto(
+                cod_venta=fila['id_venta'], descripcion=fila['description'], precio=fila['price'],
+                costo=fila['cost'], id_fabrica=fila['id_fabrica'],
+            )
+            for fila in filas
+        ])
+        Stock.objects.bulk_create(
+            [Stock(producto_id=fila['id_venta'], ubicacion=bodega, cantidad=fila['qty']) for fila in filas]
+            + [Stock(producto_id=fila['id_venta'], ubicacion=punto, cantidad=rnd.randint(0, 50)) for fila in filas for punto in puntos]
+        )
+
+    # Productos con historial fijo para el Kardex; el resto se reparte al azar
+    especiales = [largo for largo in HISTORIALES_KARDEX if largo <= movimientos]
+    asignados = []
+    for i, largo in enumerate(especiales):
+        asignados.extend([codigo_producto(i)] * largo)
+    restantes = max(movimientos - len(asignados), 0)
+    inicio_azar = len(especiales) if productos > len(especiales) else 0
+
+    def producto_al_azar():
+        return codigo_producto(rnd.randrange(inicio_azar, productos))
+
+    tipos = list(PESOS_TIPOS)
+    pesos = list(PESOS_TIPOS.values())
+    ahora = timezone.now()
+    paso = timedelta(days=dias) / max(movimientos, 1)
+
+    def nuevo(n, codigo):
+        tipo = rnd.choices(tipos, pesos)[0]
+        punto = rnd.choice(puntos)
+        origen, destino = {
+            MovimientoInventario.TIPO_VENTA: (punto, None),
+            MovimientoInventario.TIPO_TRANSFERENCIA_SALIDA: (bodega, punto),
+            MovimientoInventario.TIPO_ENTRADA_COMPRA: (None, bodega),
+            MovimientoInventario.TIPO_MERMA: (punto, None),
+        }[tipo]
+        return MovimientoInventario(
+            producto_id=codigo, tipo=tipo, cantidad=rnd.randint(1, 5),
+            fecha_hora=ahora - paso * n, ubicacion_origen=origen, ubicacion_destino=destino,
+            detalle='benchmark',
+        )
+
+    codigos = iter(asignados + [None] * restantes)
+    rnd_orden = list(range(len(asignados) + restantes))
+    rnd.shuffle(rnd_orden)
+    with _fecha_hora_manual():
+        lote = []
+        for n in rnd_orden:
+            codigo = next(codigos) or producto_al_azar()
+            lote.append(nuevo(n, codigo))
+            if len(lote) == TAMANO_LOTE:
+                MovimientoInventario.objects.bulk_create(lote)
+                lote = []
+        MovimientoInventario.objects.bulk_create(lote)
+
+    return bodega, puntos
@@ -0,0 +1,130 @@
+"""
+Compara los planes de ejecución de las consultas sobre MovimientoInventario
+sin y con los índices de las migraciones 0004_indices_movimientos y
+0006_indice_reportes.
+
+Requiere PostgreSQL y usa la base de benchmarks.settings. Se ejecuta desde backend/:
+
+    BENCH_MOTOR=postgresql python -m benchmarks.planes_indices --sembrar --filas 10000000
+
+Con --sembrar se completa la tabla de movimientos hasta --filas registros
+usando generate_series (no pasa por el ORM). Los índices se eliminan dentro
+de una transacción que se revierte al final, así que la base queda como estaba.
+Solo corre sobre una base cuyo nombre contenga "bench": sembrar millones de
+filas o eliminar índices, aunque sea dentro de una transacción, bloquea la
+tabla de movimientos y nunca debe hacerse en la base de producción.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+from django.db.models.functions import TruncMonth  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from inventario.models import MovimientoInventario, Producto  # noqa: E402
+
+INDICES = [
+    'mov_producto_fecha_idx',
+    'mov_fecha_id_idx',
+    'mov_tipo_fecha_idx',
+    'mov_venta_fecha_idx',
+    'mov_venta_producto_idx',
+    'mov_fecha_brin_idx',
+]
+
+
+def sembrar(filas, productos):
+    """Completa las tablas de productos y movimientos hasta los tamaños pedidos."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO inventario_producto
+                (cod_venta, descripcion, precio, costo, id_fabrica, stock_minimo, stock_critico, stock_maximo)
+            SELECT 'BI' || lpad((i % 10000)::text, 4, '0') || chr(65 + (i / 10000) % 26) || chr(65 + (i / 260000) % 26),
+                   'Producto ' || i, 10000, 5000, 'FAB-' || i, 0, 0, 0
+            FROM generate_series(0, %s - 1) AS i
+            ON CONFLICT DO NOTHING
+            """,
+            [productos],
+        )
+        faltantes = filas - MovimientoInventario.objects.count()
+        if faltantes <= 0:
+            return
+        cursor.execute(
+            """
+            WITH codigos AS (SELECT array_agg(cod_venta) AS lista FROM inventario_producto)
+            INSERT INTO inventario_movimientoinventario (producto_id, tipo, cantidad, fecha_hora, detalle)
+            SELECT lista[1 + (g % array_length(lista, 1))],
+                   (ARRAY['venta', 'venta', 'venta', 'transferencia_salida', 'entrada_compra', 'merma'])[1 + (g % 6)],
+                   1 + (g % 5),
+                   now() - make_interval(secs => g * 3),
+                   'benchmark'
+            FROM codigos, generate_series(1, %s) AS g
+            """,
+            [faltantes],
+        )
+        cursor.execute('ANALYZE inventario_movimientoinventario')
+
+
+def consultas():
+    """Las consultas de dashboard_data, reportes_avanzados y el Kardex."""
+    producto = Producto.objects.order_by('cod_venta').first()
+    desde = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=30), time.min))
+    hasta = desde + timedelta(days=7)
+    ventas = MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_VENTA)
+    return {
+        'dashboard: ventas mensuales': ventas.annotate(mes=TruncMonth('fecha_hora')).values('mes').annotate(total=Sum('cantidad')).order_by('mes'),
+        'dashboard: top vendidos': ventas.values('producto').annotate(total=Sum('cantidad')).order_by('-total')[:5],
+        'reportes: página sin filtros': MovimientoInventario.objects.order_by('-fecha_hora', '-id')[:500],
+        'reportes: rango de fechas': MovimientoInventario.objects.filter(fecha_hora__gte=desde, fecha_hora__lt=hasta).order_by('-fecha_hora')[:500],
+        'reportes: tipo y rango': MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_VENTA, fecha_hora__gte=desde, fecha_hora__lt=hasta).order_by('-fecha_hora')[:500],
+        'kardex: movimientos del producto': MovimientoInventario.objects.filter(producto=producto).order_by('fecha_hora', 'id')[:200],
+    }
+
+
+def explicar(titulo):
+    print(f'\n===== {titulo} =====')
+    for nombre, queryset in consultas().items():
+        print(f'\n--- {nombre} ---')
+        print(queryset.explain(analyze=True, buffers=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sembrar', action='store_true', help='Completar la tabla de movimientos antes de medir.')
+    parser.add_argument('--filas', type=int, default=10_000_000, help='Cantidad de movimientos a sembrar.')
+    parser.add_argument('--productos', type=int, default=50_000, help='Cantidad de productos a sembrar.')
+    args = parser.parse_args()
+
+    if connection.vendor != 'postgresql':
+        sys.exit('Este benchmark requiere PostgreSQL (BENCH_MOTOR=postgresql, ver benchmarks/settings.py).')
+    if 'bench' not in connection.settings_dict['NAME']:
+        sys.exit(f'La base "{connection.settings_dict["NAME"]}" no parece de benchmarks: su nombre debe contener "bench".')
+
+    if args.sembrar:
+        sembrar(args.filas, args.productos)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for indice in INDICES:
+                cursor.execute(f'DROP INDEX IF EXISTS {indice}')
+        explicar('SIN índices')
+        transaction.set_rollback(True)
+
+    explicar('CON índices')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Settings para los benchmarks: los de core.settings con una base de datos
+propia, elegida con la variable de entorno BENCH_MOTOR.
+
+    BENCH_MOTOR=sqlite       (por defecto) archivo BENCH_SQLITE, se recrea en cada corrida
+    BENCH_MOTOR=postgresql   servidor local, sin docker; se configura con
+                             BENCH_PG_NAME, BENCH_PG_USER, BENCH_PG_PASSWORD,
+                             BENCH_PG_HOST y BENCH_PG_PORT
+
+La base de datos se vacía antes de sembrar: no apuntar nunca a la de producción.
+"""
+
+import os
+import tempfile
+
+from core.settings import *  # noqa: F401,F403
+
+if os.environ.get('BENCH_MOTOR', 'sqlite') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('BENCH_PG_NAME', 'facboa_bench'),
+            'USER': os.environ.get('BENCH_PG_USER', os.environ.get('USER', 'postgres')),
+            'PASSWORD': os.environ.get('BENCH_PG_PASSWORD', ''),
+            'HOST': os.environ.get('BENCH_PG_HOST', 'localhost'),
+            'PORT': os.environ.get('BENCH_PG_PORT', '5432'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BENCH_SQLITE', os.path.join(tempfile.gettempdir(), 'facboa_bench.sqlite3')),
+        }
+    }
+
+# Cache en memoria del proceso: no se mezcla con el de desarrollo
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+ALLOWED_HOSTS = ['*']
+DEBUG = False
+MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'facboa_bench_media')
+
+# Sin la línea de métricas por petición: ensuciaría la salida de la suite
+LOGGING['loggers']['inventario']['level'] = 'WARNING'  # noqa: F405
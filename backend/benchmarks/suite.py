@@ -0,0 +1,246 @@
+"""
+Suite de benchmarks de la API de inventario.
+
+Siembra una base de datos propia (ver benchmarks/settings.py), mide cada
+escenario pasando por la pila completa de Django (django.test.Client) y
+guarda los resultados en JSON para comparar entre commits con
+benchmarks.comparar. Se ejecuta desde backend/:
+
+    python -m benchmarks.suite --productos 20000 --movimientos 500000 --salida base.json
+
+Escenarios:
+    ingesta        filas por segundo de carga inicial, transferencia y ventas (?sincrono=1)
+    kardex         latencia de la primera página según el largo del historial
+    dashboard      con el cache vacío y con el cache lleno
+    reportes       primera página con y sin filtros, y JSON lines completo
+    busqueda       prefijos, códigos completos y descripciones, sin y con catálogo
+
+PostgreSQL sin docker: crear un cluster local y pasar --motor postgresql.
+
+    initdb -D /tmp/facboa_pg && pg_ctl -D /tmp/facboa_pg -o "-p 5433" -l /tmp/facboa_pg.log start
+    createdb -p 5433 facboa_bench
+    BENCH_PG_PORT=5433 python -m benchmarks.suite --motor postgresql
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--motor', choices=['sqlite', 'postgresql'], default=os.environ.get('BENCH_MOTOR', 'sqlite'))
+    parser.add_argument('--productos', type=int, default=5_000)
+    parser.add_argument('--ubicaciones', type=int, default=5, help='Incluye la bodega principal.')
+    parser.add_argument('--movimientos', type=int, default=100_000)
+    parser.add_argument('--filas-csv', type=int, default=5_000, help='Filas de cada archivo de ingesta.')
+    parser.add_argument('--repeticiones', type=int, default=50, help='Peticiones por escenario de latencia.')
+    parser.add_argument('--escenarios', nargs='*', default=None, help='Ejecutar solo estos escenarios.')
+    parser.add_argument('--salida', default='benchmark.json', help='Archivo JSON de resultados.')
+    return parser.parse_args()
+
+
+args = _argumentos()
+os.environ['BENCH_MOTOR'] = args.motor
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from benchmarks import generador  # noqa: E402
+from inventario.cache_dashboard import invalidar_dashboard  # noqa: E402
+from inventario.catalogo import invalidar_catalogo  # noqa: E402
+from inventario.models import Usuario  # noqa: E402
+from inventario.resumenes import reconstruir_ventas_diarias  # noqa: E402
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)]
+
+
+def medir(peticion, repeticiones, preparar=None):
+    """Ejecuta `peticion()` varias veces y devuelve la latencia en milisegundos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        respuesta = peticion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        if respuesta.status_code >= 400:
+            raise RuntimeError(f'La petición falló con {respuesta.status_code}: {respuesta.content[:200]!r}')
+    return {
+        'n': repeticiones,
+        'p50_ms': round(percentil(tiempos, 50), 3),
+        'p99_ms': round(percentil(tiempos, 99), 3),
+        'media_ms': round(sum(tiempos) / len(tiempos), 3),
+    }
+
+
+def medir_ingesta(cliente, url, nombre, contenido, filas):
+    inicio = time.perf_counter()
+    respuesta = cliente.post(url, {'file': SimpleUploadedFile(nombre, contenido)})
+    segundos = time.perf_counter() - inicio
+    if respuesta.status_code != 200:
+        raise RuntimeError(f'La ingesta falló con {respuesta.status_code}: {respuesta.content[:200]!r}')
+    return {'filas': filas, 'segundos': round(segundos, 3), 'filas_por_segundo': round(filas / segundos, 1)}
+
+
+def escenario_ingesta(cliente, puntos):
+    filas = args.filas_csv
+    punto = puntos[0]
+    codigos = [generador.codigo_producto(i) for i in range(args.productos, args.productos + filas)]
+    return {
+        'carga_inicial': medir_ingesta(
+            cliente, '/api/carga-inicial-csv/?sincrono=1', 'inicial.csv',
+            generador.csv_carga_inicial(args.productos, filas), filas,
+        ),
+        'transferencia': medir_ingesta(
+            cliente, '/api/transferencia-csv/?sincrono=1', f'tras_bod_{punto.nombre}_20250101.csv',
+            generador.csv_transferencia(codigos), filas,
+        ),
+        'ventas_diarias': medir_ingesta(
+            cliente, '/api/ventas-diarias-csv/?sincrono=1', f'{punto.nombre.replace(" ", "_")}_20250101.csv',
+            generador.csv_ventas(codigos, punto.nombre), filas,
+        ),
+    }
+
+
+def escenario_kardex(cliente, puntos):
+    resultados = {}
+    for i, largo in enumerate(generador.HISTORIALES_KARDEX):
+        if largo > args.movimientos:
+            break
+        codigo = generador.codigo_producto(i)
+        resultados[f'historial_{largo}'] = medir(lambda: cliente.get(f'/api/trazabilidad/{codigo}/'), args.repeticiones)
+    return resultados
+
+
+def escenario_dashboard(cliente, puntos):
+    return {
+        'sin_cache': medir(lambda: cliente.get('/api/dashboard-data/'), args.repeticiones, preparar=invalidar_dashboard),
+        'con_cache': medir(lambda: cliente.get('/api/dashboard-data/'), args.repeticiones),
+    }
+
+
+def escenario_reportes(cliente, puntos):
+    hoy = timezone.localdate()
+    semana = f'fecha_inicio={(hoy - timedelta(days=37)).isoformat()}&fecha_fin={(hoy - timedelta(days=30)).isoformat()}'
+    resultados = {
+        'primera_pagina': medir(lambda: cliente.get('/api/reportes/'), args.repeticiones),
+        'tipo_venta': medir(lambda: cliente.get('/api/reportes/?tipo_movimiento=venta'), args.repeticiones),
+        'rango_7_dias': medir(lambda: cliente.get(f'/api/reportes/?{semana}'), args.repeticiones),
+        'ubicacion': medir(lambda: cliente.get(f'/api/reportes/?ubicacion_id={puntos[0].pk}'), args.repeticiones),
+    }
+
+    inicio = time.perf_counter()
+    respuesta = cliente.get('/api/reportes/?formato=jsonl')
+    filas = sum(bloque.count(b'\n') for bloque in respuesta.streaming_content)
+    segundos = time.perf_counter() - inicio
+    resultados['jsonl_completo'] = {'filas': filas, 'segundos': round(segundos, 3), 'filas_por_segundo': round(filas / segundos, 1)}
+    return resultados
+
+
+def escenario_busqueda(cliente, puntos):
+    consultas = {
+        'prefijo_corto': 'BI00',
+        'prefijo_largo': 'BI0012',
+        'codigo_completo': generador.codigo_producto(min(42, args.productos - 1)),
+        'codigo_fabrica': f'FAB-{min(42, args.productos - 1):06d}',
+        'descripcion': 'vestido azul',
+    }
+    resultados = {}
+    for nombre, texto in consultas.items():
+        resultados[f'{nombre}_sin_catalogo'] = medir(
+            lambda: cliente.get('/api/productos/buscar/', {'q': texto}), args.repeticiones, preparar=invalidar_catalogo,
+        )
+        resultados[f'{nombre}_con_catalogo'] = medir(lambda: cliente.get('/api/productos/buscar/', {'q': texto}), args.repeticiones)
+    return resultados
+
+
+ESCENARIOS = {
+    'kardex': escenario_kardex,
+    'dashboard': escenario_dashboard,
+    'reportes': escenario_reportes,
+    'busqueda': escenario_busqueda,
+    # La ingesta modifica los datos: va al final
+    'ingesta': escenario_ingesta,
+}
+
+
+def preparar_base():
+    if connection.vendor == 'sqlite':
+        connection.close()
+        Path(settings.DATABASES['default']['NAME']).unlink(missing_ok=True)
+    call_command('migrate', verbosity=0)
+    call_command('flush', interactive=False, verbosity=0)
+
+    inicio = time.perf_counter()
+    bodega, puntos = generador.sembrar(args.productos, args.ubicaciones, args.movimientos)
+    reconstruir_ventas_diarias()
+    call_command('generar_cierre_stock', verbosity=0)
+    return puntos, round(time.perf_counter() - inicio, 1)
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    print(f'Sembrando {args.productos} productos y {args.movimientos} movimientos en {connection.vendor}...')
+    puntos, segundos_siembra = preparar_base()
+
+    usuario = Usuario.objects.create_superuser('benchmark', password='benchmark', perfil=Usuario.PERFIL_ADMIN)
+    cliente = Client()
+    cliente.force_login(usuario)
+
+    resultados = {}
+    for nombre, escenario in ESCENARIOS.items():
+        if args.escenarios and nombre not in args.escenarios:
+            continue
+        print(f'Midiendo {nombre}...')
+        resultados[nombre] = escenario(cliente, puntos)
+
+    informe = {
+        'meta': {
+            'commit': _commit(),
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'productos': args.productos,
+            'ubicaciones': args.ubicaciones,
+            'movimientos': args.movimientos,
+            'filas_csv': args.filas_csv,
+            'repeticiones': args.repeticiones,
+            'segundos_siembra': segundos_siembra,
+        },
+        'resultados': resultados,
+    }
+    Path(args.salida).write_text(json.dumps(informe, indent=2, ensure_ascii=False))
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    print(f'Resultados guardados en {args.salida}')
+
+
+if __name__ == '__main__':
+    main()
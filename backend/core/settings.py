@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 '''
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,12 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventario.metricas.MetricasMiddleware',  # Primero, para medir la petición completa
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventario.sesiones.RenovarSesionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,6 +92,56 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Por defecto se usa un cache en archivos, compartido por todos los procesos
+# del servidor (así una invalidación llega a todos los workers). Si se define
+# REDIS_URL se usa Redis.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tempfile.gettempdir(), 'facboa_cache'),
+        }
+    }
+
+# Segundos que se guarda el dashboard en cache (se invalida antes si cambian los datos)
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+# Máximo de entradas del catálogo de productos en memoria de cada proceso
+CATALOGO_CACHE_MAX = 100_000
+
+
+# Métricas por petición (ver inventario/metricas.py). Con METRICAS_EXPONER=1
+# se publican en /api/metrics/ en el formato de texto de Prometheus.
+METRICAS_EXPONER = os.environ.get('METRICAS_EXPONER') == '1'
+
+# Logging
+# Las líneas de inventario.metricas son JSON, una por petición.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'inventario': {
+            'handlers': ['console'],
+            'level': os.environ.get('INVENTARIO_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -124,6 +178,24 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Archivos subidos (las cargas CSV en segundo plano se guardan aquí mientras se procesan)
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Hilos dedicados a procesar importaciones CSV en segundo plano (por proceso)
+IMPORTACIONES_MAX_WORKERS = 2
+
+# Filas del CSV por bloque; cada bloque se aplica en su propia transacción
+IMPORTACIONES_TAMANO_BLOQUE = 5000
+
+# 'parcial': cada bloque se confirma por separado (se puede retomar).
+# 'todo': el archivo entero en una transacción; una sola fila con error deja
+# el archivo sin aplicar. Se puede elegir por carga con ?modo=
+IMPORTACIONES_MODO = 'parcial'
+
+# Segundos sin avance tras los cuales una importación en proceso se da por
+# detenida (proceso reiniciado, hilo caído) y se vuelve a encolar
+IMPORTACIONES_TIEMPO_INACTIVO = 900
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -150,8 +222,13 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 # Configuración de la sesión
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
-SESSION_SAVE_EVERY_REQUEST = True
+# Las sesiones se leen del cache y solo se escriben al cambiar: la expiración
+# se extiende cuando quedan menos de SESSION_RENOVACION_UMBRAL segundos
+# (ver inventario/sesiones.py), no en cada petición.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_COOKIE_AGE = 60 * 60 * 24 * 14  # 2 semanas
+SESSION_RENOVACION_UMBRAL = 60 * 60 * 24 * 7
 
 # ... (última línea del archivo) ...
 
@@ -171,8 +248,10 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'id',
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'PERMISSION_CLASSES': ('rest_framework.permissions.IsAuthenticated',),
+    # Agrega el perfil del usuario como claim (ver inventario/autenticacion.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'inventario.autenticacion.TokenPerfilSerializer',
 }
 
 
@@ -181,8 +260,11 @@ SESSION_COOKIE_DOMAIN = None
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.SessionAuthentication',         # 1. Intenta con Sesión (la que queremos)
-        'rest_framework_simplejwt.authentication.JWTAuthentication', # 2. Si no, intenta con JWT
+        # 1. Token Bearer: el usuario sale de los claims, sin consultar la base
+        #    ni la sesión. Sin cabecera Authorization se pasa al siguiente.
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
+        # 2. Sesión (frontend web), con su verificación CSRF
+        'rest_framework.authentication.SessionAuthentication',
     ]
 }
 
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import Usuario, Ubicacion, Producto, Stock, MovimientoInventario
+from .models import Usuario, Ubicacion, Producto, Stock, MovimientoInventario, TrabajoImportacion, CierreStock, VentaDiaria, ProductoStockTotal, RegistroIngesta
+from .servicios import recalcular_totales, registrar_ajustes
 
 # --- Paso 1: Registrar nuestro modelo de usuario personalizado ---
 # Ya no necesitamos desregistrar el User por defecto.
@@ -71,9 +72,66 @@ class StockAdmin(admin.ModelAdmin):
     list_filter = ('ubicacion',)
     search_fields = ('producto__cod_venta', 'ubicacion__nombre')
 
+    # Aquí la cantidad se fija a mano: recalcular el total del producto y
+    # registrar la diferencia como ajuste. Los borrados los descuenta del total
+    # la señal de post_delete.
+    def save_model(self, request, obj, form, change):
+        previo = Stock.objects.select_related('ubicacion').get(pk=obj.pk) if change else None
+        if previo is None or (previo.producto_id, previo.ubicacion_id) == (obj.producto_id, obj.ubicacion_id):
+            cambios = [(obj.producto_id, obj.ubicacion, previo.cantidad if previo else 0, obj.cantidad)]
+        else:
+            # Se cambió el producto o la ubicación del registro
+            cambios = [(previo.producto_id, previo.ubicacion, previo.cantidad, 0), (obj.producto_id, obj.ubicacion, 0, obj.cantidad)]
+        super().save_model(request, obj, form, change)
+        recalcular_totales({producto_id for producto_id, _, _, _ in cambios})
+        registrar_ajustes(cambios, request.user.pk, 'Ajuste desde el admin')
+
+    def delete_model(self, request, obj):
+        registrar_ajustes([(obj.producto_id, obj.ubicacion, obj.cantidad, 0)], request.user.pk, 'Stock borrado desde el admin')
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        registrar_ajustes(
+            [(stock.producto_id, stock.ubicacion, stock.cantidad, 0) for stock in queryset.select_related('ubicacion')],
+            request.user.pk,
+            'Stock borrado desde el admin',
+        )
+        super().delete_queryset(request, queryset)
+
 @admin.register(MovimientoInventario)
 class MovimientoInventarioAdmin(admin.ModelAdmin):
     list_display = ('fecha_hora', 'producto', 'tipo', 'cantidad', 'usuario')
     list_filter = ('tipo', 'fecha_hora')
     search_fields = ('producto__cod_venta', 'usuario__username')
-    readonly_fields = ('fecha_hora',)
\ No newline at end of file
+    readonly_fields = ('fecha_hora',)
+
+@admin.register(CierreStock)
+class CierreStockAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'producto', 'ubicacion', 'cantidad')
+    list_filter = ('fecha', 'ubicacion')
+    search_fields = ('producto__cod_venta',)
+
+@admin.register(VentaDiaria)
+class VentaDiariaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'producto', 'ubicacion', 'unidades', 'ingresos')
+    list_filter = ('fecha', 'ubicacion')
+    search_fields = ('producto__cod_venta',)
+
+@admin.register(ProductoStockTotal)
+class ProductoStockTotalAdmin(admin.ModelAdmin):
+    list_display = ('producto', 'cantidad', 'stock_minimo', 'stock_critico', 'stock_maximo')
+    search_fields = ('producto__cod_venta',)
+    readonly_fields = ('producto', 'cantidad', 'stock_minimo', 'stock_critico', 'stock_maximo')
+
+@admin.register(TrabajoImportacion)
+class TrabajoImportacionAdmin(admin.ModelAdmin):
+    list_display = ('creado', 'tipo', 'nombre_archivo', 'estado', 'filas_procesadas', 'usuario')
+    list_filter = ('tipo', 'estado')
+    readonly_fields = ('creado', 'iniciado', 'actualizado', 'finalizado')
+
+@admin.register(RegistroIngesta)
+class RegistroIngestaAdmin(admin.ModelAdmin):
+    list_display = ('creado', 'tipo', 'nombre_archivo', 'ubicacion', 'fecha', 'estado', 'filas_confirmadas')
+    list_filter = ('tipo', 'estado')
+    search_fields = ('nombre_archivo', 'huella')
+    readonly_fields = ('clave', 'huella', 'creado', 'actualizado', 'completado')
@@ -0,0 +1,22 @@
+"""
+Tokens JWT para clientes de la API y terminales de tienda.
+
+Los datos del usuario que se necesitan para autorizar una petición viajan como
+claims del token. Así JWTStatelessUserAuthentication puede armar el usuario
+(un TokenUser) sin consultar la tabla de usuarios ni la de sesiones.
+"""
+
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+
+class TokenPerfilSerializer(TokenObtainPairSerializer):
+    """Emite el par de tokens con el perfil del usuario como claim."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.username
+        token['perfil'] = user.perfil
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
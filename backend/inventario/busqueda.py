@@ -0,0 +1,102 @@
+"""
+Búsqueda de productos para el autocompletado (ProductoBuscarView).
+
+Primero se prueba el camino rápido: productos cuyo código de venta empieza
+con el texto buscado, leídos en orden desde el índice del código. Si con eso
+no se llena el límite, se buscan coincidencias parciales en código de venta,
+código de fábrica y descripción, ordenadas por relevancia:
+
+    1. código de fábrica exacto
+    2. código de fábrica que empieza con el texto
+    3. código de venta o de fábrica que contiene el texto
+    4. descripción que contiene el texto (en PostgreSQL, ordenadas por similitud)
+
+En PostgreSQL las coincidencias parciales usan índices GIN de trigramas
+(pg_trgm, ver migración 0007); en SQLite se recorre la tabla, pero siempre
+con el límite de resultados.
+
+Los códigos exactos se resuelven con el catálogo en memoria y cada
+resultado queda guardado en él (ver inventario/catalogo.py), así las mismas
+búsquedas repetidas mientras se escribe no vuelven a la base de datos.
+"""
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .catalogo import CAMPOS_CATALOGO, ProductoCatalogo, catalogo
+from .models import Producto
+
+BUSQUEDA_LIMITE = 20
+BUSQUEDA_LIMITE_MAXIMO = 100
+
+
+def _con_prefijo_de_codigo(texto):
+    codigo = texto.upper()
+    if connection.vendor == 'postgresql':
+        # LIKE 'X%' sobre el índice varchar_pattern_ops del código
+        return Producto.objects.filter(cod_venta__startswith=codigo)
+    # En SQLite LIKE no usa índices; un rango sobre la clave primaria sí
+    return Producto.objects.filter(cod_venta__gte=codigo, cod_venta__lt=codigo + '\uffff')
+
+
+def _relevancia(texto):
+    # Los códigos de fábrica exactos ya vienen del catálogo
+    return Case(
+        When(id_fabrica__istartswith=texto, then=Value(1)),
+        When(Q(cod_venta__icontains=texto) | Q(id_fabrica__icontains=texto), then=Value(2)),
+        default=Value(3),
+        output_field=IntegerField(),
+    )
+
+
+def buscar_productos(texto, limite=BUSQUEDA_LIMITE):
+    """Devuelve hasta `limite` productos (ProductoCatalogo) que coinciden con `texto`, los más relevantes primero."""
+    texto = texto.strip()
+    return list(catalogo.recordar(('busqueda', texto.upper(), limite), lambda: tuple(_buscar(texto, limite))))
+
+
+def _registros(queryset):
+    return [ProductoCatalogo(*fila) for fila in queryset.values_list(*CAMPOS_CATALOGO)]
+
+
+def _buscar(texto, limite):
+    codigo = texto.upper()
+
+    # 1. Camino rápido: el código exacto, si existe, es el primero del prefijo.
+    #    Un código completo no puede ser prefijo de otro: basta con el catálogo.
+    if len(codigo) >= Producto._meta.get_field('cod_venta').max_length:
+        exacto = catalogo.obtener(codigo)
+        resultados = [exacto] if exacto else []
+    else:
+        resultados = _registros(_con_prefijo_de_codigo(texto).order_by('cod_venta')[:limite])
+    if len(resultados) == limite:
+        return resultados
+
+    # 2. Códigos de fábrica exactos, desde el catálogo
+    vistos = {producto.cod_venta for producto in resultados}
+    for producto in sorted(catalogo.por_id_fabrica(texto), key=lambda p: p.cod_venta):
+        if producto.cod_venta not in vistos and len(resultados) < limite:
+            resultados.append(producto)
+            vistos.add(producto.cod_venta)
+    if len(resultados) == limite:
+        return resultados
+
+    # 3. Coincidencias parciales en cualquiera de los tres campos
+    parciales = Producto.objects.filter(
+        Q(cod_venta__icontains=texto) | Q(id_fabrica__icontains=texto) | Q(descripcion__icontains=texto)
+    ).exclude(
+        pk__in=vistos
+    ).exclude(
+        id_fabrica__iexact=texto
+    ).annotate(relevancia=_relevancia(texto))
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        parciales = parciales.annotate(
+            similitud=TrigramSimilarity('descripcion', texto),
+        ).order_by('relevancia', '-similitud', 'cod_venta')
+    else:
+        parciales = parciales.order_by('relevancia', 'cod_venta')
+
+    resultados.extend(_registros(parciales[:limite - len(resultados)]))
+    return resultados
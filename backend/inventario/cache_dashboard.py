@@ -0,0 +1,39 @@
+"""
+Cache de la respuesta de dashboard_data.
+
+La respuesta se guarda bajo una versión que cambia cada vez que se escriben
+datos que la afectan (stock, movimientos, ventas). La versión sirve además
+de ETag, así un cliente con la versión vigente recibe un 304 sin que se
+ejecute ninguna consulta.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CLAVE_VERSION = 'dashboard:version'
+
+
+def version_dashboard():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def invalidar_dashboard():
+    # Se usa la hora y no un contador: si la clave se pierde, la nueva versión
+    # nunca coincide con la de una respuesta vieja que siga en el cache
+    cache.set(CLAVE_VERSION, time.time_ns(), timeout=None)
+
+
+def obtener_dashboard(version, calcular):
+    """Devuelve los datos del dashboard para `version`, calculándolos si no están en cache."""
+    clave = f'dashboard:datos:{version}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = calcular()
+        cache.set(clave, datos, timeout=getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 3600))
+    return datos
@@ -0,0 +1,158 @@
+"""
+Cache en memoria del catálogo de productos, por proceso.
+
+Guarda registros compactos de producto por cod_venta y listas de productos
+por id_fabrica, con desalojo LRU. Las cargas CSV lo usan para resolver los
+códigos del archivo y la búsqueda para no ir a la base de datos en cada
+tecla. Los productos que faltan se leen de la base en una sola consulta.
+
+Cada proceso tiene su propio catálogo, pero la versión vigente se guarda en
+el cache de Django (compartido entre procesos): al guardar o borrar un
+producto, o tras una carga inicial, se cambia la versión y cada proceso
+descarta su catálogo la próxima vez que lo consulta.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Producto
+
+CLAVE_VERSION = 'catalogo:version'
+
+# Campos que se guardan de cada producto (los de ProductoSerializer)
+CAMPOS_CATALOGO = ('cod_venta', 'id_fabrica', 'descripcion', 'precio', 'costo')
+
+
+class ProductoCatalogo:
+    """Registro liviano de un producto; se puede pasar a ProductoSerializer."""
+    __slots__ = CAMPOS_CATALOGO
+
+    def __init__(self, cod_venta, id_fabrica, descripcion, precio, costo):
+        self.cod_venta = cod_venta
+        self.id_fabrica = id_fabrica
+        self.descripcion = descripcion
+        self.precio = precio
+        self.costo = costo
+
+    @property
+    def pk(self):
+        return self.cod_venta
+
+
+def invalidar_catalogo():
+    cache.set(CLAVE_VERSION, time.time_ns(), timeout=None)
+
+
+def _version_vigente():
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, time.time_ns(), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+class CatalogoProductos:
+    """
+    Catálogo LRU de hasta `capacidad` entradas. Las entradas son:
+
+        ('cod', cod_venta)      -> ProductoCatalogo, o None si el producto no existe
+        ('fab', ID_FABRICA)     -> tupla de ProductoCatalogo con ese id_fabrica
+        (otra clave de quien llama, ver recordar()) -> valor libre
+    """
+
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _sincronizar(self):
+        # Descarta todo si otro proceso (o este) cambió la versión
+        version = _version_vigente()
+        with self._lock:
+            if version != self._version:
+                self._entradas.clear()
+                self._version = version
+        return version
+
+    def _leer(self, clave):
+        with self._lock:
+            if clave not in self._entradas:
+                raise KeyError(clave)
+            self._entradas.move_to_end(clave)
+            return self._entradas[clave]
+
+    def _guardar(self, version, entradas):
+        with self._lock:
+            # Si la versión cambió mientras se consultaba la base, lo leído puede estar viejo
+            if version != self._version:
+                return
+            for clave, valor in entradas:
+                self._entradas[clave] = valor
+                self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def resolver(self, codigos):
+        """Devuelve {cod_venta: ProductoCatalogo} con los códigos que existen."""
+        version = self._sincronizar()
+        encontrados = {}
+        faltantes = []
+        for codigo in set(codigos):
+            try:
+                registro = self._leer(('cod', codigo))
+            except KeyError:
+                faltantes.append(codigo)
+                continue
+            if registro is not None:
+                encontrados[codigo] = registro
+
+        if faltantes:
+            leidos = {
+                fila[0]: ProductoCatalogo(*fila)
+                for fila in Producto.objects.filter(cod_venta__in=faltantes).values_list(*CAMPOS_CATALOGO)
+            }
+            # Los códigos inexistentes también se recuerdan, así no se vuelven a consultar
+            self._guardar(version, [(('cod', codigo), leidos.get(codigo)) for codigo in faltantes])
+            encontrados.update(leidos)
+        return encontrados
+
+    def obtener(self, cod_venta):
+        """Devuelve el producto con ese código o None si no existe."""
+        return self.resolver([cod_venta]).get(cod_venta)
+
+    def por_id_fabrica(self, id_fabrica):
+        """Devuelve los productos con ese id_fabrica (sin distinguir mayúsculas)."""
+        clave = ('fab', id_fabrica.upper())
+        version = self._sincronizar()
+        try:
+            return self._leer(clave)
+        except KeyError:
+            pass
+        registros = tuple(
+            ProductoCatalogo(*fila)
+            for fila in Producto.objects.filter(id_fabrica__iexact=id_fabrica).values_list(*CAMPOS_CATALOGO)
+        )
+        self._guardar(version, [(clave, registros)] + [(('cod', r.cod_venta), r) for r in registros])
+        return registros
+
+    def recordar(self, clave, calcular):
+        """
+        Devuelve el valor guardado bajo `clave` o lo calcula con `calcular()`.
+        El valor se descarta junto con el resto del catálogo al cambiar la versión.
+        """
+        version = self._sincronizar()
+        try:
+            return self._leer(clave)
+        except KeyError:
+            pass
+        valor = calcular()
+        self._guardar(version, [(clave, valor)])
+        return valor
+
+
+catalogo = CatalogoProductos(getattr(settings, 'CATALOGO_CACHE_MAX', 100_000))
@@ -0,0 +1,452 @@
+"""
+Ejecución de las cargas CSV, en la misma petición o en segundo plano.
+
+Cada archivo recibido queda en un RegistroIngesta (ver registrar_archivo): un
+archivo que ya se importó no se vuelve a aplicar y uno cuya importación falló
+continúa desde la última fila confirmada.
+
+Las importaciones en segundo plano se registran como TrabajoImportacion y se
+ejecutan en un pool de hilos local del proceso (sin broker externo). Los
+trabajos que queden pendientes, o en proceso pero sin avanzar durante
+IMPORTACIONES_TIEMPO_INACTIVO segundos (por ejemplo, tras reiniciar el
+servidor), se procesan con `python manage.py procesar_importaciones`, que
+conviene ejecutar periódicamente (cron o un timer de systemd). El archivo de
+un trabajo que falló de forma inesperada se conserva para revisarlo o
+reintentarlo con `procesar_importaciones --reintentar ID`.
+"""
+
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .cache_dashboard import invalidar_dashboard
+from .ingesta import (
+    COLUMNAS_CARGA_INICIAL,
+    COLUMNAS_TRANSFERENCIA,
+    COLUMNAS_VENTAS_DIARIAS,
+    TIPOS_CARGA_INICIAL,
+    TIPOS_TRANSFERENCIA,
+    TIPOS_VENTAS_DIARIAS,
+    ingerir_carga_inicial,
+    ingerir_transferencia,
+    ingerir_ventas_diarias,
+    leer_csv_por_bloques,
+    simular_carga_inicial,
+    simular_transferencia,
+    simular_ventas_diarias,
+)
+from .models import RegistroIngesta, TrabajoImportacion, Ubicacion
+
+logger = logging.getLogger(__name__)
+
+# Columnas obligatorias y tipos de lectura según el tipo de importación
+FORMATOS = {
+    TrabajoImportacion.TIPO_CARGA_INICIAL: (COLUMNAS_CARGA_INICIAL, TIPOS_CARGA_INICIAL),
+    TrabajoImportacion.TIPO_TRANSFERENCIA: (COLUMNAS_TRANSFERENCIA, TIPOS_TRANSFERENCIA),
+    TrabajoImportacion.TIPO_VENTAS_DIARIAS: (COLUMNAS_VENTAS_DIARIAS, TIPOS_VENTAS_DIARIAS),
+}
+
+MODO_PARCIAL = 'parcial'
+MODO_TODO = 'todo'
+MODOS = (MODO_PARCIAL, MODO_TODO)
+
+
+
+class ImportacionRechazada(Exception):
+    """
+    En MODO_TODO alguna fila tiene errores: la carga se deshace completa.
+    `resultado` trae los errores encontrados hasta el bloque que falló.
+    """
+
+    def __init__(self, resultado):
+        self.resultado = resultado
+        super().__init__(
+            f'El archivo tiene filas con errores ({len(resultado["errores"])} hasta la fila {resultado["filas"] + 1}). '
+            'No se aplicó ningún cambio. Usa ?dry_run=1 para ver todos los errores del archivo.'
+        )
+
+
+_ejecutor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMPORTACIONES_MAX_WORKERS', 2),
+    thread_name_prefix='importacion',
+)
+
+# En MODO_TODO el avance se guarda desde un hilo aparte: la importación corre
+# dentro de una transacción y lo que escribiera ella misma no sería visible
+# hasta el final. En MODO_PARCIAL se guarda con cada bloque.
+_ejecutor_progreso = ThreadPoolExecutor(max_workers=1, thread_name_prefix='importacion-progreso')
+
+
+# Fecha al final del nombre: LUGAR_AAAAMMDD.csv y tras_bod_LUGAR_AAAAMMDD.csv
+_FECHA_EN_NOMBRE = re.compile(r'_(\d{8})\.csv$')
+
+
+def fecha_de_nombre(nombre_archivo):
+    """Fecha AAAAMMDD del nombre del archivo, o None si no tiene una válida."""
+    coincidencia = _FECHA_EN_NOMBRE.search(nombre_archivo)
+    if not coincidencia:
+        return None
+    try:
+        return datetime.strptime(coincidencia.group(1), '%Y%m%d').date()
+    except ValueError:
+        return None
+
+
+def huella_archivo(archivo):
+    """
+    SHA-256 del contenido del archivo subido. Deja el archivo en la posición
+    en que estaba, así no interfiere con el lector de bloques ya abierto.
+    """
+    posicion = archivo.tell()
+    huella = hashlib.sha256()
+    for parte in archivo.chunks():
+        huella.update(parte)
+    archivo.seek(posicion)
+    return huella.hexdigest()
+
+
+def _clave_registro(tipo, huella, ubicacion_id, fecha):
+    return f'{tipo}:{ubicacion_id}:{fecha.isoformat() if fecha else ""}:{huella}'
+
+
+def importacion_completada(tipo, archivo, ubicacion_id, fecha=None):
+    """El RegistroIngesta completado del archivo, o None si no se importó aún."""
+    return RegistroIngesta.objects.filter(
+        clave=_clave_registro(tipo, huella_archivo(archivo), ubicacion_id, fecha),
+        estado=RegistroIngesta.ESTADO_COMPLETADO,
+    ).first()
+
+
+def _limite_inactividad():
+    """Lo que no avanzó desde este momento se considera detenido."""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'IMPORTACIONES_TIEMPO_INACTIVO', 900))
+
+
+def _registros_reclamables(tipo):
+    """
+    Registros que una nueva subida del mismo archivo puede tomar: los que
+    terminaron con error y los que quedaron en proceso sin avanzar, sin un
+    trabajo vivo que los vaya a continuar (el trabajo se reanuda solo, ver
+    reanudar_si_detenido). La carga inicial fija el stock: también se toman
+    los completados, para aplicarla de nuevo desde el principio.
+    """
+    detenido = Q(estado=RegistroIngesta.ESTADO_EN_PROCESO) & (
+        Q(actualizado__lt=_limite_inactividad()) | Q(actualizado__isnull=True)
+    ) & (
+        Q(trabajo__isnull=True)
+        | Q(trabajo__estado__in=[TrabajoImportacion.ESTADO_COMPLETADO, TrabajoImportacion.ESTADO_ERROR])
+    )
+    reclamables = Q(estado=RegistroIngesta.ESTADO_ERROR) | detenido
+    if tipo == TrabajoImportacion.TIPO_CARGA_INICIAL:
+        reclamables |= Q(estado=RegistroIngesta.ESTADO_COMPLETADO)
+    return reclamables
+
+
+def registrar_archivo(tipo, archivo, ubicacion_id, fecha=None):
+    """
+    Busca o crea el RegistroIngesta del archivo y lo reclama para importarlo.
+
+    Devuelve (registro, repetido). `repetido` es True si el archivo ya se
+    importó o se está importando; en ese caso no hay que aplicarlo. Si un
+    intento anterior terminó con error o se detuvo a medias, el registro se
+    reclama de nuevo y la carga continúa desde sus filas confirmadas.
+    """
+    huella = huella_archivo(archivo)
+    clave = _clave_registro(tipo, huella, ubicacion_id, fecha)
+    ahora = timezone.now()
+    registro, creado = RegistroIngesta.objects.get_or_create(
+        clave=clave,
+        defaults={
+            'tipo': tipo,
+            'huella': huella,
+            'ubicacion_id': ubicacion_id,
+            'fecha': fecha,
+            'nombre_archivo': archivo.name,
+            'actualizado': ahora,
+        },
+    )
+    if creado:
+        return registro, False
+
+    reclamado = RegistroIngesta.objects.filter(_registros_reclamables(tipo), pk=registro.pk).update(
+        # Un registro completado solo se reclama en la carga inicial, que empieza de cero
+        filas_confirmadas=Case(
+            When(estado=RegistroIngesta.ESTADO_COMPLETADO, then=Value(0)),
+            default=F('filas_confirmadas'),
+            output_field=IntegerField(),
+        ),
+        estado=RegistroIngesta.ESTADO_EN_PROCESO,
+        nombre_archivo=archivo.name,
+        trabajo=None,
+        actualizado=ahora,
+        completado=None,
+    )
+    registro.refresh_from_db()
+    return registro, not reclamado
+
+
+def modo_por_defecto():
+    return getattr(settings, 'IMPORTACIONES_MODO', MODO_PARCIAL)
+
+
+def leer_bloques(tipo, archivo):
+    columnas, dtype = FORMATOS[tipo]
+    return leer_csv_por_bloques(archivo, columnas, dtype=dtype)
+
+
+def ejecutar_ingesta(tipo, bloques, parametros, usuario_id=None, progreso=None):
+    """
+    Aplica una carga ya validada y devuelve el resumen junto con el mensaje
+    que se muestra al usuario. parametros['modo'] elige si cada bloque se
+    confirma por separado (MODO_PARCIAL) o todo el archivo junto (MODO_TODO).
+
+    En MODO_TODO basta una fila con error, de validación o rechazada por la
+    base de datos, para deshacer la carga entera: se lanza ImportacionRechazada
+    al terminar el bloque donde aparece.
+
+    Si `parametros` trae un 'registro_id' (ver registrar_archivo), la carga
+    empieza después de las filas ya confirmadas del registro, las va anotando
+    con cada bloque y al final lo marca como completado o con error.
+    """
+    registro = None
+    if parametros.get('registro_id'):
+        registro = RegistroIngesta.objects.get(pk=parametros['registro_id'])
+    desde_fila = registro.filas_confirmadas if registro else 0
+    modo = parametros.get('modo', modo_por_defecto())
+
+    def confirmar(resultado):
+        if modo == MODO_TODO and resultado['errores']:
+            # Sale del bloque atómico de todo el archivo, que se deshace
+            raise ImportacionRechazada(resultado)
+        if registro:
+            RegistroIngesta.objects.filter(pk=registro.pk).update(
+                filas_confirmadas=resultado['filas'],
+                actualizado=timezone.now(),
+            )
+        if progreso:
+            progreso(resultado)
+
+    try:
+        with transaction.atomic() if modo == MODO_TODO else nullcontext():
+            if tipo == TrabajoImportacion.TIPO_CARGA_INICIAL:
+                bodega_principal = Ubicacion.objects.get(pk=parametros['bodega_principal_id'])
+                resultado = ingerir_carga_inicial(bloques, bodega_principal, progreso=confirmar, desde_fila=desde_fila)
+                mensaje = f'Carga completada. {resultado["procesados"]} productos procesados.'
+
+            elif tipo == TrabajoImportacion.TIPO_TRANSFERENCIA:
+                bodega_principal = Ubicacion.objects.get(pk=parametros['bodega_principal_id'])
+                ubicacion_destino = Ubicacion.objects.get(pk=parametros['ubicacion_id'])
+                resultado = ingerir_transferencia(
+                    bloques, bodega_principal, ubicacion_destino, usuario_id,
+                    progreso=confirmar, desde_fila=desde_fila,
+                )
+                mensaje = f'Transferencia completada. {resultado["procesados"]} productos movidos a "{ubicacion_destino.nombre}".'
+
+            else:
+                ubicacion_venta = Ubicacion.objects.get(pk=parametros['ubicacion_id'])
+                resultado = ingerir_ventas_diarias(
+                    bloques,
+                    ubicacion_venta,
+                    usuario_id,
+                    agrupar_movimientos=parametros.get('agrupar', False),
+                    progreso=confirmar,
+                    desde_fila=desde_fila,
+                    registro=registro,
+                )
+                mensaje = f'Ventas diarias procesadas. {resultado["procesados"]} unidades vendidas en "{ubicacion_venta.nombre}".'
+                if resultado['omitidos']:
+                    mensaje += f' Se omitieron {resultado["omitidos"]} filas ya registradas.'
+
+            if registro:
+                RegistroIngesta.objects.filter(pk=registro.pk).update(
+                    estado=RegistroIngesta.ESTADO_COMPLETADO,
+                    completado=timezone.now(),
+                )
+
+            # Las escrituras masivas no emiten señales: invalidar el dashboard a mano
+            transaction.on_commit(invalidar_dashboard)
+    except Exception:
+        if registro:
+            RegistroIngesta.objects.filter(pk=registro.pk).update(estado=RegistroIngesta.ESTADO_ERROR)
+        if modo == MODO_PARCIAL:
+            # Los bloques confirmados antes del error sí cambiaron los datos
+            invalidar_dashboard()
+        raise
+
+    return resultado, mensaje
+
+
+def simular_ingesta(tipo, bloques, parametros):
+    """
+    Recorre y valida la carga sin escribir nada y devuelve el resumen, con los
+    errores por fila y los cambios de stock proyectados ('deltas'), junto con
+    el mensaje que se muestra al usuario.
+    """
+    if tipo == TrabajoImportacion.TIPO_CARGA_INICIAL:
+        bodega_principal = Ubicacion.objects.get(pk=parametros['bodega_principal_id'])
+        resultado = simular_carga_inicial(bloques, bodega_principal)
+        mensaje = f'Se procesarían {resultado["procesados"]} productos ({resultado["productos_nuevos"]} nuevos).'
+
+    elif tipo == TrabajoImportacion.TIPO_TRANSFERENCIA:
+        bodega_principal = Ubicacion.objects.get(pk=parametros['bodega_principal_id'])
+        ubicacion_destino = Ubicacion.objects.get(pk=parametros['ubicacion_id'])
+        resultado = simular_transferencia(bloques, bodega_principal, ubicacion_destino)
+        mensaje = f'Se moverían {resultado["procesados"]} productos a "{ubicacion_destino.nombre}".'
+
+    else:
+        ubicacion_venta = Ubicacion.objects.get(pk=parametros['ubicacion_id'])
+        resultado = simular_ventas_diarias(bloques, ubicacion_venta)
+        mensaje = f'Se venderían {resultado["procesados"]} unidades en "{ubicacion_venta.nombre}".'
+        if resultado['omitidos']:
+            mensaje += f' Se omitirían {resultado["omitidos"]} filas ya registradas.'
+
+    if resultado['errores']:
+        mensaje += f' {len(resultado["errores"])} filas tienen errores.'
+    return resultado, mensaje + ' No se guardó ningún cambio.'
+
+
+def crear_trabajo(tipo, csv_file, parametros, usuario_id=None):
+    """
+    Guarda el archivo subido, registra el trabajo y lo encola para que se
+    ejecute una vez confirmada la transacción actual.
+    """
+    ruta = default_storage.save(f'importaciones/{csv_file.name}', csv_file)
+    trabajo = TrabajoImportacion.objects.create(
+        tipo=tipo,
+        archivo=ruta,
+        nombre_archivo=csv_file.name,
+        parametros=parametros,
+        usuario_id=usuario_id,
+    )
+    if parametros.get('registro_id'):
+        RegistroIngesta.objects.filter(pk=parametros['registro_id']).update(trabajo=trabajo)
+    transaction.on_commit(lambda: _ejecutor.submit(_ejecutar_en_hilo, trabajo.pk))
+    return trabajo
+
+
+def _guardar_progreso(trabajo_id, filas_ok, filas_con_error):
+    close_old_connections()
+    TrabajoImportacion.objects.filter(pk=trabajo_id).update(
+        filas_procesadas=filas_ok + filas_con_error,
+        filas_ok=filas_ok,
+        actualizado=timezone.now(),
+    )
+
+
+def _detenidos():
+    """Condición de los trabajos en proceso que dejaron de guardar avance."""
+    return Q(estado=TrabajoImportacion.ESTADO_EN_PROCESO) & (
+        Q(actualizado__lt=_limite_inactividad()) | Q(actualizado__isnull=True)
+    )
+
+
+def trabajos_por_procesar():
+    """Trabajos pendientes y en proceso detenidos, del más antiguo al más nuevo."""
+    return TrabajoImportacion.objects.filter(
+        Q(estado=TrabajoImportacion.ESTADO_PENDIENTE) | _detenidos(),
+    ).order_by('creado')
+
+
+def reclamar_trabajo(trabajo_id):
+    """
+    Marca el trabajo como en proceso si sigue pendiente, o si estaba en
+    proceso pero se detuvo, y lo devuelve. Devuelve None si otro hilo o
+    proceso ya lo tomó. Un trabajo detenido continúa desde las filas que su
+    RegistroIngesta tenga confirmadas (ver ejecutar_ingesta).
+    """
+    ahora = timezone.now()
+    reclamado = TrabajoImportacion.objects.filter(
+        Q(estado=TrabajoImportacion.ESTADO_PENDIENTE) | _detenidos(),
+        pk=trabajo_id,
+    ).update(estado=TrabajoImportacion.ESTADO_EN_PROCESO, iniciado=ahora, actualizado=ahora)
+    return TrabajoImportacion.objects.get(pk=trabajo_id) if reclamado else None
+
+
+def reanudar_si_detenido(trabajo):
+    """Vuelve a encolar `trabajo` si está en proceso pero dejó de avanzar."""
+    if TrabajoImportacion.objects.filter(_detenidos(), pk=trabajo.pk).exists():
+        _ejecutor.submit(_ejecutar_en_hilo, trabajo.pk)
+
+
+def reintentar_trabajo(trabajo_id):
+    """
+    Vuelve a dejar pendiente un trabajo que terminó con error por una falla
+    inesperada y devuelve True. Solo se puede si su archivo se conservó (los
+    rechazados en MODO_TODO lo borran) y si ninguna otra subida tomó su
+    RegistroIngesta; la carga continúa desde las filas confirmadas.
+    """
+    trabajo = TrabajoImportacion.objects.filter(pk=trabajo_id, estado=TrabajoImportacion.ESTADO_ERROR).first()
+    if trabajo is None or not default_storage.exists(trabajo.archivo):
+        return False
+
+    with transaction.atomic():
+        registro_id = trabajo.parametros.get('registro_id')
+        if registro_id and not RegistroIngesta.objects.filter(
+            pk=registro_id, estado=RegistroIngesta.ESTADO_ERROR,
+        ).update(estado=RegistroIngesta.ESTADO_EN_PROCESO, trabajo=trabajo, actualizado=timezone.now()):
+            return False
+        return bool(TrabajoImportacion.objects.filter(
+            pk=trabajo.pk, estado=TrabajoImportacion.ESTADO_ERROR,
+        ).update(estado=TrabajoImportacion.ESTADO_PENDIENTE, mensaje='', finalizado=None))
+
+
+def ejecutar_trabajo(trabajo):
+    """Procesa un trabajo ya reclamado y guarda su resultado."""
+    def progreso(resultado):
+        if trabajo.parametros.get('modo', modo_por_defecto()) == MODO_PARCIAL:
+            # Dentro de la transacción del bloque: el avance visible es el confirmado
+            TrabajoImportacion.objects.filter(pk=trabajo.pk).update(
+                filas_procesadas=resultado['procesados'] + len(resultado['errores']),
+                filas_ok=resultado['procesados'],
+                actualizado=timezone.now(),
+            )
+        else:
+            _ejecutor_progreso.submit(_guardar_progreso, trabajo.pk, resultado['procesados'], len(resultado['errores']))
+
+    try:
+        with default_storage.open(trabajo.archivo, 'rb') as archivo:
+            bloques = leer_bloques(trabajo.tipo, archivo)
+            resultado, mensaje = ejecutar_ingesta(trabajo.tipo, bloques, trabajo.parametros, trabajo.usuario_id, progreso)
+    except ImportacionRechazada as e:
+        trabajo.estado = TrabajoImportacion.ESTADO_ERROR
+        trabajo.mensaje = str(e)
+        trabajo.filas_procesadas = e.resultado['procesados'] + len(e.resultado['errores'])
+        trabajo.filas_ok = 0
+        trabajo.errores = e.resultado['errores']
+        default_storage.delete(trabajo.archivo)
+    except Exception as e:
+        # El archivo se conserva para revisarlo o reintentar (ver reintentar_trabajo)
+        logger.exception('Falló la importación %s', trabajo.pk)
+        trabajo.estado = TrabajoImportacion.ESTADO_ERROR
+        trabajo.mensaje = str(e)
+    else:
+        trabajo.estado = TrabajoImportacion.ESTADO_COMPLETADO
+        trabajo.mensaje = mensaje
+        trabajo.filas_procesadas = resultado['procesados'] + len(resultado['errores'])
+        trabajo.filas_ok = resultado['procesados']
+        trabajo.errores = resultado['errores']
+        default_storage.delete(trabajo.archivo)
+
+    # Esperar a que se escriba el último avance para que no pise el resultado final
+    _ejecutor_progreso.submit(lambda: None).result()
+    trabajo.finalizado = timezone.now()
+    trabajo.save()
+
+
+def _ejecutar_en_hilo(trabajo_id):
+    close_old_connections()
+    try:
+        trabajo = reclamar_trabajo(trabajo_id)
+        if trabajo is not None:
+            ejecutar_trabajo(trabajo)
+    finally:
+        connection.close()
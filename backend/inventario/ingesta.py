@@ -0,0 +1,749 @@
+"""
+Motores de ingesta masiva para las cargas CSV del inventario.
+
+El archivo se lee en bloques de tamaño fijo (leer_csv_por_bloques) y cada
+bloque se valida y aplica por separado, de modo que la memoria usada no
+depende del tamaño del archivo. Las funciones procesar_* trabajan sobre un
+bloque y las ingerir_* recorren todos los bloques de un archivo.
+
+Todas devuelven un resumen con las filas procesadas y los errores por fila,
+en el mismo formato que mostraban las vistas ('Error en fila N: ...',
+contando la cabecera como fila 1).
+
+Cada bloque se aplica en su propio bloque atómico: una transacción que se
+confirma al terminar el bloque o, si quien llama abrió una transacción para
+todo el archivo, un savepoint dentro de ella (ver importaciones.ejecutar_ingesta).
+Si la base de datos rechaza el bloque, se deshace y se aplica fila por fila
+para reportar el error en la fila exacta (ver _aplicar_aislado).
+
+Las reglas de formato de cada archivo están en las funciones validar_*, que
+revisan el bloque entero con operaciones de pandas antes de tocar los datos;
+las simular_* las usan para un ensayo sin escritura (?dry_run=1).
+"""
+
+import hashlib
+from decimal import Decimal
+
+import pandas as pd
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .catalogo import catalogo, invalidar_catalogo
+from .models import ClaveIngesta, MovimientoInventario, Producto, Stock
+from .servicios import TAMANO_LOTE, acumular_ventas_diarias, ajustar_stocks, recalcular_totales, registrar_ajustes
+
+# Cantidad de filas del CSV que se leen y procesan de una vez; también es el
+# tamaño de cada transacción al importar, y acota cuánto duran los bloqueos
+TAMANO_BLOQUE = getattr(settings, 'IMPORTACIONES_TAMANO_BLOQUE', 5000)
+
+# Columnas obligatorias y tipos de lectura de cada formato de archivo
+COLUMNAS_CARGA_INICIAL = {'id_venta', 'price', 'cost', 'id_fabrica', 'qty', 'description'}
+TIPOS_CARGA_INICIAL = {'id_venta': str, 'id_fabrica': str}
+COLUMNAS_TRANSFERENCIA = {'cod_venta', 'price', 'qty', 'description'}
+TIPOS_TRANSFERENCIA = {'cod_venta': str}
+COLUMNAS_VENTAS_DIARIAS = {'timestamp', 'lugar', 'id_fabrica', 'id_venta', 'description', 'price'}
+TIPOS_VENTAS_DIARIAS = {'id_venta': str, 'id_fabrica': str}
+
+# Límite de los DecimalField(max_digits=10, decimal_places=2) de Producto
+PRECIO_MAXIMO = 99999999.99
+
+# Formato de los códigos de venta que se dan de alta: BI NNNN CC (BI0001AA)
+PATRON_CODIGO = r'^BI\d{4}[A-Z]{2}$'
+
+
+class ErrorLecturaCSV(Exception):
+    """El archivo no se puede leer como CSV o le faltan columnas obligatorias."""
+
+
+def leer_csv_por_bloques(archivo, columnas_requeridas, dtype=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Devuelve un iterador de DataFrames con `tamano_bloque` filas cada uno.
+
+    El primer bloque se lee de inmediato para validar la cabecera, así los
+    errores de formato se detectan antes de empezar a escribir. El índice de
+    los bloques es continuo, por lo que los números de fila siguen siendo
+    los del archivo completo.
+    """
+    try:
+        bloques = pd.read_csv(archivo, dtype=dtype, chunksize=tamano_bloque)
+        primero = next(bloques)
+    except (ValueError, StopIteration) as e:
+        raise ErrorLecturaCSV(f'Error al leer el archivo CSV: {str(e)}') from e
+
+    if not columnas_requeridas.issubset(primero.columns):
+        raise ErrorLecturaCSV(f'Faltan columnas obligatorias. Se necesitan: {columnas_requeridas}')
+
+    def _bloques():
+        yield primero
+        try:
+            yield from bloques
+        except ValueError as e:
+            raise ErrorLecturaCSV(f'Error al leer el archivo CSV: {str(e)}') from e
+
+    return _bloques()
+
+
+def _acumular(resultado, parcial):
+    resultado['procesados'] += parcial['procesados']
+    resultado['errores'].extend(parcial['errores'])
+    resultado['omitidos'] += parcial.get('omitidos', 0)
+    return resultado
+
+
+def _resultado_inicial(desde_fila):
+    # 'filas' es la cantidad de filas del archivo recorridas (incluidas las
+    # que se saltaron al retomar una carga), no solo las de este intento
+    return {'procesados': 0, 'errores': [], 'omitidos': 0, 'filas': desde_fila}
+
+
+def _avanzar(resultado, df):
+    # Un bloque vacío (archivo con solo la cabecera) no avanza 'filas'
+    if not df.empty:
+        resultado['filas'] = max(resultado['filas'], int(df.index[-1]) + 1)
+
+
+def _aplicar_aislado(procesar, filas):
+    """
+    Aplica `procesar(filas)` (un índice del bloque) en un savepoint. Si la base
+    de datos lo rechaza, por ejemplo por una restricción violada, el savepoint
+    se deshace y las filas se aplican de a una, cada una en su savepoint: la
+    fila que falla queda como error y el resto del bloque se conserva.
+    """
+    try:
+        with transaction.atomic():
+            return procesar(filas)
+    except DatabaseError:
+        pass
+
+    resultado = {'procesados': 0, 'errores': [], 'omitidos': 0, 'vendidos': {}}
+    for index in filas:
+        try:
+            with transaction.atomic():
+                parcial = procesar(filas[filas == index])
+        except DatabaseError as e:
+            resultado['errores'].append(f'Error en fila {_numero_fila(index)}: {e}')
+            continue
+        _acumular(resultado, parcial)
+        for clave, unidades in parcial.get('vendidos', {}).items():
+            resultado['vendidos'][clave] = resultado['vendidos'].get(clave, 0) + unidades
+    return resultado
+
+
+def _pendientes(df, desde_fila):
+    """Filas del bloque que todavía no se aplicaron al retomar desde `desde_fila`."""
+    return df[df.index >= desde_fila] if desde_fila else df
+
+
+def claves_ventas(df, repeticiones):
+    """
+    Claves de idempotencia de las filas de ventas: SHA-1 de timestamp, lugar,
+    id_venta y el número de repetición de esa combinación en el archivo (dos
+    unidades iguales vendidas en el mismo minuto son dos filas distintas).
+
+    `repeticiones` lleva la cuenta entre bloques y se actualiza aquí, por eso
+    hay que pasar todos los bloques del archivo en orden, incluso los que se
+    saltan al retomar una carga.
+    """
+    campos = pd.DataFrame({
+        columna: df[columna].astype('string').str.strip().fillna('')
+        for columna in ('timestamp', 'lugar', 'id_venta')
+    })
+    base = campos['timestamp'] + '|' + campos['lugar'] + '|' + campos['id_venta']
+    numero = base.groupby(base).cumcount() + base.map(repeticiones).fillna(0).astype('int64')
+    for valor, cantidad in base.value_counts().items():
+        repeticiones[valor] = repeticiones.get(valor, 0) + int(cantidad)
+    return pd.Series(
+        [hashlib.sha1(f'{valor}|{n}'.encode()).hexdigest() for valor, n in zip(base, numero)],
+        index=df.index,
+    )
+
+
+def _numero_fila(index):
+    # El índice de pandas empieza en 0 y la fila 1 del archivo es la cabecera
+    return index + 2
+
+
+def _registrar_errores(errores, mascara, mensaje):
+    """
+    Asigna `mensaje` a las filas de `mascara` que todavía no tienen error,
+    de modo que cada fila reporta solo la primera validación que falla.
+    """
+    errores[mascara & errores.isna()] = mensaje
+
+
+def _listar_errores(errores):
+    return [
+        f'Error en fila {_numero_fila(index)}: {mensaje}'
+        for index, mensaje in errores.dropna().items()
+    ]
+
+
+def _a_decimal(valor):
+    return Decimal(str(round(valor, 2)))
+
+
+def validar_carga_inicial(df):
+    """
+    Valida el bloque de carga inicial sobre columnas completas, sin consultar
+    la base de datos. Devuelve (errores, filas): los errores por fila y las
+    filas válidas con los tipos ya convertidos.
+
+    Si un código se repite en el bloque prevalece la última fila; las
+    anteriores se reportan como error para que no cuenten como procesadas.
+    """
+    errores = pd.Series(pd.NA, index=df.index, dtype='object')
+
+    codigos = df['id_venta'].astype('string')
+    precios = pd.to_numeric(df['price'], errors='coerce')
+    costos = pd.to_numeric(df['cost'], errors='coerce')
+    cantidades = pd.to_numeric(df['qty'], errors='coerce')
+
+    # Validar formato del id_venta (BI NNNN CC)
+    _registrar_errores(errores, ~codigos.str.match(PATRON_CODIGO).fillna(False).astype(bool), "El código de venta 'id_venta' debe tener el formato BI NNNN CC (por ejemplo, BI0001AA).")
+    _registrar_errores(errores, precios.isna() | costos.isna(), "Los campos 'price' y 'cost' deben ser numéricos.")
+    _registrar_errores(errores, (precios.abs() > PRECIO_MAXIMO) | (costos.abs() > PRECIO_MAXIMO), "Los campos 'price' y 'cost' exceden el valor máximo permitido.")
+    _registrar_errores(errores, cantidades.isna() | (cantidades < 0) | (cantidades % 1 != 0), "El campo 'qty' debe ser un entero mayor o igual a 0.")
+    _registrar_errores(errores, df['description'].isna() | df['id_fabrica'].isna(), "Los campos 'description' e 'id_fabrica' son obligatorios.")
+
+    validos = codigos[errores.isna()]
+    repetidos = validos.duplicated(keep='last')
+    if repetidos.any():
+        ultima = pd.Series(validos.index, index=validos.array).groupby(level=0).last()
+        filas_ultima = validos[repetidos].map(ultima).map(_numero_fila).astype(str)
+        errores[repetidos[repetidos].index] = 'El código ' + validos[repetidos] + ' se repite en la fila ' + filas_ultima + ', que es la que se aplica.'
+
+    validas = errores.isna()
+    filas = pd.DataFrame({
+        'cod_venta': codigos[validas],
+        'descripcion': df.loc[validas, 'description'].astype(str),
+        'precio': precios[validas],
+        'costo': costos[validas],
+        'id_fabrica': df.loc[validas, 'id_fabrica'].astype(str),
+        'cantidad': cantidades[validas].astype('int64'),
+    })
+    return errores, filas
+
+
+def procesar_carga_inicial(df, bodega_principal):
+    """
+    Crea o actualiza los productos del DataFrame y fija su stock en la bodega principal.
+
+    La validación se hace sobre columnas completas (validar_carga_inicial) y la
+    escritura en lotes con INSERT ... ON CONFLICT DO UPDATE, en lugar de dos
+    update_or_create por fila. La diferencia con el stock que había se registra
+    como un movimiento de ajuste por producto.
+    """
+    errores, filas = validar_carga_inicial(df)
+
+    # Stock previo en la bodega, bloqueado hasta el final del bloque
+    anteriores = dict(
+        Stock.objects.select_for_update().filter(
+            producto_id__in=filas['cod_venta'].tolist(),
+            ubicacion=bodega_principal,
+        ).order_by('producto_id').values_list('producto_id', 'cantidad')
+    )
+
+    productos = [
+        Producto(
+            cod_venta=fila.cod_venta,
+            descripcion=fila.descripcion,
+            precio=_a_decimal(fila.precio),
+            costo=_a_decimal(fila.costo),
+            id_fabrica=fila.id_fabrica,
+        )
+        for fila in filas.itertuples(index=False)
+    ]
+    stocks = [
+        Stock(producto_id=fila.cod_venta, ubicacion=bodega_principal, cantidad=int(fila.cantidad))
+        for fila in filas.itertuples(index=False)
+    ]
+
+    Producto.objects.bulk_create(
+        productos,
+        batch_size=TAMANO_LOTE,
+        update_conflicts=True,
+        unique_fields=['cod_venta'],
+        update_fields=['descripcion', 'precio', 'costo', 'id_fabrica'],
+    )
+    # bulk_create no emite señales: el catálogo en memoria se invalida a mano
+    transaction.on_commit(invalidar_catalogo)
+    Stock.objects.bulk_create(
+        stocks,
+        batch_size=TAMANO_LOTE,
+        update_conflicts=True,
+        unique_fields=['producto', 'ubicacion'],
+        update_fields=['cantidad'],
+    )
+    # El stock se fija (no se suma): recalcular los totales de estos productos
+    recalcular_totales(filas['cod_venta'].tolist())
+    registrar_ajustes(
+        [
+            (cod_venta, bodega_principal, anteriores.get(cod_venta, 0), int(cantidad))
+            for cod_venta, cantidad in zip(filas['cod_venta'], filas['cantidad'])
+        ],
+        detalle='Carga inicial',
+    )
+
+    return {
+        'procesados': len(filas),
+        'errores': _listar_errores(errores),
+    }
+
+
+def _bloquear_stocks(producto_ids, ubicaciones):
+    """
+    Bloquea (SELECT ... FOR UPDATE) los registros de stock de los productos en
+    las ubicaciones dadas y los devuelve indexados por (producto_id, ubicacion_id).
+
+    Las filas se bloquean siempre en orden (producto, ubicación) para que dos
+    cargas concurrentes no puedan bloquearse mutuamente.
+    """
+    stocks = Stock.objects.select_for_update().filter(
+        producto_id__in=producto_ids,
+        ubicacion__in=ubicaciones,
+    ).order_by('producto_id', 'ubicacion_id')
+    return {(stock.producto_id, stock.ubicacion_id): stock for stock in stocks}
+
+
+def validar_transferencia(df):
+    """
+    Valida el bloque de transferencia sobre columnas completas. La existencia
+    de los productos se comprueba con una sola consulta IN (catalogo.resolver).
+    Devuelve (errores, codigos, cantidades), con las cantidades ya numéricas.
+    """
+    errores = pd.Series(pd.NA, index=df.index, dtype='object')
+
+    codigos = df['cod_venta'].astype('string')
+    cantidades = pd.to_numeric(df['qty'], errors='coerce')
+
+    _registrar_errores(errores, codigos.isna(), "El campo 'cod_venta' es obligatorio.")
+    _registrar_errores(errores, cantidades.isna() | (cantidades <= 0) | (cantidades % 1 != 0), "El campo 'qty' debe ser un entero mayor que 0.")
+
+    candidatos = codigos[errores.isna()].unique().tolist()
+    existentes = set(catalogo.resolver(candidatos))
+    _registrar_errores(errores, ~codigos.isin(existentes).fillna(False), 'El producto no existe.')
+
+    return errores, codigos, cantidades
+
+
+def _asignar_transferencias(codigos, cantidades, errores, disponible):
+    """
+    Recorre las filas válidas en el orden del archivo y acepta las que caben
+    en `disponible` (unidades en la bodega por producto), que se va
+    descontando. Devuelve las transferencias aceptadas como (cod_venta, cantidad).
+    """
+    transferencias = []
+    for index, cod_venta, cantidad in zip(errores.index, codigos, cantidades):
+        if not pd.isna(errores[index]):
+            continue
+        cantidad = int(cantidad)
+        if cod_venta not in disponible:
+            errores[index] = f"El producto {cod_venta} no tiene stock en la bodega principal."
+            continue
+        if disponible[cod_venta] < cantidad:
+            errores[index] = f"Stock insuficiente en bodega. Se tiene {disponible[cod_venta]}, se intenta transferir {cantidad}."
+            continue
+        disponible[cod_venta] -= cantidad
+        transferencias.append((cod_venta, cantidad))
+    return transferencias
+
+
+def procesar_transferencia(df, bodega_principal, ubicacion_destino, usuario_id=None):
+    """
+    Transfiere stock desde la bodega principal a `ubicacion_destino`.
+
+    Los productos y los stocks de ambas ubicaciones se leen en dos consultas,
+    los stocks quedan bloqueados hasta el final de la transacción y los saldos
+    se calculan en memoria respetando el orden de las filas del archivo. La
+    escritura se hace con servicios.ajustar_stocks y bulk_create. Debe
+    ejecutarse dentro de transaction.atomic() para que los bloqueos tengan efecto.
+    """
+    errores, codigos, cantidades = validar_transferencia(df)
+
+    existentes = codigos[errores.isna()].unique().tolist()
+    stocks = _bloquear_stocks(existentes, [bodega_principal, ubicacion_destino])
+
+    # Calcular los saldos en memoria, fila por fila, sobre los stocks bloqueados
+    disponible = {
+        producto_id: stock.cantidad
+        for (producto_id, ubicacion_id), stock in stocks.items()
+        if ubicacion_id == bodega_principal.pk
+    }
+    transferencias = _asignar_transferencias(codigos, cantidades, errores, disponible)
+    entrante = {}
+    for cod_venta, cantidad in transferencias:
+        entrante[cod_venta] = entrante.get(cod_venta, 0) + cantidad
+
+    # Crear (y bloquear) los stocks de destino que aún no existen
+    faltantes = set(entrante) - {
+        producto_id for producto_id, ubicacion_id in stocks if ubicacion_id == ubicacion_destino.pk
+    }
+    if faltantes:
+        Stock.objects.bulk_create(
+            [Stock(producto_id=cod_venta, ubicacion=ubicacion_destino, cantidad=0) for cod_venta in faltantes],
+            batch_size=TAMANO_LOTE,
+            ignore_conflicts=True,
+        )
+        stocks.update(_bloquear_stocks(faltantes, [ubicacion_destino]))
+
+    cambios = []
+    for (producto_id, ubicacion_id), stock in stocks.items():
+        if producto_id not in entrante:
+            continue
+        if ubicacion_id == bodega_principal.pk:
+            cambios.append((stock, -entrante[producto_id]))
+        if ubicacion_id == ubicacion_destino.pk:
+            cambios.append((stock, entrante[producto_id]))
+    ajustar_stocks(cambios)
+
+    MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(
+                producto_id=cod_venta,
+                tipo=MovimientoInventario.TIPO_TRANSFERENCIA_SALIDA,
+                cantidad=cantidad,
+                usuario_id=usuario_id,
+                ubicacion_origen=bodega_principal,
+                ubicacion_destino=ubicacion_destino,
+                detalle=f"Transferencia masiva desde {bodega_principal.nombre}",
+            )
+            for cod_venta, cantidad in transferencias
+        ],
+        batch_size=TAMANO_LOTE,
+    )
+
+    return {
+        'procesados': len(transferencias),
+        'errores': _listar_errores(errores),
+    }
+
+
+def _registrar_ventas(movimientos, ubicacion_venta, usuario_id):
+    """Crea los movimientos de venta a partir de pares ((cod_venta, fecha_venta), cantidad)."""
+    MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(
+                producto_id=cod_venta,
+                tipo=MovimientoInventario.TIPO_VENTA,
+                cantidad=cantidad,
+                usuario_id=usuario_id,
+                ubicacion_origen=ubicacion_venta,  # La venta es una "salida" del PV
+                detalle="Venta diaria registrada desde CSV.",
+                fecha_venta=fecha_venta,
+            )
+            for (cod_venta, fecha_venta), cantidad in movimientos
+        ],
+        batch_size=TAMANO_LOTE,
+    )
+
+
+def _omitir_registradas(df, claves):
+    """
+    Quita del bloque las filas cuya clave de idempotencia ya está registrada.
+    Devuelve (df, claves, omitidos).
+    """
+    ya_registradas = set(ClaveIngesta.objects.filter(clave__in=claves.tolist()).values_list('clave', flat=True))
+    repetidas = claves.isin(ya_registradas)
+    return df[~repetidas], claves[~repetidas], int(repetidas.sum())
+
+
+def fechas_de_venta(df):
+    """
+    Día de cada venta según su 'timestamp'. Las filas sin un timestamp válido
+    cuentan como vendidas el día de la carga.
+    """
+    momentos = pd.to_datetime(df['timestamp'], errors='coerce', format='mixed')
+    return momentos.dt.date.where(momentos.notna(), timezone.localdate())
+
+
+def validar_ventas_diarias(df):
+    """
+    Valida el bloque de ventas sobre columnas completas. La existencia de los
+    productos se comprueba con una sola consulta IN (catalogo.resolver).
+    Devuelve (errores, codigos).
+    """
+    errores = pd.Series(pd.NA, index=df.index, dtype='object')
+
+    codigos = df['id_venta'].astype('string')
+    _registrar_errores(errores, codigos.isna(), "El campo 'id_venta' es obligatorio.")
+
+    candidatos = codigos[errores.isna()].unique().tolist()
+    existentes = set(catalogo.resolver(candidatos))
+    _registrar_errores(errores, ~codigos.isin(existentes).fillna(False), 'El producto no existe.')
+    return errores, codigos
+
+
+def _limitar_ventas(codigos, errores, disponible, ubicacion_venta):
+    """
+    Marca como error las filas de productos sin stock en el punto de venta y
+    las unidades que superan `disponible` (stock por producto), numerando las
+    unidades de cada producto en el orden del archivo.
+    """
+    sin_stock = ~codigos.isin(disponible.keys()).fillna(False)
+    for index in errores.index[sin_stock & errores.isna()]:
+        errores[index] = f"El producto {codigos[index]} no tiene stock en el punto de venta '{ubicacion_venta.nombre}'."
+
+    pendientes = errores.isna()
+    orden = codigos[pendientes].groupby(codigos[pendientes]).cumcount()
+    saldo = codigos[pendientes].map(disponible)
+    _registrar_errores(errores, (orden >= saldo).reindex(errores.index, fill_value=False), f"Stock insuficiente en '{ubicacion_venta.nombre}'. Stock actual: 0.")
+
+
+def procesar_ventas_diarias(df, ubicacion_venta, usuario_id=None, agrupar_movimientos=False, claves=None, registro=None):
+    """
+    Descuenta del punto de venta las unidades vendidas en el DataFrame.
+
+    Cada fila del archivo es una unidad vendida. Las filas se agrupan por
+    'id_venta' y el stock se valida y descuenta una sola vez por producto.
+    Las filas que superan el stock disponible se reportan como error, igual
+    que cuando se procesaban de a una.
+
+    Las ventas se suman al resumen diario (VentaDiaria) del día de su
+    timestamp, no del día de la carga (ver fechas_de_venta).
+
+    Con `agrupar_movimientos` no se registran movimientos: quien llama usa las
+    unidades devueltas en 'vendidos', por (cod_venta, fecha), para registrar
+    uno por producto y día (ver ingerir_ventas_diarias). Debe ejecutarse dentro de transaction.atomic()
+    para que los bloqueos tengan efecto.
+
+    Si se pasan las `claves` de idempotencia de las filas (ver claves_ventas)
+    las filas ya registradas se omiten, y las vendidas guardan su clave en
+    `registro` (un RegistroIngesta).
+    """
+    omitidos = 0
+    if claves is not None:
+        df, claves, omitidos = _omitir_registradas(df, claves)
+
+    errores, codigos = validar_ventas_diarias(df)
+    existentes = codigos[errores.isna()].unique().tolist()
+    stocks = {
+        producto_id: stock
+        for (producto_id, _), stock in _bloquear_stocks(existentes, [ubicacion_venta]).items()
+    }
+    _limitar_ventas(codigos, errores, {cod_venta: stock.cantidad for cod_venta, stock in stocks.items()}, ubicacion_venta)
+
+    vendidas = errores.isna()
+    vendidos = codigos[vendidas].value_counts()
+    fechas = fechas_de_venta(df)[vendidas]
+    por_dia = pd.DataFrame({'cod_venta': codigos[vendidas], 'fecha': fechas}).value_counts()
+
+    ajustar_stocks([(stocks[cod_venta], -int(unidades)) for cod_venta, unidades in vendidos.items()])
+    for fecha, unidades in por_dia.groupby(level='fecha'):
+        acumular_ventas_diarias(
+            {cod_venta: int(cantidad) for (cod_venta, _), cantidad in unidades.items()},
+            ubicacion_venta,
+            fecha,
+        )
+
+    if not agrupar_movimientos:
+        _registrar_ventas([(venta, 1) for venta in zip(codigos[vendidas], fechas)], ubicacion_venta, usuario_id)
+
+    if claves is not None:
+        ClaveIngesta.objects.bulk_create(
+            [ClaveIngesta(clave=clave, registro=registro) for clave in claves[errores.isna()]],
+            batch_size=TAMANO_LOTE,
+        )
+
+    return {
+        'procesados': int(vendidos.sum()),
+        'errores': _listar_errores(errores),
+        'omitidos': omitidos,
+        'vendidos': {venta: int(unidades) for venta, unidades in por_dia.items()},
+    }
+
+
+# Las funciones ingerir_* aceptan un callback `progreso(resultado)` que se
+# llama después de cada bloque con el resumen acumulado hasta ese momento, y
+# `desde_fila` para retomar una carga: las filas anteriores ya se aplicaron.
+# El callback corre dentro del bloque atómico, así lo que anote se confirma
+# junto con los datos del bloque.
+
+def ingerir_carga_inicial(bloques, bodega_principal, progreso=None, desde_fila=0):
+    resultado = _resultado_inicial(desde_fila)
+    for df in bloques:
+        pendientes = _pendientes(df, desde_fila)
+        with transaction.atomic():
+            if not pendientes.empty:
+                _acumular(resultado, _aplicar_aislado(
+                    lambda filas: procesar_carga_inicial(pendientes.loc[filas], bodega_principal),
+                    pendientes.index,
+                ))
+            _avanzar(resultado, df)
+            if progreso:
+                progreso(resultado)
+    return resultado
+
+
+def ingerir_transferencia(bloques, bodega_principal, ubicacion_destino, usuario_id=None, progreso=None, desde_fila=0):
+    resultado = _resultado_inicial(desde_fila)
+    for df in bloques:
+        pendientes = _pendientes(df, desde_fila)
+        with transaction.atomic():
+            if not pendientes.empty:
+                _acumular(resultado, _aplicar_aislado(
+                    lambda filas: procesar_transferencia(pendientes.loc[filas], bodega_principal, ubicacion_destino, usuario_id),
+                    pendientes.index,
+                ))
+            _avanzar(resultado, df)
+            if progreso:
+                progreso(resultado)
+    return resultado
+
+
+def ingerir_ventas_diarias(bloques, ubicacion_venta, usuario_id=None, agrupar_movimientos=False, progreso=None, desde_fila=0, registro=None):
+    """
+    Procesa las ventas bloque a bloque. Con `agrupar_movimientos` se registra
+    un movimiento por producto y día al final del archivo; si cada bloque se
+    confirma por separado (no hay una transacción abierta para todo el
+    archivo), uno por producto y día en cada bloque, para que lo confirmado tenga siempre sus movimientos.
+    Con un `registro` (RegistroIngesta) cada fila lleva su clave de
+    idempotencia y las que ya se aplicaron antes se omiten.
+    """
+    resultado = _resultado_inicial(desde_fila)
+    agrupar_al_final = agrupar_movimientos and transaction.get_connection().in_atomic_block
+    vendidos = {}
+    repeticiones = {}
+    for df in bloques:
+        claves = claves_ventas(df, repeticiones) if registro is not None else None
+        pendientes = _pendientes(df, desde_fila)
+        with transaction.atomic():
+            if not pendientes.empty:
+                parcial = _aplicar_aislado(
+                    lambda filas: procesar_ventas_diarias(
+                        pendientes.loc[filas], ubicacion_venta, usuario_id, agrupar_movimientos,
+                        claves=None if claves is None else claves[filas],
+                        registro=registro,
+                    ),
+                    pendientes.index,
+                )
+                _acumular(resultado, parcial)
+                if agrupar_al_final:
+                    for venta, unidades in parcial['vendidos'].items():
+                        vendidos[venta] = vendidos.get(venta, 0) + unidades
+                elif agrupar_movimientos:
+                    _registrar_ventas(parcial['vendidos'].items(), ubicacion_venta, usuario_id)
+            _avanzar(resultado, df)
+            if progreso:
+                progreso(resultado)
+
+    if agrupar_al_final:
+        _registrar_ventas(vendidos.items(), ubicacion_venta, usuario_id)
+    return resultado
+
+
+# Las funciones simular_* recorren el archivo como las ingerir_* pero sin
+# escribir nada (?dry_run=1): validan cada bloque con los mismos validadores,
+# leen los stocks sin bloquearlos y calculan los saldos en memoria. Además del
+# resumen devuelven en 'deltas' el cambio de stock proyectado por ubicación y
+# producto (ver _Proyeccion.deltas).
+
+class _Proyeccion:
+    """
+    Stock actual y proyectado de los productos en unas ubicaciones. El stock
+    actual se lee de la base (values_list, sin bloqueo) la primera vez que
+    aparece un producto; el proyectado cambia con las filas simuladas.
+    """
+
+    def __init__(self, ubicaciones):
+        self.ubicaciones = ubicaciones
+        self.leidos = set()
+        self.actuales = {}
+        self.saldos = {}
+
+    def leer(self, producto_ids):
+        faltantes = set(producto_ids) - self.leidos
+        if not faltantes:
+            return
+        stocks = Stock.objects.filter(
+            producto_id__in=faltantes,
+            ubicacion__in=self.ubicaciones,
+        ).values_list('producto_id', 'ubicacion_id', 'cantidad').order_by()
+        for producto_id, ubicacion_id, cantidad in stocks:
+            self.actuales[(producto_id, ubicacion_id)] = cantidad
+            self.saldos[(producto_id, ubicacion_id)] = cantidad
+        self.leidos |= faltantes
+
+    def disponible(self, ubicacion):
+        """Saldo proyectado por producto en `ubicacion`, solo de los que tienen stock."""
+        return {
+            producto_id: cantidad
+            for (producto_id, ubicacion_id), cantidad in self.saldos.items()
+            if ubicacion_id == ubicacion.pk
+        }
+
+    def sumar(self, producto_id, ubicacion, cantidad):
+        clave = (producto_id, ubicacion.pk)
+        self.saldos[clave] = self.saldos.get(clave, 0) + cantidad
+
+    def fijar(self, producto_id, ubicacion, cantidad):
+        self.saldos[(producto_id, ubicacion.pk)] = cantidad
+
+    def deltas(self):
+        """Los pares (ubicación, producto) cuyo stock cambiaría, ordenados."""
+        return [
+            {
+                'ubicacion_id': ubicacion_id,
+                'cod_venta': producto_id,
+                'stock_actual': self.actuales.get((producto_id, ubicacion_id), 0),
+                'delta': cantidad - self.actuales.get((producto_id, ubicacion_id), 0),
+                'stock_proyectado': cantidad,
+            }
+            for (producto_id, ubicacion_id), cantidad in sorted(
+                self.saldos.items(), key=lambda item: (item[0][1], item[0][0])
+            )
+            if cantidad != self.actuales.get((producto_id, ubicacion_id), 0)
+        ]
+
+
+def simular_carga_inicial(bloques, bodega_principal):
+    resultado = _resultado_inicial(0)
+    resultado['productos_nuevos'] = 0
+    proyeccion = _Proyeccion([bodega_principal])
+    for df in bloques:
+        errores, filas = validar_carga_inicial(df)
+        codigos = filas['cod_venta'].unique().tolist()
+        resultado['productos_nuevos'] += len(set(codigos) - set(catalogo.resolver(codigos)))
+        proyeccion.leer(codigos)
+        for cod_venta, cantidad in zip(filas['cod_venta'], filas['cantidad']):
+            proyeccion.fijar(cod_venta, bodega_principal, int(cantidad))
+        _acumular(resultado, {'procesados': len(filas), 'errores': _listar_errores(errores)})
+        _avanzar(resultado, df)
+    resultado['deltas'] = proyeccion.deltas()
+    return resultado
+
+
+def simular_transferencia(bloques, bodega_principal, ubicacion_destino):
+    resultado = _resultado_inicial(0)
+    proyeccion = _Proyeccion([bodega_principal, ubicacion_destino])
+    for df in bloques:
+        errores, codigos, cantidades = validar_transferencia(df)
+        proyeccion.leer(codigos[errores.isna()].unique().tolist())
+        disponible = proyeccion.disponible(bodega_principal)
+        transferencias = _asignar_transferencias(codigos, cantidades, errores, disponible)
+        for cod_venta, cantidad in transferencias:
+            proyeccion.sumar(cod_venta, bodega_principal, -cantidad)
+            proyeccion.sumar(cod_venta, ubicacion_destino, cantidad)
+        _acumular(resultado, {'procesados': len(transferencias), 'errores': _listar_errores(errores)})
+        _avanzar(resultado, df)
+    resultado['deltas'] = proyeccion.deltas()
+    return resultado
+
+
+def simular_ventas_diarias(bloques, ubicacion_venta):
+    """Las filas ya registradas por una carga anterior se cuentan en 'omitidos'."""
+    resultado = _resultado_inicial(0)
+    proyeccion = _Proyeccion([ubicacion_venta])
+    repeticiones = {}
+    for df in bloques:
+        nuevas, _, omitidos = _omitir_registradas(df, claves_ventas(df, repeticiones))
+        errores, codigos = validar_ventas_diarias(nuevas)
+        proyeccion.leer(codigos[errores.isna()].unique().tolist())
+        _limitar_ventas(codigos, errores, proyeccion.disponible(ubicacion_venta), ubicacion_venta)
+        vendidos = codigos[errores.isna()].value_counts()
+        for cod_venta, unidades in vendidos.items():
+            proyeccion.sumar(cod_venta, ubicacion_venta, -int(unidades))
+        _acumular(resultado, {'procesados': int(vendidos.sum()), 'errores': _listar_errores(errores), 'omitidos': omitidos})
+        _avanzar(resultado, df)
+    resultado['deltas'] = proyeccion.deltas()
+    return resultado
@@ -0,0 +1,131 @@
+"""
+Cálculos del Kardex (trazabilidad de stock de un producto) hechos en la base de datos.
+
+Los saldos históricos parten del cierre de stock (CierreStock) más cercano y
+solo recorren los movimientos posteriores a él, en vez de todo el historial.
+"""
+
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, When, Window
+
+from .models import CierreStock, MovimientoInventario, Stock
+from .paginacion import despues_del_cursor, hasta_el_cursor
+
+
+def cantidad_con_signo():
+    """
+    Expresión con el efecto de cada movimiento sobre el stock del producto:
+    positivo para las entradas y los ajustes que suman (solo tienen ubicación
+    de destino, ver servicios.registrar_ajustes) y negativo para todo lo demás
+    (ventas, salidas por transferencia, mermas y el resto de los ajustes).
+    """
+    return Case(
+        When(tipo__in=MovimientoInventario.TIPOS_ENTRADA, then=F('cantidad')),
+        When(
+            tipo=MovimientoInventario.TIPO_AJUSTE,
+            ubicacion_origen__isnull=True,
+            ubicacion_destino__isnull=False,
+            then=F('cantidad'),
+        ),
+        default=-F('cantidad'),
+        output_field=IntegerField(),
+    )
+
+
+def efecto_neto(movimientos):
+    """Suma con signo de los movimientos dados, calculada con un único aggregate."""
+    return movimientos.aggregate(neto=Sum(cantidad_con_signo()))['neto'] or 0
+
+
+def con_saldo_acumulado(movimientos):
+    """
+    Anota en cada movimiento `saldo_acumulado`: el efecto neto acumulado desde
+    el primero del queryset hasta él, en orden cronológico (SUM(...) OVER).
+    """
+    orden = [F('fecha_hora').asc(), F('id').asc()]
+    return movimientos.annotate(
+        saldo_acumulado=Window(Sum(cantidad_con_signo()), order_by=orden),
+    ).order_by(*orden)
+
+
+def _cierres_del_producto(producto):
+    # Un registro por fecha de cierre con el stock total del producto en todas las ubicaciones
+    return CierreStock.objects.filter(producto=producto).values('fecha').annotate(
+        total=Sum('cantidad'),
+        tomado_en=Max('tomado_en'),
+    )
+
+
+def stock_producto_en(producto, cursor=None):
+    """
+    Stock total del producto, según el Kardex, justo después del movimiento
+    `cursor` (fecha_hora, id). Con cursor=None, el stock antes del primer movimiento.
+
+    Parte del cierre de stock más cercano y solo recorre los movimientos entre
+    ese cierre y el cursor. Si no hay cierres, parte del stock actual.
+    """
+    movimientos = MovimientoInventario.objects.filter(producto=producto)
+    cierres = _cierres_del_producto(producto)
+
+    if cursor:
+        anterior = cierres.filter(tomado_en__lte=cursor[0]).order_by('-tomado_en').first()
+        if anterior:
+            posteriores = movimientos.filter(fecha_hora__gt=anterior['tomado_en'])
+            return anterior['total'] + efecto_neto(hasta_el_cursor(posteriores, cursor))
+        cierres = cierres.filter(tomado_en__gt=cursor[0])
+
+    # Retroceder desde el primer cierre posterior, o desde el stock actual
+    siguiente = cierres.order_by('tomado_en').first()
+    if siguiente:
+        saldo = siguiente['total']
+        movimientos = movimientos.filter(fecha_hora__lte=siguiente['tomado_en'])
+    else:
+        saldo = Stock.objects.filter(producto=producto).aggregate(total=Sum('cantidad'))['total'] or 0
+    if cursor:
+        movimientos = despues_del_cursor(movimientos, cursor)
+    return saldo - efecto_neto(movimientos)
+
+
+def _efecto_en_ubicacion(ubicacion):
+    # Lo que entra a la ubicación suma y lo que sale de ella resta
+    return Case(
+        When(ubicacion_destino=ubicacion, then=F('cantidad')),
+        When(ubicacion_origen=ubicacion, then=-F('cantidad')),
+        default=0,
+        output_field=IntegerField(),
+    )
+
+
+def stock_en_ubicacion(ubicacion, momento, producto=None):
+    """
+    Stock de cada producto en `ubicacion` en el instante `momento`.
+
+    Devuelve (base, saldos): una descripción del punto de partida usado y un
+    diccionario {cod_venta: cantidad}. Se parte del último cierre anterior a
+    `momento` y se suman los movimientos posteriores; si no hay cierres
+    anteriores, se parte del stock actual y se descuentan los movimientos
+    ocurridos después de `momento`.
+    """
+    cierres = CierreStock.objects.filter(ubicacion=ubicacion)
+    stocks = Stock.objects.filter(ubicacion=ubicacion)
+    movimientos = MovimientoInventario.objects.filter(Q(ubicacion_origen=ubicacion) | Q(ubicacion_destino=ubicacion))
+    if producto is not None:
+        cierres = cierres.filter(producto=producto)
+        stocks = stocks.filter(producto=producto)
+        movimientos = movimientos.filter(producto=producto)
+
+    anterior = cierres.filter(tomado_en__lte=momento).order_by('-tomado_en').values('fecha', 'tomado_en').first()
+    if anterior:
+        base = f"Cierre del {anterior['fecha']}"
+        saldos = dict(cierres.filter(fecha=anterior['fecha']).values_list('producto_id', 'cantidad'))
+        movimientos = movimientos.filter(fecha_hora__gt=anterior['tomado_en'], fecha_hora__lte=momento)
+        signo = 1
+    else:
+        base = 'Stock actual'
+        saldos = dict(stocks.values_list('producto_id', 'cantidad'))
+        movimientos = movimientos.filter(fecha_hora__gt=momento)
+        signo = -1
+
+    efectos = movimientos.values('producto_id').annotate(neto=Sum(_efecto_en_ubicacion(ubicacion)))
+    for efecto in efectos:
+        saldos[efecto['producto_id']] = saldos.get(efecto['producto_id'], 0) + signo * efecto['neto']
+    return base, saldos
@@ -0,0 +1,42 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from inventario.ingesta import TAMANO_LOTE
+from inventario.models import CierreStock, Stock
+
+
+class Command(BaseCommand):
+    help = 'Guarda una foto del stock actual de cada producto y ubicación (cierre del día).'
+
+    def handle(self, *args, **options):
+        total = 0
+
+        with transaction.atomic():
+            # Los movimientos escriben el stock antes de crearse (y de tomar su
+            # fecha_hora) y en la misma transacción. Con la tabla de stock en
+            # modo SHARE se espera a los que están en curso y los nuevos quedan
+            # esperando hasta el final del cierre: todo movimiento con
+            # fecha_hora <= tomado_en está en la foto y ninguno posterior.
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LOCK TABLE {connection.ops.quote_name(Stock._meta.db_table)} IN SHARE MODE')
+            tomado_en = timezone.now()
+            fecha = timezone.localdate(tomado_en)
+
+            stocks = Stock.objects.values_list('producto_id', 'ubicacion_id', 'cantidad').iterator(chunk_size=TAMANO_LOTE)
+            while lote := list(islice(stocks, TAMANO_LOTE)):
+                CierreStock.objects.bulk_create(
+                    [
+                        CierreStock(producto_id=producto_id, ubicacion_id=ubicacion_id, fecha=fecha, cantidad=cantidad, tomado_en=tomado_en)
+                        for producto_id, ubicacion_id, cantidad in lote
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['producto', 'ubicacion', 'fecha'],
+                    update_fields=['cantidad', 'tomado_en'],
+                )
+                total += len(lote)
+
+        self.stdout.write(f'Cierre de stock del {fecha}: {total} registros.')
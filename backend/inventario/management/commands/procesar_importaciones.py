@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from inventario.importaciones import ejecutar_trabajo, reclamar_trabajo, reintentar_trabajo, trabajos_por_procesar
+
+
+class Command(BaseCommand):
+    help = (
+        'Procesa las importaciones CSV que quedaron pendientes o detenidas a medias '
+        '(por ejemplo, tras reiniciar el servidor).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reintentar', nargs='+', type=int, default=[], metavar='ID',
+            help='Vuelve a procesar estos trabajos terminados con error, desde sus filas confirmadas.',
+        )
+
+    def handle(self, *args, **options):
+        for trabajo_id in options['reintentar']:
+            if not reintentar_trabajo(trabajo_id):
+                self.stderr.write(f'La importación {trabajo_id} no se puede reintentar (no terminó con error, ya no tiene su archivo u otra subida tomó el mismo archivo).')
+
+        pendientes = trabajos_por_procesar().values_list('pk', flat=True)
+
+        for trabajo_id in pendientes:
+            trabajo = reclamar_trabajo(trabajo_id)
+            if trabajo is None:
+                continue
+            ejecutar_trabajo(trabajo)
+            self.stdout.write(f'Importación {trabajo.pk} ({trabajo.nombre_archivo}): {trabajo.get_estado_display()}. {trabajo.mensaje}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventario.servicios import recalcular_totales
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el stock total por producto (ProductoStockTotal) a partir de la tabla Stock.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = recalcular_totales()
+        self.stdout.write(f'Stock total reconstruido: {total} productos.')
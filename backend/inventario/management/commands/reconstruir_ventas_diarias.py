@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventario.resumenes import reconstruir_ventas_diarias
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de ventas (VentaDiaria) a partir de los movimientos.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = reconstruir_ventas_diarias()
+        self.stdout.write(f'Resumen de ventas reconstruido: {total} registros.')
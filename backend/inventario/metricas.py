@@ -0,0 +1,218 @@
+"""
+Instrumentación de las peticiones: consultas SQL, tiempo en la base de
+datos, tiempo de serialización, tiempo de renderizado y tamaño de la respuesta.
+
+MetricasMiddleware mide cada petición y:
+
+- agrega la cabecera Server-Timing (visible en las herramientas del navegador)
+- escribe una línea JSON en el logger 'inventario.metricas'
+- acumula histogramas por nombre de URL, que /api/metrics/ expone en el
+  formato de texto de Prometheus si METRICAS_EXPONER está activo
+
+La serialización es el tiempo dentro de to_representation de los serializers
+con SerializacionMedida (más los bloques marcados con midiendo_serializacion);
+las consultas que dispare se cuentan también en la base de datos. El
+renderizado es lo que tarda el renderer de DRF en codificar los datos ya
+serializados (JSON).
+
+Solo se mide lo que ocurre antes de que el middleware devuelva la respuesta.
+Una StreamingHttpResponse (reporte en JSON lines, exportación CSV) consulta
+la base de datos mientras el servidor envía el cuerpo: esas consultas, su
+tiempo y el tamaño de la respuesta no se cuentan.
+
+Los histogramas viven en la memoria de cada proceso: con varios workers,
+cada uno expone sus propias cifras.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores de los buckets de cada histograma
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BUCKETS_BYTES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class _Histograma:
+    __slots__ = ('limites', 'cuentas', 'suma', 'total')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.cuentas = [0] * len(limites)
+        self.suma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.cuentas[i] += 1
+        self.suma += valor
+        self.total += 1
+
+
+class RegistroMetricas:
+    """Histogramas por (vista, método) acumulados en el proceso."""
+
+    HISTOGRAMAS = {
+        'facboa_peticion_segundos': ('Duración de la petición.', BUCKETS_SEGUNDOS),
+        'facboa_db_segundos': ('Tiempo en la base de datos por petición.', BUCKETS_SEGUNDOS),
+        'facboa_serializacion_segundos': ('Tiempo en los serializers.', BUCKETS_SEGUNDOS),
+        'facboa_render_segundos': ('Tiempo del renderer al codificar la respuesta.', BUCKETS_SEGUNDOS),
+        'facboa_consultas_sql': ('Consultas SQL por petición.', BUCKETS_CONSULTAS),
+        'facboa_respuesta_bytes': ('Tamaño de la respuesta.', BUCKETS_BYTES),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observar(self, vista, metodo, valores):
+        with self._lock:
+            for nombre, valor in valores.items():
+                if valor is None:
+                    continue
+                clave = (nombre, vista, metodo)
+                if clave not in self._series:
+                    self._series[clave] = _Histograma(self.HISTOGRAMAS[nombre][1])
+                self._series[clave].observar(valor)
+
+    def exponer(self):
+        """Devuelve las métricas en el formato de texto de Prometheus."""
+        lineas = []
+        with self._lock:
+            for nombre, (ayuda, _) in self.HISTOGRAMAS.items():
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} histogram')
+                for (serie, vista, metodo), histograma in sorted(self._series.items()):
+                    if serie != nombre:
+                        continue
+                    etiquetas = f'vista="{vista}",metodo="{metodo}"'
+                    for limite, cuenta in zip(histograma.limites, histograma.cuentas):
+                        lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {cuenta}')
+                    lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {histograma.total}')
+                    lineas.append(f'{nombre}_sum{{{etiquetas}}} {histograma.suma}')
+                    lineas.append(f'{nombre}_count{{{etiquetas}}} {histograma.total}')
+        return '\n'.join(lineas) + '\n'
+
+
+registro = RegistroMetricas()
+
+
+class _Medicion:
+    __slots__ = ('consultas', 'db', 'serializacion', 'serializando', 'inicio_render', 'render')
+
+    def __init__(self):
+        self.consultas = 0
+        self.db = 0.0
+        self.serializacion = None
+        self.serializando = False
+        self.inicio_render = None
+        self.render = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: se llama en cada consulta de la conexión
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+# Medición de la petición en curso, para los serializers
+_medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+
+@contextmanager
+def midiendo_serializacion():
+    """Suma lo que tarda el bloque al tiempo de serialización de la petición en curso."""
+    medicion = _medicion_actual.get()
+    # Un serializer anidado ya se está midiendo dentro del que lo contiene
+    if medicion is None or medicion.serializando:
+        yield
+        return
+    medicion.serializando = True
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.serializacion = (medicion.serializacion or 0.0) + time.perf_counter() - inicio
+        medicion.serializando = False
+
+
+class SerializacionMedida:
+    """Mixin para serializers de DRF: su to_representation cuenta como tiempo de serialización."""
+
+    def to_representation(self, instance):
+        with midiendo_serializacion():
+            return super().to_representation(instance)
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = _Medicion()
+        request._medicion = medicion
+        actual = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(actual)
+        total = time.perf_counter() - inicio
+
+        tamano = None if response.streaming else len(response.content)
+        response['Server-Timing'] = ', '.join(filter(None, [
+            f'db;desc="{medicion.consultas} consultas";dur={medicion.db * 1000:.1f}',
+            f'ser;desc="serializers";dur={medicion.serializacion * 1000:.1f}' if medicion.serializacion is not None else None,
+            f'render;desc="renderer";dur={medicion.render * 1000:.1f}' if medicion.render is not None else None,
+            f'total;dur={total * 1000:.1f}',
+        ]))
+
+        match = request.resolver_match
+        vista = (match.view_name if match else None) or 'sin_ruta'
+        registro.observar(vista, request.method, {
+            'facboa_peticion_segundos': total,
+            'facboa_db_segundos': medicion.db,
+            'facboa_serializacion_segundos': medicion.serializacion,
+            'facboa_render_segundos': medicion.render,
+            'facboa_consultas_sql': medicion.consultas,
+            'facboa_respuesta_bytes': tamano,
+        })
+        logger.info(json.dumps({
+            'vista': vista,
+            'metodo': request.method,
+            'ruta': request.path,
+            'estado': response.status_code,
+            'ms': round(total * 1000, 1),
+            'db_ms': round(medicion.db * 1000, 1),
+            'consultas': medicion.consultas,
+            'serializacion_ms': round(medicion.serializacion * 1000, 1) if medicion.serializacion is not None else None,
+            'render_ms': round(medicion.render * 1000, 1) if medicion.render is not None else None,
+            'bytes': tamano,
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        # Las respuestas de DRF se renderizan (se codifican a JSON) justo después de esto
+        medicion = request._medicion
+        medicion.inicio_render = time.perf_counter()
+
+        def fin_render(respuesta):
+            medicion.render = time.perf_counter() - medicion.inicio_render
+
+        response.add_post_render_callback(fin_render)
+        return response
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoImportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('carga_inicial', 'Carga Inicial'), ('transferencia', 'Transferencia'), ('ventas_diarias', 'Ventas Diarias')], max_length=20)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20)),
+                ('archivo', models.CharField(help_text='Ruta del archivo subido en el almacenamiento por defecto.', max_length=255)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('filas_ok', models.PositiveIntegerField(default=0)),
+                ('errores', models.JSONField(blank=True, default=list)),
+                ('mensaje', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('iniciado', models.DateTimeField(blank=True, null=True)),
+                ('actualizado', models.DateTimeField(blank=True, help_text='Último avance guardado. Si deja de cambiar, el trabajo se considera detenido.', null=True)),
+                ('finalizado', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
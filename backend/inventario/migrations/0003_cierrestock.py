@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0002_trabajoimportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CierreStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.IntegerField()),
+                ('tomado_en', models.DateTimeField(help_text='Momento exacto en que se tomó la foto del stock.')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres', to='inventario.producto')),
+                ('ubicacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cierres', to='inventario.ubicacion')),
+            ],
+            options={
+                'unique_together': {('producto', 'ubicacion', 'fecha')},
+            },
+        ),
+    ]
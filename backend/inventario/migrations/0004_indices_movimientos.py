@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+# El índice BRIN es propio de PostgreSQL: en otros motores (SQLite en
+# desarrollo o benchmarks) la operación no hace nada.
+def crear_indice_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS mov_fecha_brin_idx '
+            'ON inventario_movimientoinventario USING brin (fecha_hora)'
+        )
+
+
+def eliminar_indice_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS mov_fecha_brin_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0003_cierrestock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['producto', 'fecha_hora', 'id'], name='mov_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['tipo', 'fecha_hora'], name='mov_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(condition=models.Q(('tipo', 'venta')), fields=['fecha_hora'], name='mov_venta_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(condition=models.Q(('tipo', 'venta')), fields=['producto', 'cantidad'], name='mov_venta_producto_idx'),
+        ),
+        migrations.RunPython(crear_indice_brin, eliminar_indice_brin),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+
+# Carga el resumen con las ventas ya registradas (igual que reconstruir_ventas_diarias)
+def poblar_ventas_diarias(apps, schema_editor):
+    MovimientoInventario = apps.get_model('inventario', 'MovimientoInventario')
+    VentaDiaria = apps.get_model('inventario', 'VentaDiaria')
+    agregados = MovimientoInventario.objects.filter(tipo='venta').annotate(
+        fecha=TruncDate('fecha_hora'),
+    ).values('fecha', 'producto_id', 'ubicacion_origen_id').annotate(
+        unidades=Sum('cantidad'),
+        ingresos=Sum(ExpressionWrapper(F('cantidad') * F('producto__precio'), output_field=DecimalField(max_digits=14, decimal_places=2))),
+    ).order_by()
+    VentaDiaria.objects.bulk_create(
+        [
+            VentaDiaria(
+                fecha=fila['fecha'],
+                producto_id=fila['producto_id'],
+                ubicacion_id=fila['ubicacion_origen_id'],
+                unidades=fila['unidades'],
+                ingresos=fila['ingresos'],
+            )
+            for fila in agregados
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_indices_movimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='inventario.producto')),
+                ('ubicacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='inventario.ubicacion')),
+            ],
+            options={
+                'unique_together': {('fecha', 'producto', 'ubicacion')},
+            },
+        ),
+        migrations.RunPython(poblar_ventas_diarias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_ventadiaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['-fecha_hora', '-id'], name='mov_fecha_id_idx'),
+        ),
+    ]
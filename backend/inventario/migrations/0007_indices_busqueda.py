@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:37
+
+from django.db import migrations
+
+
+# Índices para la búsqueda de productos (inventario/busqueda.py). Son propios
+# de PostgreSQL: en otros motores la operación no hace nada y la búsqueda
+# usa la clave primaria para los prefijos de código.
+INDICES_BUSQUEDA = [
+    # Prefijo de código de venta: LIKE 'X%' con cualquier collation
+    ('prod_cod_venta_patron_idx', 'btree (cod_venta varchar_pattern_ops)'),
+    # Coincidencias parciales sin distinguir mayúsculas (UPPER(...) LIKE '%X%')
+    ('prod_cod_venta_trgm_idx', 'gin (UPPER(cod_venta::text) gin_trgm_ops)'),
+    ('prod_id_fabrica_trgm_idx', 'gin (UPPER(id_fabrica::text) gin_trgm_ops)'),
+    ('prod_descripcion_trgm_idx', 'gin (UPPER(descripcion::text) gin_trgm_ops)'),
+]
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for nombre, definicion in INDICES_BUSQUEDA:
+            schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {nombre} ON inventario_producto USING {definicion}')
+
+
+def eliminar_indices_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for nombre, _ in INDICES_BUSQUEDA:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_indice_reportes'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices_busqueda, eliminar_indices_busqueda),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+
+# Carga los totales con el stock actual (igual que reconstruir_stock_total)
+def poblar_stock_total(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    ProductoStockTotal = apps.get_model('inventario', 'ProductoStockTotal')
+    filas = Producto.objects.annotate(total=Coalesce(Sum('stock__cantidad'), 0)).values_list(
+        'cod_venta', 'total', 'stock_minimo', 'stock_critico', 'stock_maximo',
+    ).order_by()
+    ProductoStockTotal.objects.bulk_create(
+        [
+            ProductoStockTotal(
+                producto_id=cod_venta,
+                cantidad=total,
+                stock_minimo=stock_minimo,
+                stock_critico=stock_critico,
+                stock_maximo=stock_maximo,
+            )
+            for cod_venta, total, stock_minimo, stock_critico, stock_maximo in filas
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_indices_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoStockTotal',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_total', serialize=False, to='inventario.producto')),
+                ('cantidad', models.IntegerField(default=0)),
+                ('stock_minimo', models.PositiveIntegerField(default=0)),
+                ('stock_critico', models.PositiveIntegerField(default=0)),
+                ('stock_maximo', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('cantidad__lt', models.F('stock_critico'))), fields=['cantidad'], name='stocktotal_critico_idx'), models.Index(condition=models.Q(('cantidad__lt', models.F('stock_minimo'))), fields=['cantidad'], name='stocktotal_minimo_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_stock_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_productostocktotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroIngesta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=150, unique=True)),
+                ('tipo', models.CharField(choices=[('carga_inicial', 'Carga Inicial'), ('transferencia', 'Transferencia'), ('ventas_diarias', 'Ventas Diarias')], max_length=20)),
+                ('huella', models.CharField(help_text='SHA-256 del contenido del archivo.', max_length=64)),
+                ('fecha', models.DateField(blank=True, help_text='Fecha AAAAMMDD tomada del nombre del archivo.', null=True)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('estado', models.CharField(choices=[('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('error', 'Error')], default='en_proceso', max_length=20)),
+                ('filas_confirmadas', models.PositiveIntegerField(default=0, help_text='Filas del archivo ya aplicadas y confirmadas.')),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(blank=True, help_text='Última vez que la carga confirmó filas.', null=True)),
+                ('completado', models.DateTimeField(blank=True, null=True)),
+                ('trabajo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registros', to='inventario.trabajoimportacion')),
+                ('ubicacion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventario.ubicacion')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClaveIngesta',
+            fields=[
+                ('clave', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('registro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claves', to='inventario.registroingesta')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_registroingesta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimientoinventario',
+            name='fecha_venta',
+            field=models.DateField(blank=True, help_text='Día de la venta según el archivo de ventas, que puede cargarse días después. Vacío en el resto de los movimientos.', null=True),
+        ),
+    ]
@@ -96,7 +96,32 @@ class Stock(models.Model):
         unique_together = ('producto', 'ubicacion')
 
     def __str__(self):
-        return f"{self.cantidad} de {self.producto.cod_venta} en {self.ubicacion.nombre}"
+        return f"{self.cantidad} de {self.producto_id} en {self.ubicacion.nombre}"
+
+class ProductoStockTotal(models.Model):
+    """
+    Stock total de un producto (suma de todas sus ubicaciones), con sus
+    umbrales copiados de Producto. Lo mantienen al día las escrituras de
+    stock (ver inventario.servicios) y se puede reconstruir con
+    `python manage.py reconstruir_stock_total`.
+
+    Los índices parciales solo contienen los productos bajo su umbral, así las
+    alertas de reposición se leen del índice sin sumar la tabla Stock.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='stock_total')
+    cantidad = models.IntegerField(default=0)
+    stock_minimo = models.PositiveIntegerField(default=0)
+    stock_critico = models.PositiveIntegerField(default=0)
+    stock_maximo = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cantidad'], condition=models.Q(cantidad__lt=models.F('stock_critico')), name='stocktotal_critico_idx'),
+            models.Index(fields=['cantidad'], condition=models.Q(cantidad__lt=models.F('stock_minimo')), name='stocktotal_minimo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} de {self.producto_id} en total"
 
 class MovimientoInventario(models.Model):
     """
@@ -117,6 +142,9 @@ class MovimientoInventario(models.Model):
         (TIPO_AJUSTE, 'Ajuste Manual'),
         (TIPO_MERMA, 'Merma'),
     ]
+
+    # Tipos que suman stock al producto; el resto lo descuenta (ver inventario.kardex)
+    TIPOS_ENTRADA = (TIPO_ENTRADA_COMPRA, TIPO_TRANSFERENCIA_ENTRADA)
     
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
     tipo = models.CharField(max_length=25, choices=TIPO_CHOICES)
@@ -126,6 +154,159 @@ class MovimientoInventario(models.Model):
     ubicacion_origen = models.ForeignKey(Ubicacion, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_salida')
     ubicacion_destino = models.ForeignKey(Ubicacion, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_entrada')
     detalle = models.TextField(blank=True, null=True)
+    fecha_venta = models.DateField(null=True, blank=True, help_text="Día de la venta según el archivo de ventas, que puede cargarse días después. Vacío en el resto de los movimientos.")
+
+    class Meta:
+        # Índices según los accesos más frecuentes. El índice BRIN sobre
+        # fecha_hora solo existe en PostgreSQL (ver migración 0004).
+        indexes = [
+            # Kardex: movimientos de un producto en orden cronológico
+            models.Index(fields=['producto', 'fecha_hora', 'id'], name='mov_producto_fecha_idx'),
+            # Reportes sin filtros: páginas por cursor del más reciente al más antiguo
+            models.Index(fields=['-fecha_hora', '-id'], name='mov_fecha_id_idx'),
+            # Dashboard y reportes filtrados por tipo y rango de fechas
+            models.Index(fields=['tipo', 'fecha_hora'], name='mov_tipo_fecha_idx'),
+            # Agregados de ventas (evolución mensual y más vendidos)
+            models.Index(fields=['fecha_hora'], condition=models.Q(tipo='venta'), name='mov_venta_fecha_idx'),
+            models.Index(fields=['producto', 'cantidad'], condition=models.Q(tipo='venta'), name='mov_venta_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de {self.cantidad} de {self.producto_id} el {self.fecha_hora.strftime('%Y-%m-%d %H:%M')}"
+
+
+class CierreStock(models.Model):
+    """
+    Foto del stock de un producto en una ubicación al cierre de un día.
+    Sirve de punto de partida para calcular el stock en una fecha pasada sin
+    recorrer todo el historial de movimientos (ver inventario.kardex).
+    Se genera con `python manage.py generar_cierre_stock`.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='cierres')
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.CASCADE, related_name='cierres')
+    fecha = models.DateField()
+    cantidad = models.IntegerField()
+    tomado_en = models.DateTimeField(help_text="Momento exacto en que se tomó la foto del stock.")
+
+    class Meta:
+        unique_together = ('producto', 'ubicacion', 'fecha')
+
+    def __str__(self):
+        return f"{self.cantidad} de {self.producto_id} en {self.ubicacion.nombre} al {self.fecha}"
+
+
+class VentaDiaria(models.Model):
+    """
+    Resumen de ventas por día, producto y ubicación. El día es el de la venta
+    (fecha_venta del movimiento, o el de su registro si no la tiene).
+    Se actualiza al registrar ventas y alimenta el dashboard, de modo que sus
+    consultas no recorren la tabla completa de movimientos. Se puede
+    reconstruir con `python manage.py reconstruir_ventas_diarias`.
+    """
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas_diarias')
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.CASCADE, null=True, blank=True, related_name='ventas_diarias')
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('fecha', 'producto', 'ubicacion')
+
+    def __str__(self):
+        return f"{self.unidades} de {self.producto_id} el {self.fecha}"
+
+class TrabajoImportacion(models.Model):
+    """
+    Carga CSV que se procesa en segundo plano.
+    Guarda el archivo subido, el avance y el resultado para que el cliente
+    pueda consultarlo mientras la importación se ejecuta.
+    """
+    TIPO_CARGA_INICIAL = 'carga_inicial'
+    TIPO_TRANSFERENCIA = 'transferencia'
+    TIPO_VENTAS_DIARIAS = 'ventas_diarias'
+
+    TIPO_CHOICES = [
+        (TIPO_CARGA_INICIAL, 'Carga Inicial'),
+        (TIPO_TRANSFERENCIA, 'Transferencia'),
+        (TIPO_VENTAS_DIARIAS, 'Ventas Diarias'),
+    ]
+
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_EN_PROCESO = 'en_proceso'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_EN_PROCESO, 'En Proceso'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+    archivo = models.CharField(max_length=255, help_text="Ruta del archivo subido en el almacenamiento por defecto.")
+    nombre_archivo = models.CharField(max_length=255)
+    parametros = models.JSONField(default=dict, blank=True)
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    filas_ok = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True)
+    mensaje = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    iniciado = models.DateTimeField(null=True, blank=True)
+    actualizado = models.DateTimeField(null=True, blank=True, help_text="Último avance guardado. Si deja de cambiar, el trabajo se considera detenido.")
+    finalizado = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.nombre_archivo} ({self.get_estado_display()})"
+
+
+class RegistroIngesta(models.Model):
+    """
+    Archivo CSV ya recibido, identificado por el tipo de carga, la ubicación,
+    la fecha del nombre del archivo y el hash SHA-256 de su contenido (todo
+    junto en `clave`). Si el mismo archivo se vuelve a subir se detecta con una
+    búsqueda por `clave` y no se aplica de nuevo; si el intento anterior falló
+    o se detuvo, la carga continúa desde `filas_confirmadas`. La carga inicial
+    fija el stock, así que volver a subirla siempre la aplica de nuevo.
+    """
+    ESTADO_EN_PROCESO = 'en_proceso'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+
+    ESTADO_CHOICES = [
+        (ESTADO_EN_PROCESO, 'En Proceso'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    ]
+
+    clave = models.CharField(max_length=150, unique=True)
+    tipo = models.CharField(max_length=20, choices=TrabajoImportacion.TIPO_CHOICES)
+    huella = models.CharField(max_length=64, help_text="SHA-256 del contenido del archivo.")
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha = models.DateField(null=True, blank=True, help_text="Fecha AAAAMMDD tomada del nombre del archivo.")
+    nombre_archivo = models.CharField(max_length=255)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_EN_PROCESO)
+    filas_confirmadas = models.PositiveIntegerField(default=0, help_text="Filas del archivo ya aplicadas y confirmadas.")
+    trabajo = models.ForeignKey(TrabajoImportacion, on_delete=models.SET_NULL, null=True, blank=True, related_name='registros')
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(null=True, blank=True, help_text="Última vez que la carga confirmó filas.")
+    completado = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.nombre_archivo} ({self.get_estado_display()})"
+
+
+class ClaveIngesta(models.Model):
+    """
+    Clave de idempotencia de una fila ya aplicada. En las ventas es el SHA-1 de
+    timestamp, lugar, id_venta y el número de repetición de esa combinación en
+    el archivo, de modo que una fila ya registrada no descuenta stock otra vez
+    aunque llegue en un archivo distinto (por ejemplo, reexportado con más ventas).
+    """
+    clave = models.CharField(max_length=40, primary_key=True)
+    registro = models.ForeignKey(RegistroIngesta, on_delete=models.CASCADE, related_name='claves')
 
     def __str__(self):
-        return f"{self.get_tipo_display()} de {self.cantidad} de {self.producto.cod_venta} el {self.fecha_hora.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return self.clave
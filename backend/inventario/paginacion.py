@@ -0,0 +1,72 @@
+"""
+Paginación por cursor (keyset) sobre (fecha_hora, id).
+
+En vez de OFFSET, cada página se pide a partir del último movimiento de la
+anterior, así el costo de una página no depende de cuántas hay antes.
+El cursor es un token opaco con la fecha y el id de ese movimiento.
+"""
+
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+def codificar_cursor(fecha_hora, pk):
+    valor = f'{fecha_hora.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+
+def decodificar_cursor(token):
+    """Devuelve (fecha_hora, id). Lanza ValueError si el token no es válido."""
+    try:
+        fecha_iso, pk = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        return datetime.fromisoformat(fecha_iso), int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Cursor de paginación inválido.') from e
+
+
+def despues_del_cursor(queryset, cursor, descendente=False):
+    """Filtra los registros que van después de `cursor` en el orden (fecha_hora, id)."""
+    fecha_hora, pk = cursor
+    if descendente:
+        return queryset.filter(Q(fecha_hora__lt=fecha_hora) | Q(fecha_hora=fecha_hora, id__lt=pk))
+    return queryset.filter(Q(fecha_hora__gt=fecha_hora) | Q(fecha_hora=fecha_hora, id__gt=pk))
+
+
+def hasta_el_cursor(queryset, cursor):
+    """Filtra los registros desde el inicio hasta `cursor` inclusive, en orden ascendente."""
+    fecha_hora, pk = cursor
+    return queryset.filter(Q(fecha_hora__lt=fecha_hora) | Q(fecha_hora=fecha_hora, id__lte=pk))
+
+
+class PaginacionPorCursor(BasePagination):
+    """
+    Paginación por cursor para viewsets cuyo queryset está ordenado por
+    ('-fecha_hora', '-id'). Responde {'results': [...], 'next': cursor},
+    igual que reportes_avanzados, y no hace COUNT.
+    """
+    limite = 100
+    limite_maximo = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            limite = min(int(request.query_params.get('limite', self.limite)), self.limite_maximo)
+            cursor = decodificar_cursor(request.query_params['cursor']) if request.query_params.get('cursor') else None
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
+
+        if cursor:
+            queryset = despues_del_cursor(queryset, cursor, descendente=True)
+        pagina = list(queryset[:limite + 1])
+        self.siguiente = None
+        if len(pagina) > limite:
+            pagina = pagina[:limite]
+            self.siguiente = codificar_cursor(pagina[-1].fecha_hora, pagina[-1].pk)
+        return pagina
+
+    def get_paginated_response(self, data):
+        return Response({'results': data, 'next': self.siguiente})
@@ -0,0 +1,180 @@
+"""
+Reporte de movimientos: filtros, formato de las filas y exportación a
+CSV, XLSX y Parquet.
+
+Las exportaciones recorren el queryset con un cursor del lado del servidor
+(.values().iterator()), así nunca tienen todos los movimientos en memoria.
+El CSV se envía a medida que se genera; XLSX y Parquet se escriben en un
+archivo temporal (ambos formatos necesitan cerrarse antes de poder leerse)
+y luego se envía ese archivo.
+"""
+
+import csv
+import tempfile
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MovimientoInventario
+
+REPORTE_CHUNK = 2000
+
+# Columnas que se leen para cada fila del reporte (sin instanciar modelos)
+CAMPOS_REPORTE = (
+    'id', 'fecha_hora', 'tipo', 'cantidad', 'detalle',
+    'producto__cod_venta', 'producto__descripcion', 'usuario__username',
+    'ubicacion_origen__nombre', 'ubicacion_destino__nombre',
+)
+TIPOS_MOVIMIENTO = dict(MovimientoInventario.TIPO_CHOICES)
+
+
+def filtrar_reporte(params, queryset=None):
+    """
+    Aplica los filtros del reporte (?fecha_inicio, ?fecha_fin, ?producto_id,
+    ?tipo_movimiento, ?ubicacion_id) sobre `queryset` (por defecto, todos los
+    movimientos) y ordena del más reciente al más antiguo.
+    Lanza ValueError si alguna fecha no tiene el formato AAAA-MM-DD.
+    """
+    if queryset is None:
+        queryset = MovimientoInventario.objects.all()
+
+    # Se compara fecha_hora contra límites aware (inicio del día y del día
+    # siguiente) en vez de usar __date, para que la base pueda usar los índices
+    fecha_inicio_str = params.get('fecha_inicio')
+    if fecha_inicio_str:
+        fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date()
+        queryset = queryset.filter(fecha_hora__gte=timezone.make_aware(datetime.combine(fecha_inicio, time.min)))
+
+    fecha_fin_str = params.get('fecha_fin')
+    if fecha_fin_str:
+        fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date()
+        queryset = queryset.filter(fecha_hora__lt=timezone.make_aware(datetime.combine(fecha_fin + timedelta(days=1), time.min)))
+
+    # Filtro por producto (búsqueda parcial)
+    producto_id = params.get('producto_id')
+    if producto_id:
+        queryset = queryset.filter(producto__cod_venta__icontains=producto_id)
+
+    # Filtro por tipo de movimiento
+    tipo_movimiento = params.get('tipo_movimiento')
+    if tipo_movimiento:
+        queryset = queryset.filter(tipo=tipo_movimiento)
+
+    # Filtro por ubicación (origen o destino)
+    ubicacion_id = params.get('ubicacion_id')
+    if ubicacion_id:
+        queryset = queryset.filter(Q(ubicacion_origen__id=ubicacion_id) | Q(ubicacion_destino__id=ubicacion_id))
+
+    # El id desempata movimientos con la misma fecha y hace estable el cursor
+    return queryset.order_by('-fecha_hora', '-id')
+
+
+def fila_reporte(mov):
+    """Convierte un registro de .values(*CAMPOS_REPORTE) en una fila del reporte."""
+    return {
+        "id": mov['id'],
+        "fecha_hora": mov['fecha_hora'].strftime('%Y-%m-%d %H:%M:%S'),
+        "producto_cod": mov['producto__cod_venta'],
+        "producto_desc": mov['producto__descripcion'],
+        "tipo_display": TIPOS_MOVIMIENTO.get(mov['tipo'], mov['tipo']),
+        "cantidad": mov['cantidad'],
+        "usuario": mov['usuario__username'] or 'Sistema',
+        "origen": mov['ubicacion_origen__nombre'] or 'N/A',
+        "destino": mov['ubicacion_destino__nombre'] or 'N/A',
+        "detalle": mov['detalle'],
+    }
+
+
+# Encabezados de los archivos exportados y el campo de fila_reporte de cada uno
+COLUMNAS_EXPORTACION = (
+    ('Fecha Hora', 'fecha_hora'),
+    ('Producto Código', 'producto_cod'),
+    ('Producto Descripción', 'producto_desc'),
+    ('Tipo', 'tipo_display'),
+    ('Cantidad', 'cantidad'),
+    ('Usuario', 'usuario'),
+    ('Origen', 'origen'),
+    ('Destino', 'destino'),
+    ('Detalle', 'detalle'),
+)
+
+# Filas por hoja en XLSX (el límite de Excel es 1.048.576 incluyendo el encabezado)
+FILAS_POR_HOJA_XLSX = 1_048_575
+
+
+class ExportacionNoDisponible(Exception):
+    """El formato pedido necesita un paquete que no está instalado."""
+
+
+def filas_exportacion(queryset):
+    """Recorre el reporte con un cursor del servidor y entrega una lista de valores por fila."""
+    for mov in queryset.values(*CAMPOS_REPORTE).iterator(chunk_size=REPORTE_CHUNK):
+        fila = fila_reporte(mov)
+        yield [fila[campo] for _, campo in COLUMNAS_EXPORTACION]
+
+
+class _Eco:
+    # csv.writer escribe en un archivo; este devuelve la línea para poder enviarla
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(queryset):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow([titulo for titulo, _ in COLUMNAS_EXPORTACION])
+    for fila in filas_exportacion(queryset):
+        yield escritor.writerow(fila)
+
+
+def _nueva_hoja(libro, numero):
+    hoja = libro.add_worksheet('Movimientos' if numero == 1 else f'Movimientos {numero}')
+    hoja.write_row(0, 0, [titulo for titulo, _ in COLUMNAS_EXPORTACION])
+    return hoja
+
+
+def exportar_xlsx(queryset):
+    """Escribe el reporte en un XLSX temporal en modo de memoria constante y lo devuelve abierto."""
+    try:
+        import xlsxwriter
+    except ImportError as e:
+        raise ExportacionNoDisponible('La exportación a XLSX requiere el paquete xlsxwriter.') from e
+
+    archivo = tempfile.TemporaryFile()
+    # constant_memory escribe cada fila a disco apenas se completa
+    libro = xlsxwriter.Workbook(archivo, {'constant_memory': True})
+    hoja = None
+    for i, fila in enumerate(filas_exportacion(queryset)):
+        # Al llegar al límite de filas de Excel se sigue en una hoja nueva
+        numero_fila = i % FILAS_POR_HOJA_XLSX + 1
+        if numero_fila == 1:
+            hoja = _nueva_hoja(libro, i // FILAS_POR_HOJA_XLSX + 1)
+        hoja.write_row(numero_fila, 0, fila)
+    if hoja is None:
+        _nueva_hoja(libro, 1)
+    libro.close()
+    archivo.seek(0)
+    return archivo
+
+
+def exportar_parquet(queryset):
+    """Escribe el reporte en un Parquet temporal, un grupo de filas por bloque, y lo devuelve abierto."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ExportacionNoDisponible('La exportación a Parquet requiere el paquete pyarrow.') from e
+
+    esquema = pa.schema([
+        (campo, pa.int64() if campo == 'cantidad' else pa.string())
+        for _, campo in COLUMNAS_EXPORTACION
+    ])
+    archivo = tempfile.TemporaryFile()
+    filas = filas_exportacion(queryset)
+    with pq.ParquetWriter(archivo, esquema) as escritor:
+        while lote := list(islice(filas, REPORTE_CHUNK)):
+            columnas = list(zip(*lote))
+            escritor.write_table(pa.Table.from_arrays([list(c) for c in columnas], schema=esquema))
+    archivo.seek(0)
+    return archivo
@@ -0,0 +1,135 @@
+"""
+Planificador de reposición desde la bodega principal hacia los puntos de venta.
+
+Para cada par (ubicación, producto) se calcula la velocidad de venta de los
+últimos `dias_ventana` días y el stock proyectado al cabo de `dias_cobertura`
+días. Si la proyección queda bajo stock_minimo se pide lo necesario para
+volver a stock_maximo (o a stock_minimo si no hay máximo definido). La bodega
+reparte lo que tiene entre las ubicaciones, empezando por la más urgente.
+
+Todo el cálculo se hace sobre columnas de pandas/NumPy: de la base de datos
+solo se leen tuplas (values_list) y las ventas ya agregadas por VentaDiaria,
+que resume exactamente los movimientos de venta.
+
+El plan de una ubicación se descarga en el formato de transferencia_csv
+(tras_bod_LUGAR_AAAAMMDD.csv) y se puede subir tal cual.
+"""
+
+import csv
+import io
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.db.models import Sum
+from django.utils import timezone
+
+from .catalogo import catalogo
+from .models import Producto, Stock, Ubicacion, VentaDiaria
+from .servicios import TAMANO_LOTE
+
+# Valores por defecto de la ventana de ventas y del horizonte a cubrir, en días
+DIAS_VENTANA = 28
+DIAS_COBERTURA = 7
+
+COLUMNAS_PLAN = [
+    'ubicacion_id', 'cod_venta', 'stock', 'velocidad', 'proyectado',
+    'stock_minimo', 'stock_maximo', 'sugerido', 'qty',
+]
+
+
+def _leer(queryset, columnas):
+    """Lee un values_list como DataFrame sin crear objetos del ORM."""
+    return pd.DataFrame.from_records(queryset.iterator(chunk_size=TAMANO_LOTE), columns=columnas)
+
+
+def planificar_reposicion(bodega_principal, destinos, dias_ventana=DIAS_VENTANA, dias_cobertura=DIAS_COBERTURA, hoy=None):
+    """
+    Devuelve el plan como DataFrame con las columnas de COLUMNAS_PLAN, solo
+    con los pares que necesitan reposición. 'sugerido' es lo que haría falta
+    y 'qty' lo que la bodega puede enviar.
+    """
+    hoy = hoy or timezone.localdate()
+    destino_ids = [ubicacion.pk for ubicacion in destinos]
+
+    stocks = _leer(
+        Stock.objects.filter(ubicacion_id__in=destino_ids + [bodega_principal.pk]).values_list(
+            'ubicacion_id', 'producto_id', 'cantidad',
+        ).order_by(),
+        ['ubicacion_id', 'cod_venta', 'stock'],
+    )
+    ventas = _leer(
+        VentaDiaria.objects.filter(
+            ubicacion_id__in=destino_ids,
+            fecha__gt=hoy - timedelta(days=dias_ventana),
+            fecha__lte=hoy,
+        ).values_list('ubicacion_id', 'producto_id').annotate(unidades=Sum('unidades')).order_by(),
+        ['ubicacion_id', 'cod_venta', 'unidades'],
+    )
+    umbrales = _leer(
+        Producto.objects.values_list('cod_venta', 'stock_minimo', 'stock_maximo').order_by(),
+        ['cod_venta', 'stock_minimo', 'stock_maximo'],
+    )
+
+    es_bodega = stocks['ubicacion_id'] == bodega_principal.pk
+    disponible = stocks[es_bodega].set_index('cod_venta')['stock']
+
+    # Un par (ubicación, producto) entra al plan si el producto tiene mínimo,
+    # aunque en esa ubicación no tenga stock ni ventas recientes, o si tiene
+    # stock o ventas allí. Stock y ventas se agregan después a esos pares.
+    con_minimo = umbrales.loc[umbrales['stock_minimo'] > 0, ['cod_venta']]
+    pares = pd.concat([
+        con_minimo.merge(pd.DataFrame({'ubicacion_id': destino_ids}), how='cross'),
+        stocks.loc[~es_bodega, ['ubicacion_id', 'cod_venta']],
+        ventas[['ubicacion_id', 'cod_venta']],
+    ]).drop_duplicates()
+
+    plan = pares.merge(stocks[~es_bodega], on=['ubicacion_id', 'cod_venta'], how='left')
+    plan = plan.merge(ventas, on=['ubicacion_id', 'cod_venta'], how='left')
+    plan = plan.merge(umbrales, on='cod_venta', how='inner')
+    plan[['stock', 'unidades']] = plan[['stock', 'unidades']].fillna(0).astype('int64')
+
+    plan['velocidad'] = plan['unidades'] / dias_ventana
+    plan['proyectado'] = plan['stock'] - plan['velocidad'] * dias_cobertura
+    objetivo = np.where(plan['stock_maximo'] > 0, plan['stock_maximo'], plan['stock_minimo'])
+    plan['sugerido'] = np.ceil(objetivo - plan['proyectado']).clip(lower=0).astype('int64')
+    plan = plan[(plan['proyectado'] < plan['stock_minimo']) & (plan['sugerido'] > 0)]
+
+    # Repartir el stock de la bodega: por producto, de la proyección más baja a
+    # la más alta, cada ubicación recibe lo que queda después de las anteriores
+    plan = plan.sort_values(['cod_venta', 'proyectado', 'ubicacion_id'], kind='stable')
+    en_bodega = plan['cod_venta'].map(disponible).fillna(0).astype('int64')
+    pedido_antes = plan.groupby('cod_venta')['sugerido'].cumsum() - plan['sugerido']
+    plan['qty'] = (en_bodega - pedido_antes).clip(lower=0, upper=plan['sugerido'])
+
+    plan['proyectado'] = plan['proyectado'].round(2)
+    plan['velocidad'] = plan['velocidad'].round(3)
+    return plan[COLUMNAS_PLAN].reset_index(drop=True)
+
+
+def nombre_archivo_transferencia(ubicacion, fecha=None):
+    """Nombre que espera transferencia_csv para enviar a `ubicacion`."""
+    fecha = fecha or timezone.localdate()
+    return f'tras_bod_{ubicacion.nombre}_{fecha:%Y%m%d}.csv'
+
+
+def plan_a_csv(plan):
+    """
+    Escribe las filas del plan con qty > 0 en el formato de transferencia_csv
+    (cod_venta, description, price, qty). El plan debe ser de una sola ubicación.
+    """
+    enviar = plan[plan['qty'] > 0]
+    productos = catalogo.resolver(enviar['cod_venta'].tolist())
+
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(['cod_venta', 'description', 'price', 'qty'])
+    for cod_venta, qty in zip(enviar['cod_venta'], enviar['qty']):
+        producto = productos[cod_venta]
+        escritor.writerow([cod_venta, producto.descripcion, producto.precio, int(qty)])
+    return salida.getvalue()
+
+
+def destinos_reposicion():
+    """Ubicaciones activas que se abastecen desde la bodega principal."""
+    return list(Ubicacion.objects.filter(activa=True).exclude(tipo=Ubicacion.TIPO_BODEGA_PRINCIPAL))
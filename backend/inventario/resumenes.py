@@ -0,0 +1,47 @@
+"""
+Reconstrucción del resumen diario de ventas (VentaDiaria).
+
+La actualización incremental la hacen las cargas al registrar ventas
+(ver ingesta.acumular_ventas_diarias).
+"""
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+from .cache_dashboard import invalidar_dashboard
+from .ingesta import TAMANO_LOTE
+from .models import MovimientoInventario, VentaDiaria
+
+
+def reconstruir_ventas_diarias():
+    """
+    Vuelve a generar todo el resumen a partir de los movimientos de venta.
+    Devuelve la cantidad de registros creados. Debe llamarse dentro de una transacción.
+    """
+    VentaDiaria.objects.all().delete()
+    transaction.on_commit(invalidar_dashboard)
+
+    agregados = MovimientoInventario.objects.filter(
+        tipo=MovimientoInventario.TIPO_VENTA,
+    ).annotate(
+        # Las ventas cargadas por CSV guardan su día; el resto, el de su registro
+        fecha=Coalesce('fecha_venta', TruncDate('fecha_hora')),
+    ).values(
+        'fecha', 'producto_id', 'ubicacion_origen_id',
+    ).annotate(
+        unidades=Sum('cantidad'),
+        ingresos=Sum(ExpressionWrapper(F('cantidad') * F('producto__precio'), output_field=DecimalField(max_digits=14, decimal_places=2))),
+    ).order_by()
+
+    resumenes = (
+        VentaDiaria(
+            fecha=fila['fecha'],
+            producto_id=fila['producto_id'],
+            ubicacion_id=fila['ubicacion_origen_id'],
+            unidades=fila['unidades'],
+            ingresos=fila['ingresos'],
+        )
+        for fila in agregados.iterator(chunk_size=TAMANO_LOTE)
+    )
+    return len(VentaDiaria.objects.bulk_create(resumenes, batch_size=TAMANO_LOTE))
@@ -1,12 +1,13 @@
 from rest_framework import serializers
+from .metricas import SerializacionMedida
 from .models import Producto, Ubicacion
 
-class ProductoSerializer(serializers.ModelSerializer):
+class ProductoSerializer(SerializacionMedida, serializers.ModelSerializer):
     class Meta:
         model = Producto
         fields = ['cod_venta', 'id_fabrica', 'descripcion', 'precio', 'costo']
 
-class UbicacionSerializer(serializers.ModelSerializer):
+class UbicacionSerializer(SerializacionMedida, serializers.ModelSerializer):
     class Meta:
         model = Ubicacion
         fields = '__all__'
@@ -18,7 +19,7 @@ from .models import Producto, Ubicacion, MovimientoInventario, Usuario # Asegúr
 
 # ... (serializers anteriores) ...
 
-class MovimientoInventarioSerializer(serializers.ModelSerializer):
+class MovimientoInventarioSerializer(SerializacionMedida, serializers.ModelSerializer):
     """
     Serializador detallado para mostrar el historial de movimientos.
     """
@@ -37,10 +38,62 @@ class MovimientoInventarioSerializer(serializers.ModelSerializer):
         # Ordena los resultados por fecha, del más reciente al más antiguo
         read_only_fields = ('fecha_hora',)
         
+class MovimientoLecturaSerializer(SerializacionMedida, serializers.ModelSerializer):
+    """
+    Serializador plano para listar movimientos. Solo lee columnas del propio
+    movimiento y de las relaciones traídas con select_related, sin llamar a
+    __str__ de los objetos relacionados.
+    """
+    producto_nombre = serializers.SerializerMethodField()
+    usuario_nombre = serializers.CharField(source='usuario.username', read_only=True, default=None)
+    ubicacion_origen_nombre = serializers.CharField(source='ubicacion_origen.nombre', read_only=True, default=None)
+    ubicacion_destino_nombre = serializers.CharField(source='ubicacion_destino.nombre', read_only=True, default=None)
+    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
+
+    class Meta:
+        model = MovimientoInventario
+        fields = (
+            'id', 'fecha_hora', 'tipo', 'tipo_display', 'cantidad',
+            'producto', 'producto_nombre', 'usuario', 'usuario_nombre',
+            'ubicacion_origen', 'ubicacion_origen_nombre',
+            'ubicacion_destino', 'ubicacion_destino_nombre', 'detalle',
+        )
+        read_only_fields = fields
+
+    def get_producto_nombre(self, obj):
+        return f"{obj.producto_id} - {obj.producto.descripcion}"
+
+class MovimientoEscrituraSerializer(SerializacionMedida, serializers.ModelSerializer):
+    """
+    Serializador para registrar movimientos manuales. Solo valida los datos:
+    el stock lo modifica servicios.registrar_movimiento.
+    """
+    class Meta:
+        model = MovimientoInventario
+        fields = ('id', 'fecha_hora', 'tipo', 'producto', 'cantidad', 'ubicacion_origen', 'ubicacion_destino', 'detalle')
+        read_only_fields = ('id', 'fecha_hora')
+
+    def validate_cantidad(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('La cantidad debe ser mayor que 0.')
+        return value
+
+    def validate(self, data):
+        origen = data.get('ubicacion_origen')
+        destino = data.get('ubicacion_destino')
+        if data['tipo'] in MovimientoInventario.TIPOS_ENTRADA:
+            if destino is None:
+                raise serializers.ValidationError({'ubicacion_destino': 'Las entradas requieren una ubicación de destino.'})
+        elif origen is None:
+            raise serializers.ValidationError({'ubicacion_origen': 'Las salidas requieren una ubicación de origen.'})
+        if origen is not None and origen == destino:
+            raise serializers.ValidationError({'ubicacion_destino': 'El origen y el destino deben ser distintos.'})
+        return data
+
 # ... (código anterior) ...
 from django.contrib.auth.hashers import make_password # Importamos para encriptar contraseñas
 
-class UsuarioSerializer(serializers.ModelSerializer):
+class UsuarioSerializer(SerializacionMedida, serializers.ModelSerializer):
     """
     Serializador para el modelo de Usuario personalizado.
     Maneja la creación y actualización de usuarios de forma segura.
@@ -71,4 +124,48 @@ class UsuarioSerializer(serializers.ModelSerializer):
         if password:
             instance.set_password(password)
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+from django.utils import timezone
+from .models import TrabajoImportacion
+
+class TrabajoImportacionSerializer(SerializacionMedida, serializers.ModelSerializer):
+    """
+    Serializador de solo lectura para consultar el avance de una importación.
+    """
+    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    filas_por_segundo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TrabajoImportacion
+        fields = ('id', 'tipo', 'tipo_display', 'estado', 'estado_display', 'nombre_archivo',
+                  'filas_procesadas', 'filas_ok', 'errores', 'mensaje', 'filas_por_segundo',
+                  'creado', 'iniciado', 'actualizado', 'finalizado')
+        read_only_fields = fields
+
+    def get_filas_por_segundo(self, obj):
+        if not obj.iniciado:
+            return None
+        segundos = ((obj.finalizado or timezone.now()) - obj.iniciado).total_seconds()
+        return round(obj.filas_procesadas / segundos, 1) if segundos > 0 else None
+
+from .models import ProductoStockTotal
+
+class AlertaStockSerializer(SerializacionMedida, serializers.ModelSerializer):
+    """Producto bajo su stock mínimo o crítico (ver ProductoStockTotal)."""
+    cod_venta = serializers.CharField(source='producto_id', read_only=True)
+    descripcion = serializers.CharField(source='producto.descripcion', read_only=True)
+    nivel = serializers.SerializerMethodField()
+    faltante = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductoStockTotal
+        fields = ['cod_venta', 'descripcion', 'cantidad', 'stock_minimo', 'stock_critico', 'stock_maximo', 'nivel', 'faltante']
+
+    def get_nivel(self, obj):
+        return 'critico' if obj.cantidad < obj.stock_critico else 'minimo'
+
+    def get_faltante(self, obj):
+        # Unidades para llegar al máximo (o al mínimo si no hay máximo definido)
+        return max(obj.stock_maximo, obj.stock_minimo) - obj.cantidad
@@ -0,0 +1,290 @@
+"""
+Servicio de stock: todas las modificaciones de cantidades pasan por aquí.
+
+Los cambios se aplican con UPDATE ... SET cantidad = cantidad ± n (F()),
+nunca leyendo la cantidad, modificándola en Python y guardando el registro
+entero, así dos operaciones simultáneas no se pisan. Las salidas llevan la
+condición cantidad >= n en el mismo UPDATE: si no se actualiza ninguna fila
+es que no había stock suficiente, sin necesidad de un SELECT previo. Las
+filas de un mismo movimiento se actualizan siempre en orden de ubicación.
+
+    mover(producto, origen, destino, cantidad)   transferencia entre ubicaciones
+    vender(producto, ubicacion, cantidad)        venta en un punto de venta
+    recibir(producto, ubicacion, cantidad)       entrada por compra
+
+Las cargas CSV validan sobre stocks ya bloqueados y aplican todos los cambios
+de un bloque juntos con ajustar_stocks.
+
+Cada cambio de stock se suma también al total del producto (ProductoStockTotal)
+en la misma transacción. Quien fije cantidades absolutas en lugar de deltas
+(carga inicial, admin) debe llamar a recalcular_totales con los productos tocados,
+y a registrar_ajustes para que la diferencia quede como movimiento: el Kardex y
+el stock histórico se calculan desde los movimientos (ver inventario.kardex).
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .catalogo import catalogo
+from .models import MovimientoInventario, Producto, ProductoStockTotal, Stock, VentaDiaria
+
+# Cantidad de registros por sentencia en las operaciones masivas
+TAMANO_LOTE = 1000
+
+
+class StockInsuficiente(Exception):
+    """La ubicación de origen no tiene la cantidad pedida del producto."""
+
+    def __init__(self, producto_id, ubicacion, cantidad):
+        self.producto_id = producto_id
+        self.ubicacion = ubicacion
+        self.cantidad = cantidad
+        super().__init__(
+            f"Stock insuficiente de {producto_id} en '{ubicacion.nombre}' para descontar {cantidad} unidades."
+        )
+
+
+def _descontar(producto_id, ubicacion, cantidad):
+    actualizados = Stock.objects.filter(
+        producto_id=producto_id,
+        ubicacion=ubicacion,
+        cantidad__gte=cantidad,
+    ).update(cantidad=F('cantidad') - cantidad)
+    if not actualizados:
+        raise StockInsuficiente(producto_id, ubicacion, cantidad)
+
+
+def _sumar(producto_id, ubicacion, cantidad):
+    actualizados = Stock.objects.filter(
+        producto_id=producto_id,
+        ubicacion=ubicacion,
+    ).update(cantidad=F('cantidad') + cantidad)
+    if actualizados:
+        return
+    # No hay registro de stock: crearlo. Si otra transacción lo creó
+    # entretanto, el INSERT falla y se vuelve a sumar sobre el suyo.
+    try:
+        with transaction.atomic():
+            Stock.objects.create(producto_id=producto_id, ubicacion=ubicacion, cantidad=cantidad)
+    except IntegrityError:
+        Stock.objects.filter(producto_id=producto_id, ubicacion=ubicacion).update(cantidad=F('cantidad') + cantidad)
+
+
+def registrar_movimiento(tipo, producto, cantidad, ubicacion_origen=None, ubicacion_destino=None, usuario_id=None, detalle=None):
+    """
+    Aplica un movimiento al stock y lo registra, todo en una transacción:
+    descuenta `cantidad` de la ubicación de origen (si hay), la suma a la de
+    destino (si hay) y crea el MovimientoInventario. Las ventas se suman
+    además al resumen diario. Lanza StockInsuficiente si el origen no alcanza.
+    """
+    producto_id = getattr(producto, 'pk', producto)
+    cambios = []
+    if ubicacion_origen is not None:
+        cambios.append((ubicacion_origen, _descontar))
+    if ubicacion_destino is not None:
+        cambios.append((ubicacion_destino, _sumar))
+    # Los UPDATE bloquean las filas de stock: se aplican en orden de ubicación,
+    # así dos transferencias opuestas simultáneas (A→B y B→A) no se bloquean
+    # mutuamente. Si el origen no alcanza, la transacción deshace la suma.
+    cambios.sort(key=lambda cambio: getattr(cambio[0], 'pk', cambio[0]))
+    with transaction.atomic():
+        for ubicacion, aplicar in cambios:
+            aplicar(producto_id, ubicacion, cantidad)
+        delta = (cantidad if ubicacion_destino is not None else 0) - (cantidad if ubicacion_origen is not None else 0)
+        ajustar_totales({producto_id: delta})
+        movimiento = MovimientoInventario.objects.create(
+            producto_id=producto_id,
+            tipo=tipo,
+            cantidad=cantidad,
+            usuario_id=usuario_id,
+            ubicacion_origen=ubicacion_origen,
+            ubicacion_destino=ubicacion_destino,
+            detalle=detalle,
+        )
+        if tipo == MovimientoInventario.TIPO_VENTA:
+            acumular_ventas_diarias({producto_id: cantidad}, ubicacion_origen)
+    return movimiento
+
+
+def mover(producto, origen, destino, cantidad, usuario_id=None, detalle=None):
+    return registrar_movimiento(
+        MovimientoInventario.TIPO_TRANSFERENCIA_SALIDA, producto, cantidad,
+        ubicacion_origen=origen, ubicacion_destino=destino, usuario_id=usuario_id, detalle=detalle,
+    )
+
+
+def vender(producto, ubicacion, cantidad, usuario_id=None, detalle=None):
+    return registrar_movimiento(
+        MovimientoInventario.TIPO_VENTA, producto, cantidad,
+        ubicacion_origen=ubicacion, usuario_id=usuario_id, detalle=detalle,
+    )
+
+
+def recibir(producto, ubicacion, cantidad, usuario_id=None, detalle=None):
+    return registrar_movimiento(
+        MovimientoInventario.TIPO_ENTRADA_COMPRA, producto, cantidad,
+        ubicacion_destino=ubicacion, usuario_id=usuario_id, detalle=detalle,
+    )
+
+
+def registrar_ajustes(cambios, usuario_id=None, detalle=None):
+    """
+    Registra como movimientos de ajuste los cambios de stock hechos fijando la
+    cantidad, dados como tuplas (cod_venta, ubicacion, anterior, nueva). Si el
+    stock subió el ajuste entra a la ubicación (ubicacion_destino) y si bajó
+    sale de ella (ubicacion_origen). Los que no cambian no se registran.
+    """
+    MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(
+                producto_id=producto_id,
+                tipo=MovimientoInventario.TIPO_AJUSTE,
+                cantidad=abs(nueva - anterior),
+                usuario_id=usuario_id,
+                ubicacion_origen=ubicacion if nueva < anterior else None,
+                ubicacion_destino=ubicacion if nueva > anterior else None,
+                detalle=detalle,
+            )
+            for producto_id, ubicacion, anterior, nueva in cambios
+            if nueva != anterior
+        ],
+        batch_size=TAMANO_LOTE,
+    )
+
+
+def _sumar_por_delta(queryset, deltas):
+    """
+    Aplica cantidad = cantidad + delta a las filas de {pk: delta} con un UPDATE
+    ... WHERE pk IN (...) por cada valor distinto de delta (en lotes de
+    TAMANO_LOTE). En las cargas casi todos los deltas se repiten (-1, +1, ...),
+    así son pocas sentencias simples en lugar de un CASE por fila, que es lo
+    que arma bulk_update y cuesta mucho más de construir.
+    """
+    por_delta = {}
+    for pk, delta in deltas.items():
+        if delta:
+            por_delta.setdefault(delta, []).append(pk)
+    for delta, pks in por_delta.items():
+        for inicio in range(0, len(pks), TAMANO_LOTE):
+            queryset.filter(pk__in=pks[inicio:inicio + TAMANO_LOTE]).update(cantidad=F('cantidad') + delta)
+
+
+def ajustar_stocks(cambios):
+    """
+    Aplica varios cambios de stock en lote a partir de pares (stock, delta):
+    cantidad = cantidad + delta, agrupando las filas por delta.
+    Quien llama debe haber validado las cantidades sobre los stocks bloqueados.
+    """
+    deltas = {}
+    totales = {}
+    for stock, delta in cambios:
+        deltas[stock.pk] = deltas.get(stock.pk, 0) + delta
+        totales[stock.producto_id] = totales.get(stock.producto_id, 0) + delta
+    _sumar_por_delta(Stock.objects.all(), deltas)
+    ajustar_totales(totales)
+
+
+def ajustar_totales(deltas):
+    """
+    Suma los deltas, dados como {cod_venta: delta}, al stock total de cada
+    producto con cantidad = cantidad + delta. Debe llamarse después de aplicar
+    los cambios a Stock: los totales que aún no existen se calculan desde ahí.
+    """
+    deltas = {producto_id: delta for producto_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Bloquear los totales en orden de producto, así dos cargas concurrentes
+    # no pueden bloquearse mutuamente al actualizarlos
+    existentes = set(
+        ProductoStockTotal.objects.select_for_update().filter(
+            producto_id__in=list(deltas),
+        ).order_by('producto_id').values_list('producto_id', flat=True)
+    )
+    _sumar_por_delta(
+        ProductoStockTotal.objects.all(),
+        {producto_id: delta for producto_id, delta in deltas.items() if producto_id in existentes},
+    )
+    faltantes = deltas.keys() - existentes
+    if faltantes:
+        recalcular_totales(faltantes)
+
+
+def recalcular_totales(producto_ids=None):
+    """
+    Calcula desde Stock el total de los productos dados (de todos si es None)
+    y copia sus umbrales, creando o reemplazando su ProductoStockTotal.
+    Devuelve la cantidad de totales escritos.
+
+    Los totales existentes se bloquean primero, en orden de producto como en
+    ajustar_totales: un delta que se esté aplicando termina antes de la suma
+    (y entra en ella) o espera a que el total recalculado se confirme.
+    """
+    productos = Producto.objects.all()
+    totales = ProductoStockTotal.objects.select_for_update()
+    if producto_ids is not None:
+        producto_ids = list(producto_ids)
+        productos = productos.filter(pk__in=producto_ids)
+        totales = totales.filter(producto_id__in=producto_ids)
+
+    with transaction.atomic():
+        # La consulta solo toma los bloqueos; la suma se lee después
+        list(totales.order_by('producto_id').values_list('producto_id', flat=True))
+        filas = productos.annotate(total=Coalesce(Sum('stock__cantidad'), 0)).values_list(
+            'cod_venta', 'total', 'stock_minimo', 'stock_critico', 'stock_maximo',
+        ).order_by()
+        nuevos = [
+            ProductoStockTotal(
+                producto_id=cod_venta,
+                cantidad=total,
+                stock_minimo=stock_minimo,
+                stock_critico=stock_critico,
+                stock_maximo=stock_maximo,
+            )
+            for cod_venta, total, stock_minimo, stock_critico, stock_maximo in filas.iterator(chunk_size=TAMANO_LOTE)
+        ]
+        ProductoStockTotal.objects.bulk_create(
+            nuevos,
+            batch_size=TAMANO_LOTE,
+            update_conflicts=True,
+            unique_fields=['producto'],
+            update_fields=['cantidad', 'stock_minimo', 'stock_critico', 'stock_maximo'],
+        )
+    return len(nuevos)
+
+
+def acumular_ventas_diarias(vendidos, ubicacion, fecha=None):
+    """
+    Suma al resumen del día `fecha` (por defecto, hoy) las unidades vendidas,
+    dadas como {cod_venta: unidades}.
+
+    Los ingresos se calculan con el precio actual del producto, igual que al
+    reconstruir el resumen. Debe llamarse dentro de la transacción que registra
+    las ventas; los registros existentes se bloquean antes de sumarles.
+    """
+    if not vendidos:
+        return
+    fecha = fecha or timezone.localdate()
+    precios = {cod_venta: producto.precio for cod_venta, producto in catalogo.resolver(vendidos).items()}
+
+    existentes = {
+        resumen.producto_id: resumen
+        for resumen in VentaDiaria.objects.select_for_update().filter(
+            fecha=fecha,
+            ubicacion=ubicacion,
+            producto_id__in=list(vendidos),
+        ).order_by('producto_id')
+    }
+
+    nuevos = []
+    for cod_venta, unidades in vendidos.items():
+        resumen = existentes.get(cod_venta)
+        if resumen is None:
+            resumen = VentaDiaria(fecha=fecha, producto_id=cod_venta, ubicacion=ubicacion)
+            nuevos.append(resumen)
+        resumen.unidades += unidades
+        resumen.ingresos += unidades * precios[cod_venta]
+
+    VentaDiaria.objects.bulk_update(existentes.values(), ['unidades', 'ingresos'], batch_size=TAMANO_LOTE)
+    VentaDiaria.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
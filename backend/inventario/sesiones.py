@@ -0,0 +1,42 @@
+"""
+Expiración deslizante de las sesiones sin escribirlas en cada petición.
+
+En vez de SESSION_SAVE_EVERY_REQUEST, cada sesión guarda una fecha de
+expiración absoluta y RenovarSesionMiddleware solo la extiende cuando le
+quedan menos de SESSION_RENOVACION_UMBRAL segundos. Así una sesión activa no
+expira, pero se guarda una vez por umbral en vez de en cada petición.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def renovar_expiracion(session):
+    """Fija la expiración de la sesión en SESSION_COOKIE_AGE segundos desde ahora."""
+    session.set_expiry(timezone.now() + timedelta(seconds=settings.SESSION_COOKIE_AGE))
+
+
+class RenovarSesionMiddleware:
+    """Debe ir después de SessionMiddleware, que es quien guarda la sesión modificada."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        # Solo sesiones que ya existían y siguen vigentes (no recién cerradas)
+        session = getattr(request, 'session', None)
+        if (
+            session is not None
+            and settings.SESSION_COOKIE_NAME in request.COOKIES
+            and session.session_key
+            and not session.is_empty()
+        ):
+            # Las sesiones sin expiración absoluta son anteriores a este esquema
+            umbral = getattr(settings, 'SESSION_RENOVACION_UMBRAL', settings.SESSION_COOKIE_AGE // 2)
+            if '_session_expiry' not in session or session.get_expiry_age() < umbral:
+                renovar_expiracion(session)
+        return response
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_dashboard import invalidar_dashboard
+from .catalogo import invalidar_catalogo
+from .models import MovimientoInventario, Producto, ProductoStockTotal, Stock, Ubicacion, VentaDiaria
+
+
+@receiver([post_save, post_delete], sender=Stock)
+@receiver([post_save, post_delete], sender=MovimientoInventario)
+@receiver([post_save, post_delete], sender=VentaDiaria)
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=Ubicacion)
+def invalidar_dashboard_al_escribir(sender, **kwargs):
+    # Se invalida al confirmar la transacción; antes, otra petición podría volver
+    # a guardar en cache los datos viejos. Las operaciones masivas (bulk_create,
+    # bulk_update) no emiten señales: las cargas CSV invalidan por su cuenta.
+    transaction.on_commit(invalidar_dashboard)
+
+
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_catalogo_al_escribir(sender, **kwargs):
+    # Igual que arriba: la carga inicial (bulk_create) invalida por su cuenta
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(post_save, sender=Producto)
+def copiar_umbrales_al_total(sender, instance, created, **kwargs):
+    # Los umbrales se copian al total para que las alertas no hagan JOIN
+    umbrales = {
+        'stock_minimo': instance.stock_minimo,
+        'stock_critico': instance.stock_critico,
+        'stock_maximo': instance.stock_maximo,
+    }
+    if not ProductoStockTotal.objects.filter(producto=instance).update(**umbrales):
+        ProductoStockTotal.objects.get_or_create(producto=instance, defaults=umbrales)
+
+
+@receiver(post_delete, sender=Stock)
+def descontar_del_total(sender, instance, **kwargs):
+    # También llega aquí el borrado en cascada de un producto o una ubicación.
+    # Solo se actualiza el total si existe: si el producto se está borrando, su
+    # total ya no está y no hay que volver a crearlo.
+    ProductoStockTotal.objects.filter(producto_id=instance.producto_id).update(
+        cantidad=F('cantidad') - instance.cantidad,
+    )
@@ -1,3 +1,1293 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import sys
+import tempfile
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import importaciones, ingesta, servicios
+from .catalogo import CatalogoProductos, catalogo
+from .kardex import stock_en_ubicacion, stock_producto_en
+from .ingesta import (
+    COLUMNAS_CARGA_INICIAL,
+    TIPOS_CARGA_INICIAL,
+    ErrorLecturaCSV,
+    ingerir_carga_inicial,
+    leer_csv_por_bloques,
+)
+from .models import (
+    CierreStock,
+    ClaveIngesta,
+    MovimientoInventario,
+    Producto,
+    ProductoStockTotal,
+    RegistroIngesta,
+    Stock,
+    TrabajoImportacion,
+    Ubicacion,
+    Usuario,
+    VentaDiaria,
+)
+from .reposicion import planificar_reposicion
+
+CABECERA_CARGA = b"id_venta,price,cost,id_fabrica,qty,description\n"
+CABECERA_TRANSFERENCIA = b"cod_venta,description,price,qty\n"
+CABECERA_VENTAS = b"timestamp,lugar,id_fabrica,id_venta,description,price\n"
+
+
+def _filas_ventas(timestamp, cod_venta, veces):
+    return f"{timestamp},Tienda Centro,F,{cod_venta},x,1\n".encode() * veces
+
+
+class InventarioTestCase(TestCase):
+    """
+    Bodega principal y un punto de venta, con un operador ya autenticado.
+    Las cargas se suben con ?sincrono=1 y ejecutando los on_commit, como si
+    cada petición confirmara su transacción.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bodega = Ubicacion.objects.create(nombre='Bodega', tipo=Ubicacion.TIPO_BODEGA_PRINCIPAL)
+        cls.tienda = Ubicacion.objects.create(nombre='Tienda Centro', tipo=Ubicacion.TIPO_PUNTO_FIJO)
+        cls.operador = Usuario.objects.create_user('operador', password='x', perfil=Usuario.PERFIL_OPERA)
+
+    def setUp(self):
+        # El catálogo en memoria y la versión del dashboard viven en el cache
+        cache.clear()
+        self.client.force_login(self.operador)
+
+    def subir(self, ruta, nombre, contenido, **parametros):
+        parametros.setdefault('sincrono', '1')
+        consulta = '&'.join(f'{clave}={valor}' for clave, valor in parametros.items())
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/{ruta}/?{consulta}', {'file': SimpleUploadedFile(nombre, contenido)})
+
+    def crear_producto(self, cod_venta, **campos):
+        campos = {'descripcion': cod_venta, 'precio': 1000, 'costo': 500, 'id_fabrica': 'F', **campos}
+        return Producto.objects.create(cod_venta=cod_venta, **campos)
+
+    def stock(self, cod_venta, ubicacion):
+        stock = Stock.objects.filter(producto_id=cod_venta, ubicacion=ubicacion).first()
+        return stock.cantidad if stock else 0
+
+    def assertTotalCuadra(self, cod_venta):
+        suma = Stock.objects.filter(producto_id=cod_venta).aggregate(total=Sum('cantidad'))['total'] or 0
+        self.assertEqual(ProductoStockTotal.objects.get(producto_id=cod_venta).cantidad, suma)
+
+
+class CargaInicialTests(InventarioTestCase):
+
+    def test_crea_productos_y_fija_stock(self):
+        contenido = CABECERA_CARGA + (
+            b"BI0001AA,25000.00,11000.00,FAB-1,50,Vestido\n"
+            b"BI0002AA,15990.00,7000.00,FAB-2,200,Gorra\n"
+        )
+        respuesta = self.subir('carga-inicial-csv', 'inventario.csv', contenido)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['errores'], [])
+        self.assertEqual(Producto.objects.get(pk='BI0001AA').descripcion, 'Vestido')
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 50)
+        self.assertEqual(self.stock('BI0002AA', self.bodega), 200)
+        self.assertTotalCuadra('BI0002AA')
+
+    def test_actualiza_productos_existentes(self):
+        self.crear_producto('BI0001AA', descripcion='Antes', precio=1)
+        Stock.objects.create(producto_id='BI0001AA', ubicacion=self.bodega, cantidad=3)
+        Stock.objects.create(producto_id='BI0001AA', ubicacion=self.tienda, cantidad=4)
+
+        self.subir('carga-inicial-csv', 'inventario.csv', CABECERA_CARGA + b"BI0001AA,2500.00,1000.00,FAB-1,9,Despues\n")
+
+        producto = Producto.objects.get(pk='BI0001AA')
+        self.assertEqual((producto.descripcion, producto.precio), ('Despues', 2500))
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 9)
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 4)
+
+    def test_reporta_errores_por_fila(self):
+        contenido = CABECERA_CARGA + (
+            b"BI0001AA,1,1,F,5,ok\n"
+            b"XX01,1,1,F,1,codigo invalido\n"
+            b"BI0003AA,abc,1,F,1,precio invalido\n"
+            b"BI0004AA,1,1,F,-1,cantidad negativa\n"
+        )
+        errores = self.subir('carga-inicial-csv', 'inventario.csv', contenido).json()['errores']
+
+        self.assertEqual(len(errores), 3)
+        self.assertTrue(errores[0].startswith('Error en fila 3:'))
+        self.assertIn('BI NNNN CC', errores[0])
+        self.assertIn("'price' y 'cost'", errores[1])
+        self.assertIn("'qty'", errores[2])
+        self.assertEqual(list(Producto.objects.values_list('cod_venta', flat=True)), ['BI0001AA'])
+
+    def test_faltan_columnas(self):
+        respuesta = self.subir('carga-inicial-csv', 'inventario.csv', b"id_venta,qty\nBI0001AA,1\n")
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('Faltan columnas obligatorias', respuesta.json()['error'])
+
+    def test_volver_a_subir_el_mismo_archivo_lo_aplica_de_nuevo(self):
+        contenido = CABECERA_CARGA + b"BI0001AA,1,1,F,5,x\n"
+        self.subir('carga-inicial-csv', 'inventario.csv', contenido)
+        Stock.objects.filter(producto_id='BI0001AA').update(cantidad=1)
+
+        respuesta = self.subir('carga-inicial-csv', 'inventario.csv', contenido)
+
+        self.assertNotIn('duplicado', respuesta.json())
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 5)
+
+    def test_archivo_solo_con_la_cabecera(self):
+        respuesta = self.subir('carga-inicial-csv', 'inventario.csv', CABECERA_CARGA)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('0 productos procesados', respuesta.json()['message'])
+        self.assertEqual(respuesta.json()['errores'], [])
+
+    def test_codigo_repetido_prevalece_la_ultima_fila(self):
+        contenido = CABECERA_CARGA + b"BI0001AA,1,1,F,5,primera\nBI0001AA,1,1,F,7,segunda\n"
+        respuesta = self.subir('carga-inicial-csv', 'inventario.csv', contenido).json()
+
+        self.assertEqual(respuesta['errores'], ['Error en fila 2: El código BI0001AA se repite en la fila 3, que es la que se aplica.'])
+        self.assertEqual(Producto.objects.get(pk='BI0001AA').descripcion, 'segunda')
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 7)
+
+    def test_dry_run_solo_con_la_cabecera(self):
+        respuesta = self.subir('carga-inicial-csv', 'inventario.csv', CABECERA_CARGA, dry_run='1')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.json()['procesados'], respuesta.json()['deltas']), (0, []))
+
+    def test_dry_run_cuenta_productos_nuevos_sin_escribir(self):
+        self.crear_producto('BI0001AA')
+        contenido = CABECERA_CARGA + b"BI0001AA,1,1,F,5,x\nBI0002AA,1,1,F,3,x\n"
+
+        respuesta = self.subir('carga-inicial-csv', 'inventario.csv', contenido, dry_run='1').json()
+
+        self.assertEqual(respuesta['procesados'], 2)
+        self.assertTrue(respuesta['message'].startswith('Se procesarían 2 productos (1 nuevos).'))
+        self.assertEqual({(delta['cod_venta'], delta['delta']) for delta in respuesta['deltas']}, {('BI0001AA', 5), ('BI0002AA', 3)})
+        self.assertFalse(Producto.objects.filter(pk='BI0002AA').exists())
+        self.assertFalse(Stock.objects.exists())
+
+
+class TransferenciaTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA')
+        servicios.recibir('BI0001AA', self.bodega, 20)
+
+    def test_mueve_stock_en_el_orden_del_archivo(self):
+        contenido = CABECERA_TRANSFERENCIA + (
+            b"BI0001AA,x,1,8\n"
+            b"BI0001AA,x,1,15\n"
+            b"BI9999ZZ,x,1,1\n"
+            b"BI0001AA,x,1,12\n"
+        )
+        errores = self.subir('transferencia-csv', 'tras_bod_Tienda Centro_20250101.csv', contenido).json()['errores']
+
+        self.assertEqual(errores, [
+            'Error en fila 3: Stock insuficiente en bodega. Se tiene 12, se intenta transferir 15.',
+            'Error en fila 4: El producto no existe.',
+        ])
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 0)
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 20)
+        self.assertEqual(
+            MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_TRANSFERENCIA_SALIDA).count(), 2,
+        )
+        self.assertTotalCuadra('BI0001AA')
+
+    def test_ubicacion_destino_inexistente(self):
+        respuesta = self.subir('transferencia-csv', 'tras_bod_Otra_20250101.csv', CABECERA_TRANSFERENCIA + b"BI0001AA,x,1,1\n")
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 20)
+
+    def test_archivo_solo_con_la_cabecera(self):
+        respuesta = self.subir('transferencia-csv', 'tras_bod_Tienda Centro_20250101.csv', CABECERA_TRANSFERENCIA)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['errores'], [])
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 20)
+
+    def test_modo_todo_no_aplica_nada_si_una_fila_falla(self):
+        contenido = CABECERA_TRANSFERENCIA + b"BI0001AA,x,1,5\nBI9999ZZ,x,1,1\n"
+        nombre = 'tras_bod_Tienda Centro_20250102.csv'
+        respuesta = self.subir('transferencia-csv', nombre, contenido, modo='todo')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['errores'], ['Error en fila 3: El producto no existe.'])
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 20)
+        self.assertFalse(MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_TRANSFERENCIA_SALIDA).exists())
+        self.assertEqual(RegistroIngesta.objects.get(nombre_archivo=nombre).estado, RegistroIngesta.ESTADO_ERROR)
+
+    def test_modo_parcial_aplica_las_filas_validas(self):
+        contenido = CABECERA_TRANSFERENCIA + b"BI0001AA,x,1,5\nBI9999ZZ,x,1,1\n"
+        respuesta = self.subir('transferencia-csv', 'tras_bod_Tienda Centro_20250102.csv', contenido, modo='parcial')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()['errores']), 1)
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 15)
+        self.assertTotalCuadra('BI0001AA')
+
+    def test_dry_run_proyecta_sin_escribir(self):
+        contenido = CABECERA_TRANSFERENCIA + b"BI0001AA,x,1,5\nBI0001AA,x,1,50\n"
+        respuesta = self.subir('transferencia-csv', 'tras_bod_Tienda Centro_20250103.csv', contenido, dry_run='1').json()
+
+        self.assertTrue(respuesta['dry_run'])
+        self.assertEqual(respuesta['procesados'], 1)
+        self.assertEqual(len(respuesta['errores']), 1)
+        self.assertEqual(
+            {(delta['ubicacion_id'], delta['delta']) for delta in respuesta['deltas']},
+            {(self.bodega.pk, -5), (self.tienda.pk, 5)},
+        )
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 20)
+        self.assertFalse(RegistroIngesta.objects.exists())
+
+    def test_dry_run_solo_con_la_cabecera(self):
+        respuesta = self.subir('transferencia-csv', 'tras_bod_Tienda Centro_20250103.csv', CABECERA_TRANSFERENCIA, dry_run='1')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.json()['procesados'], respuesta.json()['deltas']), (0, []))
+
+
+class VentasDiariasTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA')
+        self.crear_producto('BI0002AA')
+        servicios.recibir('BI0001AA', self.tienda, 3)
+        servicios.recibir('BI0002AA', self.tienda, 5)
+
+    def test_descuenta_unidades_y_reporta_las_que_superan_el_stock(self):
+        contenido = CABECERA_VENTAS + _filas_ventas('2025-01-01 10:00', 'BI0001AA', 4)
+        errores = self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', contenido).json()['errores']
+
+        self.assertEqual(errores, ["Error en fila 5: Stock insuficiente en 'Tienda Centro'. Stock actual: 0."])
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 0)
+        self.assertEqual(MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_VENTA).count(), 3)
+
+    def test_agrupar_registra_un_movimiento_por_producto(self):
+        contenido = CABECERA_VENTAS + (
+            _filas_ventas('2025-01-01 10:00', 'BI0001AA', 2)
+            + _filas_ventas('2025-01-01 11:00', 'BI0002AA', 4)
+        )
+        self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', contenido, agrupar='1')
+
+        ventas = MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_VENTA)
+        self.assertEqual(dict(ventas.values_list('producto_id', 'cantidad')), {'BI0001AA': 2, 'BI0002AA': 4})
+        self.assertEqual(self.stock('BI0002AA', self.tienda), 1)
+
+    def test_archivo_solo_con_la_cabecera(self):
+        respuesta = self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', CABECERA_VENTAS)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['errores'], [])
+        self.assertFalse(MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_VENTA).exists())
+
+    def test_el_mismo_archivo_no_se_aplica_dos_veces(self):
+        contenido = CABECERA_VENTAS + _filas_ventas('2025-01-01 10:00', 'BI0001AA', 2)
+        self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', contenido)
+        respuesta = self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', contenido)
+
+        self.assertTrue(respuesta.json()['duplicado'])
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 1)
+
+    def test_filas_ya_registradas_se_omiten_en_un_archivo_reexportado(self):
+        primera = CABECERA_VENTAS + _filas_ventas('2025-01-01 10:00', 'BI0001AA', 2)
+        self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', primera)
+        reexportado = primera + _filas_ventas('2025-01-01 11:00', 'BI0001AA', 1)
+        mensaje = self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', reexportado).json()['message']
+
+        self.assertIn('Se omitieron 2 filas ya registradas', mensaje)
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 0)
+        self.assertEqual(ClaveIngesta.objects.count(), 3)
+
+    def test_modo_todo_deshace_tambien_el_resumen_diario(self):
+        contenido = CABECERA_VENTAS + _filas_ventas('2025-01-01 10:00', 'BI0001AA', 4)
+        respuesta = self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', contenido, modo='todo')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 3)
+        self.assertFalse(VentaDiaria.objects.exists())
+        self.assertFalse(ClaveIngesta.objects.exists())
+
+    def test_dry_run_solo_con_la_cabecera(self):
+        respuesta = self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', CABECERA_VENTAS, dry_run='1')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.json()['procesados'], respuesta.json()['deltas']), (0, []))
+
+    def test_dry_run_de_un_archivo_ya_importado(self):
+        contenido = CABECERA_VENTAS + _filas_ventas('2025-01-01 10:00', 'BI0001AA', 2)
+        self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', contenido)
+
+        respuesta = self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', contenido, dry_run='1').json()
+
+        self.assertTrue(respuesta['duplicado'])
+        self.assertEqual((respuesta['procesados'], respuesta['omitidos']), (0, 2))
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 1)
+
+
+class RetomarCargaTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA')
+        servicios.recibir('BI0001AA', self.bodega, 10)
+        self.nombre = 'tras_bod_Tienda Centro_20250101.csv'
+        self.contenido = CABECERA_TRANSFERENCIA + b"BI0001AA,x,1,1\n" * 3
+        self.subir('transferencia-csv', self.nombre, self.contenido)
+        # Simular un intento que se cortó después de confirmar dos filas
+        self.registro = RegistroIngesta.objects.get(nombre_archivo=self.nombre)
+        RegistroIngesta.objects.filter(pk=self.registro.pk).update(
+            estado=RegistroIngesta.ESTADO_EN_PROCESO,
+            filas_confirmadas=2,
+            actualizado=timezone.now(),
+        )
+
+    def test_carga_en_curso_responde_conflicto(self):
+        respuesta = self.subir('transferencia-csv', self.nombre, self.contenido)
+
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 7)
+
+    def test_carga_detenida_continua_desde_las_filas_confirmadas(self):
+        RegistroIngesta.objects.filter(pk=self.registro.pk).update(actualizado=timezone.now() - timedelta(hours=1))
+        respuesta = self.subir('transferencia-csv', self.nombre, self.contenido)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 6)
+        self.registro.refresh_from_db()
+        self.assertEqual(self.registro.estado, RegistroIngesta.ESTADO_COMPLETADO)
+
+    def test_archivo_completado_se_informa_como_duplicado(self):
+        RegistroIngesta.objects.filter(pk=self.registro.pk).update(estado=RegistroIngesta.ESTADO_COMPLETADO, filas_confirmadas=3)
+
+        respuesta = self.subir('transferencia-csv', self.nombre, self.contenido)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.json()['duplicado'])
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 7)
+
+
+class LecturaPorBloquesTests(InventarioTestCase):
+
+    def leer(self, contenido, tamano_bloque=2):
+        return leer_csv_por_bloques(io.BytesIO(contenido), COLUMNAS_CARGA_INICIAL, TIPOS_CARGA_INICIAL, tamano_bloque)
+
+    def test_bloques_con_indice_continuo(self):
+        contenido = CABECERA_CARGA + b"".join(f"BI000{i}AA,1,1,F,{i},x\n".encode() for i in range(1, 6))
+        bloques = list(self.leer(contenido))
+
+        self.assertEqual([len(df) for df in bloques], [2, 2, 1])
+        self.assertEqual(bloques[-1].index.tolist(), [4])
+
+    def test_cabecera_invalida_falla_antes_de_aplicar(self):
+        with self.assertRaises(ErrorLecturaCSV):
+            self.leer(b"otra,cosa\n1,2\n")
+
+    def test_errores_con_el_numero_de_fila_del_archivo(self):
+        contenido = CABECERA_CARGA + (
+            b"BI0001AA,1,1,F,1,x\n"
+            b"BI0002AA,1,1,F,1,x\n"
+            b"BI0003AA,1,1,F,1,x\n"
+            b"malo,1,1,F,1,x\n"
+            b"BI0005AA,1,1,F,1,x\n"
+        )
+        resultado = ingerir_carga_inicial(self.leer(contenido), self.bodega)
+
+        self.assertEqual(resultado['procesados'], 4)
+        self.assertEqual(len(resultado['errores']), 1)
+        self.assertTrue(resultado['errores'][0].startswith('Error en fila 5:'))
+        self.assertEqual(self.stock('BI0005AA', self.bodega), 1)
+
+    def test_fila_rechazada_por_la_base_no_descarta_el_bloque(self):
+        procesar = ingesta.procesar_carga_inicial
+
+        def rechazar_bi0002(df, bodega):
+            if 'BI0002AA' in df['id_venta'].values:
+                raise IntegrityError('restricción violada')
+            return procesar(df, bodega)
+
+        avances = []
+        contenido = CABECERA_CARGA + b"BI0001AA,1,1,F,1,x\nBI0002AA,1,1,F,1,x\nBI0003AA,1,1,F,1,x\n"
+        with mock.patch.object(ingesta, 'procesar_carga_inicial', side_effect=rechazar_bi0002):
+            resultado = ingerir_carga_inicial(self.leer(contenido), self.bodega, progreso=lambda r: avances.append(r['filas']))
+
+        self.assertEqual(resultado['procesados'], 2)
+        self.assertEqual(resultado['errores'], ['Error en fila 3: restricción violada'])
+        self.assertEqual(avances, [2, 3])
+        self.assertEqual(set(Producto.objects.values_list('cod_venta', flat=True)), {'BI0001AA', 'BI0003AA'})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TrabajosImportacionTests(InventarioTestCase):
+
+    def encolar(self, contenido=CABECERA_CARGA + b"BI0001AA,1,1,F,5,x\n"):
+        # Sin ejecutar los on_commit el trabajo queda pendiente, como tras un reinicio
+        respuesta = self.client.post('/api/carga-inicial-csv/', {'file': SimpleUploadedFile('inventario.csv', contenido)})
+        self.assertEqual(respuesta.status_code, 202)
+        return TrabajoImportacion.objects.get(pk=respuesta.json()['job_id'])
+
+    def procesar(self, *argumentos):
+        call_command('procesar_importaciones', *argumentos, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_devuelve_el_trabajo_y_lo_procesa_el_comando(self):
+        trabajo = self.encolar()
+        self.assertEqual(self.client.get(f'/api/import-jobs/{trabajo.pk}/').json()['estado'], TrabajoImportacion.ESTADO_PENDIENTE)
+
+        self.procesar()
+
+        estado = self.client.get(f'/api/import-jobs/{trabajo.pk}/').json()
+        self.assertEqual(estado['estado'], TrabajoImportacion.ESTADO_COMPLETADO)
+        self.assertEqual((estado['filas_procesadas'], estado['filas_ok']), (1, 1))
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 5)
+        self.assertFalse(default_storage.exists(trabajo.archivo))
+
+    def test_trabajo_detenido_se_vuelve_a_reclamar(self):
+        detenido = TrabajoImportacion.objects.create(
+            tipo=TrabajoImportacion.TIPO_CARGA_INICIAL, archivo='a', nombre_archivo='a.csv',
+            estado=TrabajoImportacion.ESTADO_EN_PROCESO, actualizado=timezone.now() - timedelta(hours=1),
+        )
+        vivo = TrabajoImportacion.objects.create(
+            tipo=TrabajoImportacion.TIPO_CARGA_INICIAL, archivo='b', nombre_archivo='b.csv',
+            estado=TrabajoImportacion.ESTADO_EN_PROCESO, actualizado=timezone.now(),
+        )
+
+        self.assertEqual(list(importaciones.trabajos_por_procesar()), [detenido])
+        self.assertIsNone(importaciones.reclamar_trabajo(vivo.pk))
+        self.assertIsNotNone(importaciones.reclamar_trabajo(detenido.pk))
+        self.assertIsNone(importaciones.reclamar_trabajo(detenido.pk))
+
+    def test_consultar_el_estado_no_encola_el_trabajo(self):
+        trabajo = self.encolar()
+        TrabajoImportacion.objects.filter(pk=trabajo.pk).update(
+            estado=TrabajoImportacion.ESTADO_EN_PROCESO, actualizado=timezone.now() - timedelta(hours=1),
+        )
+
+        with mock.patch.object(importaciones._ejecutor, 'submit') as submit:
+            self.client.get(f'/api/import-jobs/{trabajo.pk}/')
+
+        submit.assert_not_called()
+
+    def test_falla_inesperada_conserva_el_archivo_para_reintentar(self):
+        trabajo = self.encolar()
+        with mock.patch('inventario.importaciones.ingerir_carga_inicial', side_effect=RuntimeError('se cayó')), \
+                self.assertLogs('inventario.importaciones', 'ERROR'):
+            self.procesar()
+
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.mensaje), (TrabajoImportacion.ESTADO_ERROR, 'se cayó'))
+        self.assertTrue(default_storage.exists(trabajo.archivo))
+
+        self.procesar('--reintentar', str(trabajo.pk))
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoImportacion.ESTADO_COMPLETADO)
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 5)
+        self.assertFalse(default_storage.exists(trabajo.archivo))
+
+    def test_rechazo_en_modo_todo_no_conserva_el_archivo(self):
+        respuesta = self.client.post(
+            '/api/carga-inicial-csv/?modo=todo',
+            {'file': SimpleUploadedFile('inventario.csv', CABECERA_CARGA + b"malo,1,1,F,5,x\n")},
+        )
+        self.procesar()
+
+        trabajo = TrabajoImportacion.objects.get(pk=respuesta.json()['job_id'])
+        self.assertEqual(trabajo.estado, TrabajoImportacion.ESTADO_ERROR)
+        self.assertFalse(default_storage.exists(trabajo.archivo))
+        self.assertFalse(importaciones.reintentar_trabajo(trabajo.pk))
+
+
+class TrazabilidadTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto('BI0001AA')
+        servicios.recibir(self.producto, self.bodega, 10)
+        servicios.vender(self.producto, self.bodega, 4)
+        servicios.vender(self.producto, self.bodega, 1)
+        servicios.recibir(self.producto, self.bodega, 5)
+
+    def trazabilidad(self, limite):
+        ruta = f'/api/trazabilidad/{self.producto.pk}/?limite={limite}'
+        pagina = self.client.get(ruta).json()
+        movimientos = pagina['movimientos']
+        while pagina['siguiente']:
+            pagina = self.client.get(f"{ruta}&cursor={pagina['siguiente']}").json()
+            movimientos += pagina['movimientos']
+        return pagina, movimientos
+
+    def test_saldo_corrido_por_paginas(self):
+        pagina, movimientos = self.trazabilidad(limite=3)
+
+        self.assertEqual(pagina['stock_inicial'], 0)
+        self.assertEqual([movimiento['stock_resultante'] for movimiento in movimientos], [10, 6, 5, 10])
+        self.assertEqual(movimientos[-1]['stock_resultante'], pagina['stock_actual'])
+
+    def test_consultas_no_dependen_de_la_cantidad_de_movimientos(self):
+        ruta = f'/api/trazabilidad/{self.producto.pk}/'
+        # La primera petición carga la sesión en el cache
+        self.client.get(ruta)
+        with CaptureQueriesContext(connection) as pocos:
+            self.client.get(ruta)
+        for _ in range(10):
+            servicios.vender(self.producto, self.bodega, 1)
+        with CaptureQueriesContext(connection) as muchos:
+            self.client.get(ruta)
+
+        self.assertEqual(len(pocos), len(muchos))
+
+
+class CierreStockTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto('BI0001AA')
+        servicios.recibir(self.producto, self.bodega, 10)
+        servicios.mover(self.producto, self.bodega, self.tienda, 4)
+        call_command('generar_cierre_stock', stdout=io.StringIO())
+        servicios.vender(self.producto, self.tienda, 1)
+
+    def assertHistoricoCuadra(self):
+        for ubicacion in (self.bodega, self.tienda):
+            base, saldos = stock_en_ubicacion(ubicacion, timezone.now())
+            self.assertTrue(base.startswith('Cierre del'))
+            self.assertEqual(saldos.get('BI0001AA', 0), self.stock('BI0001AA', ubicacion))
+
+        ultimo = MovimientoInventario.objects.order_by('fecha_hora', 'id').values_list('fecha_hora', 'id').last()
+        total = Stock.objects.filter(producto=self.producto).aggregate(total=Sum('cantidad'))['total']
+        self.assertEqual(stock_producto_en(self.producto, ultimo), total)
+
+    def test_cierre_guarda_el_stock_de_cada_ubicacion(self):
+        self.assertEqual(
+            dict(CierreStock.objects.values_list('ubicacion_id', 'cantidad')),
+            {self.bodega.pk: 6, self.tienda.pk: 4},
+        )
+        self.assertHistoricoCuadra()
+
+    def test_stock_historico_coincide_con_el_stock_tras_una_carga_inicial(self):
+        self.subir('carga-inicial-csv', 'inventario.csv', CABECERA_CARGA + b"BI0001AA,1,1,F,2,x\n")
+        servicios.recibir(self.producto, self.bodega, 3)
+
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 5)
+        self.assertHistoricoCuadra()
+        ajuste = MovimientoInventario.objects.get(tipo=MovimientoInventario.TIPO_AJUSTE)
+        self.assertEqual((ajuste.cantidad, ajuste.ubicacion_origen), (4, self.bodega))
+
+    def test_carga_inicial_que_sube_el_stock(self):
+        self.subir('carga-inicial-csv', 'inventario.csv', CABECERA_CARGA + b"BI0001AA,1,1,F,20,x\n")
+
+        self.assertHistoricoCuadra()
+
+    def test_stock_historico_coincide_tras_editar_el_stock_en_el_admin(self):
+        self.client.force_login(Usuario.objects.create_superuser('admin', password='x'))
+        stock = Stock.objects.get(producto=self.producto, ubicacion=self.tienda)
+        self.client.post(f'/admin/inventario/stock/{stock.pk}/change/', {
+            'producto': self.producto.pk, 'ubicacion': self.tienda.pk, 'cantidad': 8,
+        })
+
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 8)
+        self.assertTotalCuadra('BI0001AA')
+        self.assertHistoricoCuadra()
+
+    def test_endpoint_de_stock_historico(self):
+        respuesta = self.client.get(f'/api/stock-historico/?ubicacion_id={self.tienda.pk}&fecha={timezone.localdate()}').json()
+
+        self.assertTrue(respuesta['calculado_desde'].startswith('Cierre del'))
+        self.assertEqual(respuesta['stock'], [{'producto_cod': 'BI0001AA', 'cantidad': 3}])
+
+
+class VentaDiariaTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA', precio=1000)
+        self.crear_producto('BI0002AA', precio=500)
+        servicios.recibir('BI0001AA', self.tienda, 10)
+        servicios.recibir('BI0002AA', self.tienda, 10)
+
+    def resumen(self):
+        return sorted(VentaDiaria.objects.values_list('fecha', 'producto_id', 'ubicacion_id', 'unidades', 'ingresos'))
+
+    def test_las_ventas_cuentan_el_dia_de_su_timestamp(self):
+        contenido = CABECERA_VENTAS + (
+            _filas_ventas('2025-01-01 10:00', 'BI0001AA', 2)
+            + _filas_ventas('2025-01-02 09:00', 'BI0001AA', 1)
+            + _filas_ventas('2025-01-02 09:30', 'BI0002AA', 3)
+        )
+        self.subir('ventas-diarias-csv', 'Tienda_Centro_20250102.csv', contenido)
+
+        self.assertEqual(self.resumen(), [
+            (date(2025, 1, 1), 'BI0001AA', self.tienda.pk, 2, 2000),
+            (date(2025, 1, 2), 'BI0001AA', self.tienda.pk, 1, 1000),
+            (date(2025, 1, 2), 'BI0002AA', self.tienda.pk, 3, 1500),
+        ])
+
+    def test_agrupar_registra_un_movimiento_por_producto_y_dia(self):
+        contenido = CABECERA_VENTAS + (
+            _filas_ventas('2025-01-01 10:00', 'BI0001AA', 2)
+            + _filas_ventas('2025-01-02 09:00', 'BI0001AA', 1)
+        )
+        self.subir('ventas-diarias-csv', 'Tienda_Centro_20250102.csv', contenido, agrupar='1')
+
+        self.assertEqual(
+            sorted(MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_VENTA).values_list('fecha_venta', 'cantidad')),
+            [(date(2025, 1, 1), 2), (date(2025, 1, 2), 1)],
+        )
+
+    def test_reconstruir_da_el_mismo_resumen(self):
+        contenido = CABECERA_VENTAS + _filas_ventas('2025-01-01 10:00', 'BI0001AA', 2) + b"sin fecha,Tienda Centro,F,BI0002AA,x,1\n"
+        self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', contenido)
+        servicios.vender('BI0002AA', self.tienda, 4)
+        incremental = self.resumen()
+
+        call_command('reconstruir_ventas_diarias', stdout=io.StringIO())
+
+        self.assertEqual(self.resumen(), incremental)
+        self.assertEqual(incremental[-1][0], timezone.localdate())
+        self.assertEqual(incremental[-1][3], 5)
+
+    def test_dashboard_lee_del_resumen(self):
+        VentaDiaria.objects.create(fecha=date(2025, 1, 5), producto_id='BI0001AA', ubicacion=self.tienda, unidades=7, ingresos=7000)
+        VentaDiaria.objects.create(fecha=date(2025, 2, 1), producto_id='BI0002AA', ubicacion=self.tienda, unidades=3, ingresos=1500)
+
+        datos = self.client.get('/api/dashboard-data/').json()
+
+        self.assertEqual(datos['ventas_mensuales'], [{'mes': '2025-01', 'total': 7}, {'mes': '2025-02', 'total': 3}])
+        self.assertEqual([item['producto__cod_venta'] for item in datos['top_vendidos']], ['BI0001AA', 'BI0002AA'])
+
+
+class CacheDashboardTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA')
+        servicios.recibir('BI0001AA', self.tienda, 10)
+
+    def consultas_del_dashboard(self, cabeceras=None):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/api/dashboard-data/', headers=cabeceras)
+        tablas = ('inventario_ventadiaria', 'inventario_stock')
+        return respuesta, [consulta['sql'] for consulta in consultas if any(tabla in consulta['sql'] for tabla in tablas)]
+
+    def test_la_segunda_consulta_sale_del_cache(self):
+        primera, consultas = self.consultas_del_dashboard()
+        self.assertTrue(consultas)
+
+        segunda, consultas = self.consultas_del_dashboard()
+
+        self.assertEqual(consultas, [])
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda['ETag'], primera['ETag'])
+
+    def test_etag_vigente_responde_304(self):
+        etag = self.client.get('/api/dashboard-data/')['ETag']
+
+        respuesta, consultas = self.consultas_del_dashboard({'If-None-Match': etag})
+
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(consultas, [])
+
+    def test_una_venta_invalida_el_cache(self):
+        etag = self.client.get('/api/dashboard-data/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            servicios.vender('BI0001AA', self.tienda, 3)
+
+        respuesta = self.client.get('/api/dashboard-data/', headers={'If-None-Match': etag})
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(respuesta.json()['top_vendidos'][0]['total_vendido'], 3)
+
+    def test_una_carga_csv_invalida_el_cache(self):
+        etag = self.client.get('/api/dashboard-data/')['ETag']
+        self.subir('ventas-diarias-csv', 'Tienda_Centro_20250101.csv', CABECERA_VENTAS + _filas_ventas('2025-01-01 10:00', 'BI0001AA', 1))
+
+        self.assertNotEqual(self.client.get('/api/dashboard-data/')['ETag'], etag)
+
+
+class ReportesTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA')
+        self.crear_producto('BI0002AA')
+        servicios.recibir('BI0001AA', self.tienda, 10)
+        servicios.recibir('BI0002AA', self.tienda, 10)
+        for _ in range(3):
+            servicios.vender('BI0001AA', self.tienda, 1)
+        servicios.vender('BI0002AA', self.tienda, 2)
+
+    def test_paginas_por_cursor_sin_repetir_ni_saltar(self):
+        ids, url = [], '/api/reportes/?limite=2'
+        while url:
+            datos = self.client.get(url).json()
+            self.assertLessEqual(len(datos['results']), 2)
+            ids += [fila['id'] for fila in datos['results']]
+            url = f"/api/reportes/?limite=2&cursor={datos['next']}" if datos['next'] else None
+
+        esperados = list(MovimientoInventario.objects.order_by('-fecha_hora', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, esperados)
+
+    def test_el_cursor_respeta_los_filtros(self):
+        primera = self.client.get(f'/api/reportes/?limite=2&producto_id=BI0001AA&tipo_movimiento={MovimientoInventario.TIPO_VENTA}').json()
+        segunda = self.client.get(f"/api/reportes/?limite=2&producto_id=BI0001AA&tipo_movimiento={MovimientoInventario.TIPO_VENTA}&cursor={primera['next']}").json()
+
+        filas = primera['results'] + segunda['results']
+        self.assertEqual(len(filas), 3)
+        self.assertEqual({(fila['producto_cod'], fila['tipo_display']) for fila in filas}, {('BI0001AA', 'Venta')})
+        self.assertIsNone(segunda['next'])
+
+    def test_jsonl_entrega_una_linea_por_movimiento(self):
+        respuesta = self.client.get(f'/api/reportes/?formato=jsonl&tipo_movimiento={MovimientoInventario.TIPO_VENTA}')
+
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson')
+        filas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).splitlines()]
+        esperados = MovimientoInventario.objects.filter(tipo=MovimientoInventario.TIPO_VENTA).order_by('-fecha_hora', '-id')
+        self.assertEqual([fila['id'] for fila in filas], list(esperados.values_list('id', flat=True)))
+        self.assertEqual(sum(fila['cantidad'] for fila in filas), 5)
+
+    def test_parametros_invalidos(self):
+        for consulta in ('fecha_inicio=01-01-2025', 'cursor=xyz', 'limite=muchos'):
+            respuesta = self.client.get(f'/api/reportes/?{consulta}')
+            self.assertEqual(respuesta.status_code, 400, consulta)
+            self.assertIn('error', respuesta.json())
+
+
+class ExportarReporteTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA', descripcion='Vestido, largo')
+        servicios.recibir('BI0001AA', self.tienda, 5)
+        servicios.vender('BI0001AA', self.tienda, 2)
+
+    def test_csv_en_streaming_con_los_filtros_del_reporte(self):
+        respuesta = self.client.get(f'/api/reportes/export/?format=csv&tipo_movimiento={MovimientoInventario.TIPO_VENTA}')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment; filename="reporte_facboa.csv"', respuesta['Content-Disposition'])
+        filas = list(csv.reader(io.StringIO(b''.join(respuesta.streaming_content).decode())))
+        self.assertEqual(filas[0][:2], ['Fecha Hora', 'Producto Código'])
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][1:5], ['BI0001AA', 'Vestido, largo', 'Venta', '2'])
+
+    def test_fecha_invalida_responde_en_json(self):
+        respuesta = self.client.get('/api/reportes/export/?format=csv&fecha_fin=ayer')
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('error', respuesta.json())
+
+    def test_formato_sin_su_paquete_responde_501(self):
+        for formato, paquete in (('xlsx', 'xlsxwriter'), ('parquet', 'pyarrow')):
+            with mock.patch.dict(sys.modules, {paquete: None}):
+                respuesta = self.client.get(f'/api/reportes/export/?format={formato}')
+            self.assertEqual(respuesta.status_code, 501, formato)
+            self.assertIn(paquete, respuesta.json()['error'])
+
+    @skipUnless(importlib.util.find_spec('xlsxwriter'), 'requiere xlsxwriter')
+    def test_xlsx(self):
+        respuesta = self.client.get('/api/reportes/export/?format=xlsx')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content)[:2], b'PK')
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'requiere pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        respuesta = self.client.get('/api/reportes/export/?format=parquet')
+
+        tabla = pq.read_table(io.BytesIO(b''.join(respuesta.streaming_content)))
+        self.assertEqual(tabla.num_rows, MovimientoInventario.objects.count())
+        self.assertEqual(sorted(tabla.column('cantidad').to_pylist()), [2, 5])
+
+
+class BusquedaProductosTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA', id_fabrica='X-100', descripcion='Polera azul')
+        self.crear_producto('BI0002AA', id_fabrica='AZ-1', descripcion='Gorra roja')
+        self.crear_producto('BI0003AA', id_fabrica='AZ', descripcion='Vestido')
+        self.crear_producto('BI0004AA', id_fabrica='Y-200', descripcion='Zapato negro')
+        self.crear_producto('BI0005AA', id_fabrica='F-AZ9', descripcion='Bufanda')
+
+    def buscar(self, consulta):
+        respuesta = self.client.get(f'/api/productos/buscar/?{consulta}')
+        self.assertEqual(respuesta.status_code, 200)
+        return [producto['cod_venta'] for producto in respuesta.json()['results']]
+
+    def test_orden_por_relevancia(self):
+        # Fábrica exacto, fábrica que empieza, fábrica que contiene y por último la descripción
+        self.assertEqual(self.buscar('q=az'), ['BI0003AA', 'BI0002AA', 'BI0005AA', 'BI0001AA'])
+
+    def test_prefijo_de_codigo_de_venta_primero(self):
+        self.assertEqual(self.buscar('q=bi000'), ['BI0001AA', 'BI0002AA', 'BI0003AA', 'BI0004AA', 'BI0005AA'])
+        self.assertEqual(self.buscar('q=BI0004AA'), ['BI0004AA'])
+
+    def test_limite(self):
+        self.assertEqual(self.buscar('q=bi&limite=2'), ['BI0001AA', 'BI0002AA'])
+        self.assertEqual(self.buscar('q=az&limite=1'), ['BI0003AA'])
+        with mock.patch('inventario.views.BUSQUEDA_LIMITE_MAXIMO', 3):
+            self.assertEqual(len(self.buscar('q=bi&limite=50')), 3)
+
+    def test_consulta_corta_o_limite_invalido(self):
+        self.assertEqual(self.buscar('q=b'), [])
+        self.assertEqual(self.client.get('/api/productos/buscar/?q=bi&limite=x').status_code, 400)
+
+    def test_busqueda_repetida_no_consulta_la_base(self):
+        self.buscar('q=az')
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.buscar('q=az'), ['BI0003AA', 'BI0002AA', 'BI0005AA', 'BI0001AA'])
+
+        self.assertFalse([c['sql'] for c in consultas if 'inventario_producto' in c['sql']])
+
+
+class CatalogoProductosTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for codigo in ('BI0001AA', 'BI0002AA', 'BI0003AA'):
+            self.crear_producto(codigo)
+        self.catalogo = CatalogoProductos(capacidad=2)
+
+    def test_resuelve_los_faltantes_en_una_consulta_y_recuerda_los_inexistentes(self):
+        with self.assertNumQueries(1):
+            encontrados = self.catalogo.resolver(['BI0001AA', 'BI0002AA', 'BI9999ZZ'])
+        self.assertEqual(set(encontrados), {'BI0001AA', 'BI0002AA'})
+
+        catalogo = CatalogoProductos(capacidad=10)
+        catalogo.resolver(['BI0001AA', 'BI9999ZZ'])
+        with self.assertNumQueries(0):
+            self.assertIsNone(catalogo.obtener('BI9999ZZ'))
+            self.assertEqual(catalogo.obtener('BI0001AA').descripcion, 'BI0001AA')
+
+    def test_desaloja_la_entrada_menos_usada(self):
+        self.catalogo.obtener('BI0001AA')
+        self.catalogo.obtener('BI0002AA')
+        self.catalogo.obtener('BI0001AA')
+        self.catalogo.obtener('BI0003AA')
+
+        with self.assertNumQueries(0):
+            self.catalogo.obtener('BI0001AA')
+            self.catalogo.obtener('BI0003AA')
+        with self.assertNumQueries(1):
+            self.catalogo.obtener('BI0002AA')
+
+    def test_guardar_un_producto_invalida_el_catalogo(self):
+        self.assertEqual(self.catalogo.obtener('BI0001AA').descripcion, 'BI0001AA')
+
+        producto = Producto.objects.get(pk='BI0001AA')
+        producto.descripcion = 'Nueva'
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+
+        self.assertEqual(self.catalogo.obtener('BI0001AA').descripcion, 'Nueva')
+
+    def test_borrar_un_producto_invalida_el_catalogo(self):
+        self.assertIsNotNone(self.catalogo.obtener('BI0003AA'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.get(pk='BI0003AA').delete()
+
+        self.assertIsNone(self.catalogo.obtener('BI0003AA'))
+
+    def test_la_carga_inicial_invalida_el_catalogo(self):
+        self.assertEqual(catalogo.obtener('BI0002AA').precio, 1000)
+
+        self.subir('carga-inicial-csv', 'inventario.csv', CABECERA_CARGA + b"BI0002AA,2500,1000,F,1,x\n")
+
+        self.assertEqual(catalogo.obtener('BI0002AA').precio, 2500)
+
+
+class MovimientoViewSetTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA')
+        self.crear_producto('BI0002AA')
+
+    def crear_movimientos(self, cantidad):
+        for _ in range(cantidad):
+            servicios.recibir('BI0001AA', self.bodega, 1)
+            servicios.vender('BI0001AA', self.bodega, 1)
+
+    def consultas_del_listado(self, limite):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(f'/api/movimientos/?limite={limite}')
+        self.assertEqual(len(respuesta.json()['results']), limite)
+        return len(consultas)
+
+    def test_consultas_no_dependen_del_tamano_de_pagina(self):
+        self.crear_movimientos(10)
+        self.client.get('/api/movimientos/?limite=1')
+
+        self.assertEqual(self.consultas_del_listado(2), self.consultas_del_listado(20))
+
+    def test_filtros(self):
+        servicios.recibir('BI0001AA', self.bodega, 5)
+        servicios.recibir('BI0002AA', self.tienda, 5)
+        servicios.vender('BI0002AA', self.tienda, 1)
+        antiguo = servicios.recibir('BI0002AA', self.bodega, 1)
+        MovimientoInventario.objects.filter(pk=antiguo.pk).update(fecha_hora=timezone.now() - timedelta(days=40))
+
+        def ids(consulta):
+            return {movimiento['id'] for movimiento in self.client.get(f'/api/movimientos/?{consulta}').json()['results']}
+
+        movimientos = MovimientoInventario.objects.all()
+        self.assertEqual(ids('producto_id=BI0002AA'), set(movimientos.filter(producto_id='BI0002AA').values_list('id', flat=True)))
+        self.assertEqual(ids(f'tipo_movimiento={MovimientoInventario.TIPO_VENTA}'), set(movimientos.filter(tipo=MovimientoInventario.TIPO_VENTA).values_list('id', flat=True)))
+        self.assertEqual(ids(f'ubicacion_id={self.tienda.pk}'), set(movimientos.filter(producto_id='BI0002AA').exclude(pk=antiguo.pk).values_list('id', flat=True)))
+        desde = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(ids(f'fecha_inicio={desde}'), set(movimientos.exclude(pk=antiguo.pk).values_list('id', flat=True)))
+        hasta = (timezone.localdate() - timedelta(days=30)).isoformat()
+        self.assertEqual(ids(f'fecha_fin={hasta}'), {antiguo.pk})
+        self.assertEqual(self.client.get('/api/movimientos/?fecha_fin=ayer').status_code, 400)
+
+    def test_recorre_todos_los_movimientos_una_vez_aunque_lleguen_nuevos(self):
+        for _ in range(5):
+            servicios.recibir('BI0001AA', self.bodega, 1)
+        # Empates de fecha_hora: el id decide el orden
+        MovimientoInventario.objects.update(fecha_hora=timezone.now() - timedelta(minutes=5))
+        esperados = list(MovimientoInventario.objects.order_by('-fecha_hora', '-id').values_list('id', flat=True))
+
+        pagina = self.client.get('/api/movimientos/?limite=2').json()
+        vistos = [movimiento['id'] for movimiento in pagina['results']]
+        servicios.recibir('BI0001AA', self.bodega, 1)
+        while pagina['next']:
+            pagina = self.client.get(f"/api/movimientos/?limite=2&cursor={pagina['next']}").json()
+            vistos += [movimiento['id'] for movimiento in pagina['results']]
+
+        self.assertEqual(vistos, esperados)
+
+    def test_cursor_invalido(self):
+        self.assertEqual(self.client.get('/api/movimientos/?cursor=no-es-un-cursor').status_code, 400)
+
+    def test_crear_un_movimiento_modifica_el_stock(self):
+        respuesta = self.client.post('/api/movimientos/', {
+            'tipo': MovimientoInventario.TIPO_ENTRADA_COMPRA,
+            'producto': 'BI0001AA', 'cantidad': 4, 'ubicacion_destino': self.tienda.pk,
+        })
+
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 4)
+        self.assertTotalCuadra('BI0001AA')
+
+
+class ServiciosStockTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto('BI0001AA')
+        servicios.recibir(self.producto, self.bodega, 10)
+        servicios.recibir(self.producto, self.tienda, 2)
+
+    def test_stock_insuficiente_no_cambia_nada(self):
+        # De la tienda a la bodega se suma primero en la bodega (menor id): también se deshace
+        for origen, destino in ((self.bodega, self.tienda), (self.tienda, self.bodega)):
+            with self.assertRaises(servicios.StockInsuficiente):
+                servicios.mover(self.producto, origen, destino, 11)
+
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 10)
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 2)
+        self.assertEqual(MovimientoInventario.objects.count(), 2)
+        self.assertTotalCuadra('BI0001AA')
+
+    def test_mover_actualiza_las_ubicaciones_en_orden_de_id(self):
+        orden = mock.Mock()
+        with mock.patch.object(servicios, '_descontar', wraps=servicios._descontar) as descontar, \
+                mock.patch.object(servicios, '_sumar', wraps=servicios._sumar) as sumar:
+            orden.attach_mock(descontar, 'descontar')
+            orden.attach_mock(sumar, 'sumar')
+            servicios.mover(self.producto, self.bodega, self.tienda, 1)
+            servicios.mover(self.producto, self.tienda, self.bodega, 1)
+
+        self.assertLess(self.bodega.pk, self.tienda.pk)
+        self.assertEqual(orden.mock_calls, [
+            mock.call.descontar('BI0001AA', self.bodega, 1),
+            mock.call.sumar('BI0001AA', self.tienda, 1),
+            mock.call.sumar('BI0001AA', self.bodega, 1),
+            mock.call.descontar('BI0001AA', self.tienda, 1),
+        ])
+
+    def test_mover_y_vender_mantienen_el_total(self):
+        servicios.mover(self.producto, self.bodega, self.tienda, 4)
+        servicios.vender(self.producto, self.tienda, 3)
+
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 6)
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 3)
+        self.assertTotalCuadra('BI0001AA')
+
+
+class MetricasTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.crear_producto('BI0001AA')
+
+    def test_server_timing_con_consultas_serializacion_y_renderizado(self):
+        respuesta = self.client.get('/api/productos/buscar/?q=BI0001')
+
+        cabecera = respuesta['Server-Timing']
+        self.assertRegex(cabecera, r'db;desc="\d+ consultas";dur=[\d.]+')
+        self.assertRegex(cabecera, r'ser;desc="serializers";dur=[\d.]+')
+        self.assertRegex(cabecera, r'render;desc="renderer";dur=[\d.]+')
+        self.assertRegex(cabecera, r'total;dur=[\d.]+')
+
+    def test_linea_json_por_peticion(self):
+        with self.assertLogs('inventario.metricas', 'INFO') as logs:
+            self.client.get('/api/productos/buscar/?q=BI0001')
+
+        linea = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((linea['vista'], linea['metodo'], linea['estado']), ('producto-buscar', 'GET', 200))
+        self.assertGreater(linea['consultas'], 0)
+        self.assertIsNotNone(linea['serializacion_ms'])
+        self.assertGreater(linea['bytes'], 0)
+
+    @override_settings(METRICAS_EXPONER=False)
+    def test_endpoint_deshabilitado(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+    @override_settings(METRICAS_EXPONER=True)
+    def test_endpoint_solo_para_staff(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        Usuario.objects.filter(pk=self.operador.pk).update(is_staff=True)
+        self.client.get('/api/productos/buscar/?q=BI0001')
+        respuesta = self.client.get('/api/metrics/')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('facboa_serializacion_segundos_count{vista="producto-buscar",metodo="GET"}', respuesta.content.decode())
+
+
+class RenovarSesionTests(InventarioTestCase):
+
+    def setUp(self):
+        # Sesión real con login, no force_login: se prueba la fecha que fija api_login
+        cache.clear()
+        Usuario.objects.create_user('sesion', password='clave')
+        respuesta = self.client.post('/api/login/', {'username': 'sesion', 'password': 'clave'}, content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+        self.clave = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def expiracion(self):
+        return Session.objects.get(session_key=self.clave).expire_date
+
+    def fijar_expiracion(self, segundos):
+        sesion = self.client.session
+        sesion.set_expiry(timezone.now() + timedelta(seconds=segundos))
+        sesion.save()
+
+    def test_lejos_de_expirar_no_se_guarda(self):
+        expiracion = self.expiracion()
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/api/productos/buscar/?q=BI')
+
+        escrituras = [c['sql'] for c in consultas if 'django_session' in c['sql'] and not c['sql'].startswith('SELECT')]
+        self.assertEqual(escrituras, [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, respuesta.cookies)
+        self.assertEqual(self.expiracion(), expiracion)
+
+    def test_cerca_de_expirar_se_renueva(self):
+        self.fijar_expiracion(settings.SESSION_RENOVACION_UMBRAL - 60)
+
+        respuesta = self.client.get('/api/productos/buscar/?q=BI')
+
+        self.assertIn(settings.SESSION_COOKIE_NAME, respuesta.cookies)
+        renovada = timezone.now() + timedelta(seconds=settings.SESSION_COOKIE_AGE)
+        self.assertAlmostEqual(self.expiracion(), renovada, delta=timedelta(minutes=1))
+
+    def test_sesion_vencida_no_se_renueva(self):
+        self.fijar_expiracion(-60)
+
+        self.client.get('/api/productos/buscar/?q=BI')
+
+        self.assertLess(self.expiracion(), timezone.now())
+
+
+class TokenJWTTests(InventarioTestCase):
+
+    def setUp(self):
+        cache.clear()
+        Usuario.objects.create_user('terminal', password='clave-terminal', perfil=Usuario.PERFIL_OPERA)
+
+    def obtener(self, username='terminal', password='clave-terminal'):
+        return self.client.post('/api/token/', {'username': username, 'password': password}, content_type='application/json')
+
+    def test_obtener_incluye_el_perfil_como_claim(self):
+        respuesta = self.obtener()
+
+        self.assertEqual(respuesta.status_code, 200)
+        acceso = AccessToken(respuesta.json()['access'])
+        self.assertEqual(acceso['username'], 'terminal')
+        self.assertEqual(acceso['perfil'], Usuario.PERFIL_OPERA)
+        self.assertFalse(acceso['is_staff'])
+
+    def test_credenciales_invalidas(self):
+        self.assertEqual(self.obtener(password='otra').status_code, 401)
+
+    def test_refrescar_conserva_los_claims(self):
+        refresco = self.obtener().json()['refresh']
+
+        respuesta = self.client.post('/api/token/refresh/', {'refresh': refresco}, content_type='application/json')
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(AccessToken(respuesta.json()['access'])['perfil'], Usuario.PERFIL_OPERA)
+
+    def test_peticion_con_bearer_no_consulta_usuarios_ni_sesiones(self):
+        self.crear_producto('BI0001AA')
+        servicios.recibir('BI0001AA', self.tienda, 2)
+        acceso = self.obtener().json()['access']
+
+        archivo = SimpleUploadedFile('Tienda_Centro_20250101.csv', CABECERA_VENTAS + _filas_ventas('2025-01-01 10:00', 'BI0001AA', 1))
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.post(
+                '/api/ventas-diarias-csv/?sincrono=1', {'file': archivo}, headers={'Authorization': f'Bearer {acceso}'},
+            )
+
+        self.assertEqual(respuesta.status_code, 200)
+        sql = ' '.join(consulta['sql'] for consulta in consultas)
+        self.assertNotIn('django_session', sql)
+        self.assertNotIn('inventario_usuario', sql)
+        self.assertEqual(MovimientoInventario.objects.get(tipo=MovimientoInventario.TIPO_VENTA).usuario.username, 'terminal')
+
+
+class StockTotalTests(InventarioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto('BI0001AA', stock_minimo=5, stock_critico=2, stock_maximo=12)
+        servicios.recibir(self.producto, self.bodega, 10)
+
+    def test_borrar_stock_descuenta_del_total(self):
+        servicios.mover(self.producto, self.bodega, self.tienda, 4)
+        self.tienda.delete()
+
+        self.assertEqual(ProductoStockTotal.objects.get(producto=self.producto).cantidad, 6)
+        self.assertTotalCuadra('BI0001AA')
+
+    def test_reconstruir_corrige_un_total_desviado(self):
+        ProductoStockTotal.objects.filter(producto=self.producto).update(cantidad=99)
+
+        call_command('reconstruir_stock_total', stdout=io.StringIO())
+
+        self.assertTotalCuadra('BI0001AA')
+
+    def test_alertas_bajo_el_minimo_y_el_critico(self):
+        self.crear_producto('BI0002AA', stock_minimo=3, stock_critico=1)
+        servicios.vender(self.producto, self.bodega, 9)
+
+        alertas = self.client.get('/api/alertas-stock/?nivel=minimo').json()
+        self.assertEqual([alerta['cod_venta'] for alerta in alertas], ['BI0002AA', 'BI0001AA'])
+        self.assertEqual(alertas[1]['nivel'], 'critico')
+        self.assertEqual(alertas[1]['faltante'], 11)
+
+        criticas = self.client.get('/api/alertas-stock/?nivel=critico').json()
+        self.assertEqual([alerta['cod_venta'] for alerta in criticas], ['BI0002AA', 'BI0001AA'])
+
+    def test_cambiar_los_umbrales_del_producto_actualiza_las_alertas(self):
+        self.assertEqual(self.client.get('/api/alertas-stock/').json(), [])
+
+        self.producto.stock_minimo = 20
+        self.producto.save()
+
+        self.assertEqual([alerta['cod_venta'] for alerta in self.client.get('/api/alertas-stock/').json()], ['BI0001AA'])
+
+    def test_nivel_invalido(self):
+        self.assertEqual(self.client.get('/api/alertas-stock/?nivel=otro').status_code, 400)
+
+
+class ReposicionTests(InventarioTestCase):
+
+    def vendido(self, ubicacion, cod_venta, unidades, dias_atras=0):
+        VentaDiaria.objects.create(
+            fecha=timezone.localdate() - timedelta(days=dias_atras), producto_id=cod_venta,
+            ubicacion=ubicacion, unidades=unidades, ingresos=unidades * 1000,
+        )
+
+    def test_repone_productos_con_minimo_sin_stock_ni_ventas_en_el_destino(self):
+        self.crear_producto('BI0001AA', stock_minimo=4)
+        self.crear_producto('BI0002AA', stock_minimo=4, stock_maximo=10)
+        servicios.recibir('BI0001AA', self.bodega, 10)
+        servicios.recibir('BI0002AA', self.bodega, 6)
+
+        plan = planificar_reposicion(self.bodega, [self.tienda]).set_index('cod_venta')
+
+        self.assertEqual(int(plan.loc['BI0001AA', 'qty']), 4)
+        # Se piden 10 para llegar al máximo, pero la bodega solo tiene 6
+        self.assertEqual(int(plan.loc['BI0002AA', 'sugerido']), 10)
+        self.assertEqual(int(plan.loc['BI0002AA', 'qty']), 6)
+
+    def test_proyecta_el_stock_con_la_velocidad_de_venta_de_la_ventana(self):
+        self.crear_producto('BI0001AA', stock_minimo=5, stock_maximo=12)
+        servicios.recibir('BI0001AA', self.bodega, 20)
+        servicios.recibir('BI0001AA', self.tienda, 10)
+        self.vendido(self.tienda, 'BI0001AA', 20, dias_atras=3)
+        self.vendido(self.tienda, 'BI0001AA', 8, dias_atras=20)
+        # Fuera de la ventana de 28 días: no cuenta
+        self.vendido(self.tienda, 'BI0001AA', 50, dias_atras=28)
+
+        fila = planificar_reposicion(self.bodega, [self.tienda], dias_ventana=28, dias_cobertura=7).iloc[0]
+
+        self.assertEqual(fila['velocidad'], 1.0)
+        self.assertEqual(fila['proyectado'], 3.0)
+        self.assertEqual((int(fila['sugerido']), int(fila['qty'])), (9, 9))
+
+    def test_sin_necesidad_no_entra_al_plan(self):
+        self.crear_producto('BI0001AA', stock_minimo=5)
+        servicios.recibir('BI0001AA', self.bodega, 20)
+        servicios.recibir('BI0001AA', self.tienda, 10)
+
+        self.assertTrue(planificar_reposicion(self.bodega, [self.tienda]).empty)
+
+    def test_la_bodega_abastece_primero_a_la_ubicacion_mas_urgente(self):
+        otra = Ubicacion.objects.create(nombre='Tienda Norte', tipo=Ubicacion.TIPO_PUNTO_FIJO)
+        self.crear_producto('BI0001AA', stock_minimo=5, stock_maximo=10)
+        servicios.recibir('BI0001AA', self.bodega, 12)
+        servicios.recibir('BI0001AA', self.tienda, 4)
+
+        plan = planificar_reposicion(self.bodega, [self.tienda, otra]).set_index('ubicacion_id')
+
+        self.assertEqual(int(plan.loc[otra.pk, 'qty']), 10)
+        self.assertEqual((int(plan.loc[self.tienda.pk, 'sugerido']), int(plan.loc[self.tienda.pk, 'qty'])), (6, 2))
+
+    def test_el_csv_del_plan_se_puede_subir_como_transferencia(self):
+        self.crear_producto('BI0001AA', stock_minimo=4)
+        servicios.recibir('BI0001AA', self.bodega, 10)
+
+        respuesta = self.client.get(f'/api/reposicion/?ubicacion_id={self.tienda.pk}&formato=csv')
+        self.assertEqual(respuesta.status_code, 200)
+        nombre = respuesta['Content-Disposition'].split('filename=')[1].strip('"')
+
+        resultado = self.subir('transferencia-csv', nombre, respuesta.content)
+
+        self.assertEqual(resultado.json()['errores'], [])
+        self.assertEqual(self.stock('BI0001AA', self.tienda), 4)
+        self.assertEqual(self.stock('BI0001AA', self.bodega), 6)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/reposicion/?formato=csv').status_code, 400)
+        self.assertEqual(self.client.get('/api/reposicion/?dias_ventana=0').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/reposicion/?ubicacion_id={self.bodega.pk}').status_code, 400)
@@ -2,6 +2,7 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from . import views
 
 # 1. Creamos un ÚNICO router
@@ -21,11 +22,20 @@ urlpatterns = [
     path('carga-inicial-csv/', views.carga_inicial_csv, name='carga-inicial-csv'),
     path('transferencia-csv/', views.transferencia_csv, name='transferencia-csv'),
     path('ventas-diarias-csv/', views.ventas_diarias_csv, name='ventas-diarias-csv'),
+    path('import-jobs/<int:pk>/', views.TrabajoImportacionDetailAPIView.as_view(), name='import-job-detalle'),
     path('trazabilidad/<str:cod_venta>/', views.TrazabilidadProductoAPIView.as_view(), name='trazabilidad-producto'),
+    path('stock-historico/', views.stock_historico, name='stock-historico'),
     path('dashboard-data/', views.dashboard_data, name='dashboard-data'),
+    path('alertas-stock/', views.AlertasStockAPIView.as_view(), name='alertas-stock'),
+    path('reposicion/', views.reposicion, name='reposicion'),
     path('login/', views.api_login, name='api_login'),
     path('logout/', views.api_logout, name='api_logout'),
+    # Tokens JWT para clientes de la API y terminales de tienda
+    path('token/', TokenObtainPairView.as_view(), name='token-obtener'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refrescar'),
     path('reportes/', views.reportes_avanzados, name='reportes-avanzados'),
+    path('reportes/export/', views.ExportarReporteAPIView.as_view(), name='reportes-exportar'),
+    path('metrics/', views.metricas, name='metricas'),
     # 4. Incluimos las URLs del router UNA SOLA VEZ
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -2,7 +2,7 @@ from rest_framework import generics
 from .models import Producto, Ubicacion, Stock, MovimientoInventario
 from .serializers import ProductoSerializer, UbicacionSerializer, MovimientoInventarioSerializer
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from .models import Usuario
 from .serializers import UsuarioSerializer
 from rest_framework import viewsets, permissions
@@ -19,11 +19,102 @@ class UbicacionListAPIView(generics.ListAPIView):
     
 # ... (código de las vistas anteriores) ...
 
-import pandas as pd
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.db import transaction
+from .ingesta import ErrorLecturaCSV
+from .importaciones import (
+    MODOS,
+    ImportacionRechazada,
+    crear_trabajo,
+    ejecutar_ingesta,
+    fecha_de_nombre,
+    importacion_completada,
+    leer_bloques,
+    modo_por_defecto,
+    reanudar_si_detenido,
+    registrar_archivo,
+    simular_ingesta,
+)
+from .models import RegistroIngesta, TrabajoImportacion
+from .serializers import TrabajoImportacionSerializer
+
+def _importar_csv(request, tipo, csv_file, bloques, parametros):
+    """
+    Encola la carga como un TrabajoImportacion y responde de inmediato con su id
+    (202). Con ?sincrono=1 la carga se procesa dentro de la misma petición.
+
+    Si el mismo archivo (mismo contenido, ubicación y fecha) ya se importó, no
+    se vuelve a aplicar (salvo la carga inicial, que fija el stock y siempre se
+    aplica); si se está importando se devuelve el trabajo en curso.
+
+    Con ?dry_run=1 el archivo se valida completo sin guardar nada y se
+    responde con todos los errores y los cambios de stock que produciría.
+    """
+    # Con JWT el usuario no se lee de la base: basta su id, que viene en el token
+    usuario_id = request.user.pk if request.user.is_authenticated else None
+
+    # ?modo=parcial confirma cada bloque de filas por separado; ?modo=todo aplica
+    # el archivo entero o nada
+    modo = request.query_params.get('modo', modo_por_defecto())
+    if modo not in MODOS:
+        return Response({'error': f"El parámetro 'modo' debe ser uno de: {', '.join(MODOS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+    ubicacion_id = parametros.get('ubicacion_id', parametros.get('bodega_principal_id'))
+    if request.query_params.get('dry_run') in ('1', 'true'):
+        try:
+            resultado, mensaje = simular_ingesta(tipo, bloques, parametros)
+        except ErrorLecturaCSV as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        completado = importacion_completada(tipo, csv_file, ubicacion_id, fecha_de_nombre(csv_file.name))
+        if completado:
+            mensaje += f' Este archivo ya se importó el {timezone.localtime(completado.completado):%Y-%m-%d %H:%M} y no se aplicaría de nuevo.'
+        return Response({
+            'message': mensaje,
+            'dry_run': True,
+            'duplicado': completado is not None,
+            'procesados': resultado['procesados'],
+            'omitidos': resultado['omitidos'],
+            'errores': resultado['errores'],
+            'deltas': resultado['deltas'],
+        }, status=status.HTTP_200_OK)
+
+    registro, repetido = registrar_archivo(tipo, csv_file, ubicacion_id, fecha_de_nombre(csv_file.name))
+    if repetido:
+        if registro.estado == RegistroIngesta.ESTADO_COMPLETADO:
+            return Response({
+                'message': f'El archivo "{csv_file.name}" ya se importó el {timezone.localtime(registro.completado):%Y-%m-%d %H:%M}. No se aplicó de nuevo.',
+                'duplicado': True,
+                'errores': [],
+            }, status=status.HTTP_200_OK)
+        if registro.trabajo_id is None:
+            return Response({'error': f'El archivo "{csv_file.name}" ya se está importando en otra petición. Vuelve a intentarlo cuando termine.'}, status=status.HTTP_409_CONFLICT)
+        # Si el trabajo en curso se detuvo, se reanuda desde sus filas confirmadas
+        reanudar_si_detenido(registro.trabajo)
+        return Response({
+            'message': f'El archivo "{csv_file.name}" ya se está importando.',
+            'duplicado': True,
+            'job_id': registro.trabajo_id,
+        }, status=status.HTTP_202_ACCEPTED)
+    parametros = {**parametros, 'registro_id': registro.pk, 'modo': modo}
+
+    if request.query_params.get('sincrono') in ('1', 'true'):
+        try:
+            resultado, mensaje = ejecutar_ingesta(tipo, bloques, parametros, usuario_id)
+        except ErrorLecturaCSV as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ImportacionRechazada as e:
+            return Response({'error': str(e), 'errores': e.resultado['errores']}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': mensaje, 'errores': resultado['errores']}, status=status.HTTP_200_OK)
+
+    trabajo = crear_trabajo(tipo, csv_file, parametros, usuario_id)
+    return Response({
+        'message': f'Importación de "{csv_file.name}" en curso.',
+        'job_id': trabajo.pk,
+        'estado': trabajo.estado,
+    }, status=status.HTTP_202_ACCEPTED)
+
 
 @api_view(['POST'])
 def carga_inicial_csv(request):
@@ -39,15 +130,11 @@ def carga_inicial_csv(request):
     if not csv_file.name.endswith('.csv'):
         return Response({'error': 'El archivo no es un CSV.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    # El archivo se procesa en bloques; aquí solo se lee el primero para validar las columnas
     try:
-        df = pd.read_csv(csv_file)
-    except Exception as e:
-        return Response({'error': f'Error al leer el archivo CSV: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Validar que las columnas obligatorias existan
-    columnas_requeridas = {'id_venta', 'price', 'cost', 'id_fabrica', 'qty', 'description'}
-    if not columnas_requeridas.issubset(df.columns):
-        return Response({'error': f'Faltan columnas obligatorias. Se necesitan: {columnas_requeridas}'}, status=status.HTTP_400_BAD_REQUEST)
+        bloques = leer_bloques(TrabajoImportacion.TIPO_CARGA_INICIAL, csv_file)
+    except ErrorLecturaCSV as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     # Obtener la ubicación de la Bodega Principal
     try:
@@ -55,49 +142,17 @@ def carga_inicial_csv(request):
     except Ubicacion.DoesNotExist:
         return Response({'error': 'No se ha definido una "Bodega Principal" en el sistema. Crea una primero.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    productos_creados = 0
-    errores = []
-
-    # Usamos una transacción para asegurar que si algo falla, no se guarde nada a medias
-    with transaction.atomic():
-        for index, row in df.iterrows():
-            try:
-                # Validar formato del id_venta (BI NNNN CC)
-                if not isinstance(row['id_venta'], str) or len(row['id_venta']) != 8:
-                    raise ValueError("El código de venta 'id_venta' debe tener 8 caracteres.")
-
-                # Crear o actualizar el producto
-                producto, created = Producto.objects.update_or_create(
-                    cod_venta=row['id_venta'],
-                    defaults={
-                        'descripcion': row['description'],
-                        'precio': row['price'],
-                        'costo': row['cost'],
-                        'id_fabrica': row['id_fabrica'],
-                    }
-                )
-
-                # Crear o actualizar el stock en la bodega principal
-                stock, created = Stock.objects.update_or_create(
-                    producto=producto,
-                    ubicacion=bodega_principal,
-                    defaults={'cantidad': int(row['qty'])}
-                )
-                productos_creados += 1
-
-            except Exception as e:
-                errores.append(f'Error en fila {index + 2}: {str(e)}')
-
-    return Response({
-        'message': f'Carga completada. {productos_creados} productos procesados.',
-        'errores': errores
-    }, status=status.HTTP_200_OK)
+    parametros = {'bodega_principal_id': bodega_principal.pk}
+    return _importar_csv(request, TrabajoImportacion.TIPO_CARGA_INICIAL, csv_file, bloques, parametros)
     
  # ... (código anterior) ...
 
 import os
+import logging
 from django.core.files.storage import default_storage
 
+logger = logging.getLogger(__name__)
+
 @api_view(['POST'])
 def transferencia_csv(request):
     """
@@ -125,9 +180,7 @@ def transferencia_csv(request):
         # Extraer el nombre del lugar entre 'tras_bod_' y el último '_'
         lugar_nombre = filename[9:last_underscore_index]
         
-        # --- LÍNEA DE DEPURACIÓN ---
-        # Esto imprimirá en la consola del servidor el nombre que estamos buscando
-        print(f"DEBUG: Buscando la ubicación con el nombre: '{lugar_nombre}'")
+        logger.debug("Buscando la ubicación con el nombre: '%s'", lugar_nombre)
         
         # No necesitamos reemplazar nada, el nombre ya está listo
         ubicacion_destino = Ubicacion.objects.get(nombre=lugar_nombre, activa=True)
@@ -140,67 +193,14 @@ def transferencia_csv(request):
         return Response({'error': f'Error al procesar el nombre del archivo: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        df = pd.read_csv(csv_file)
-    except Exception as e:
-        return Response({'error': f'Error al leer el archivo CSV: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-    columnas_requeridas = {'cod_venta', 'price', 'qty', 'description'}
-    if not columnas_requeridas.issubset(df.columns):
-        return Response({'error': f'Faltan columnas obligatorias. Se necesitan: {columnas_requeridas}'}, status=status.HTTP_400_BAD_REQUEST)
+        bloques = leer_bloques(TrabajoImportacion.TIPO_TRANSFERENCIA, csv_file)
+    except ErrorLecturaCSV as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     bodega_principal = Ubicacion.objects.get(tipo='bodega_principal')
-    transferencias_ok = 0
-    errores = []
-
-    with transaction.atomic():
-        for index, row in df.iterrows():
-            try:
-                producto = Producto.objects.get(cod_venta=row['cod_venta'])
-                cantidad_transferir = int(row['qty'])
-
-                # Obtener stock actual en bodega principal
-                try:
-                    stock_bodega = Stock.objects.get(producto=producto, ubicacion=bodega_principal)
-                except Stock.DoesNotExist:
-                    raise ValueError(f"El producto {producto.cod_venta} no tiene stock en la bodega principal.")
-
-                if stock_bodega.cantidad < cantidad_transferir:
-                    raise ValueError(f"Stock insuficiente en bodega. Se tiene {stock_bodega.cantidad}, se intenta transferir {cantidad_transferir}.")
-
-                # Restar stock de la bodega principal
-                stock_bodega.cantidad -= cantidad_transferir
-                stock_bodega.save()
-
-                # Sumar stock en el destino (o crearlo si no existe)
-                stock_destino, created = Stock.objects.get_or_create(
-                    producto=producto,
-                    ubicacion=ubicacion_destino,
-                    defaults={'cantidad': cantidad_transferir}
-                )
-                if not created:
-                    stock_destino.cantidad += cantidad_transferir
-                    stock_destino.save()
-
-                # Registrar el movimiento
-                MovimientoInventario.objects.create(
-                    producto=producto,
-                    tipo=MovimientoInventario.TIPO_TRANSFERENCIA_SALIDA,
-                    cantidad=cantidad_transferir,
-                    usuario=request.user if request.user.is_authenticated else None,
-                    ubicacion_origen=bodega_principal,
-                    ubicacion_destino=ubicacion_destino,
-                    detalle=f"Transferencia masiva desde {bodega_principal.nombre}"
-                )
-
-                transferencias_ok += 1
-
-            except Exception as e:
-                errores.append(f'Error en fila {index + 2}: {str(e)}')
 
-    return Response({
-        'message': f'Transferencia completada. {transferencias_ok} productos movidos a "{ubicacion_destino.nombre}".',
-        'errores': errores
-    }, status=status.HTTP_200_OK)
+    parametros = {'bodega_principal_id': bodega_principal.pk, 'ubicacion_id': ubicacion_destino.pk}
+    return _importar_csv(request, TrabajoImportacion.TIPO_TRANSFERENCIA, csv_file, bloques, parametros)
     
     # ... (código anterior) ...
 
@@ -210,6 +210,7 @@ def ventas_diarias_csv(request):
     Endpoint para procesar ventas diarias desde un archivo CSV.
     El nombre del archivo debe tener el formato: LUGAR_AAAAMMDD.csv
     Cada línea del CSV representa una unidad vendida.
+    Con ?agrupar=1 se registra un único movimiento por producto y día.
     """
     if 'file' not in request.FILES:
         return Response({'error': 'No se encontró ningún archivo.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -237,54 +238,26 @@ def ventas_diarias_csv(request):
         return Response({'error': 'Error al procesar el nombre del archivo. Asegúrate de que tenga el formato LUGAR_AAAAMMDD.csv'}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        df = pd.read_csv(csv_file)
-    except Exception as e:
-        return Response({'error': f'Error al leer el archivo CSV: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-    columnas_requeridas = {'timestamp', 'lugar', 'id_fabrica', 'id_venta', 'description', 'price'}
-    if not columnas_requeridas.issubset(df.columns):
-        return Response({'error': f'Faltan columnas obligatorias. Se necesitan: {columnas_requeridas}'}, status=status.HTTP_400_BAD_REQUEST)
-
-    ventas_ok = 0
-    errores = []
-
-    with transaction.atomic():
-        for index, row in df.iterrows():
-            try:
-                producto = Producto.objects.get(cod_venta=row['id_venta'])
-
-                # Obtener stock actual en el punto de venta
-                try:
-                    stock_pv = Stock.objects.get(producto=producto, ubicacion=ubicacion_venta)
-                except Stock.DoesNotExist:
-                    raise ValueError(f"El producto {producto.cod_venta} no tiene stock en el punto de venta '{ubicacion_venta.nombre}'.")
-
-                if stock_pv.cantidad < 1:
-                    raise ValueError(f"Stock insuficiente en '{ubicacion_venta.nombre}'. Stock actual: {stock_pv.cantidad}.")
-
-                # Restar 1 del stock (cada línea es una unidad vendida)
-                stock_pv.cantidad -= 1
-                stock_pv.save()
-
-                # Registrar el movimiento de venta
-                MovimientoInventario.objects.create(
-                    producto=producto,
-                    tipo=MovimientoInventario.TIPO_VENTA,
-                    cantidad=1, # Siempre es 1 por línea
-                    usuario=request.user if request.user.is_authenticated else None,
-                    ubicacion_origen=ubicacion_venta, # La venta es una "salida" del PV
-                    detalle=f"Venta diaria registrada desde CSV."
-                )
-
-                ventas_ok += 1
+        bloques = leer_bloques(TrabajoImportacion.TIPO_VENTAS_DIARIAS, csv_file)
+    except ErrorLecturaCSV as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    parametros = {
+        'ubicacion_id': ubicacion_venta.pk,
+        # Con ?agrupar=1 se registra un movimiento por producto en vez de uno por unidad
+        'agrupar': request.query_params.get('agrupar') in ('1', 'true'),
+    }
+    return _importar_csv(request, TrabajoImportacion.TIPO_VENTAS_DIARIAS, csv_file, bloques, parametros)
 
-            except Exception as e:
-                errores.append(f'Error en fila {index + 2}: {str(e)}')
 
-    return Response({
-        'message': f'Ventas diarias procesadas. {ventas_ok} unidades vendidas en "{ubicacion_venta.nombre}".',
-        'errores': errores
-    }, status=status.HTTP_200_OK)
+class TrabajoImportacionDetailAPIView(generics.RetrieveAPIView):
+    """
+    Estado de una importación CSV en segundo plano: filas procesadas,
+    errores y velocidad (filas por segundo). El frontend lo consulta
+    periódicamente mientras el trabajo está pendiente o en proceso.
+    """
+    queryset = TrabajoImportacion.objects.all()
+    serializer_class = TrabajoImportacionSerializer
 
 
 # ... (código anterior) ...
@@ -305,14 +278,24 @@ from rest_framework import status
 from django.db.models import Sum, Q, F
 from .models import MovimientoInventario, Producto, Stock
 from .serializers import MovimientoInventarioSerializer # Tu serializador actual
+from .kardex import con_saldo_acumulado, stock_en_ubicacion, stock_producto_en
+from .paginacion import codificar_cursor, decodificar_cursor, despues_del_cursor
 
 class TrazabilidadProductoAPIView(generics.ListAPIView):
     """
     API View para obtener la trazabilidad completa (Kardex) de un producto.
     Calcula el stock inicial, el stock resultante por cada movimiento y el stock final.
+
+    El stock corrido se calcula en la base de datos con una función de ventana
+    y los movimientos se devuelven por páginas de ?limite= registros (máximo
+    KARDEX_LIMITE_MAXIMO). La respuesta incluye 'siguiente', el cursor que se
+    pasa como ?cursor= para obtener la página siguiente (null en la última).
     """
     serializer_class = MovimientoInventarioSerializer
 
+    KARDEX_LIMITE = 200
+    KARDEX_LIMITE_MAXIMO = 1000
+
     def get(self, request, *args, **kwargs):
         cod_venta = self.kwargs['cod_venta']
 
@@ -321,73 +304,83 @@ class TrazabilidadProductoAPIView(generics.ListAPIView):
         except Producto.DoesNotExist:
             return Response({'error': f'Producto con código {cod_venta} no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
 
-        # 1. Obtener todos los movimientos del producto en orden CRONOLÓGICO
-        movimientos = MovimientoInventario.objects.filter(producto=producto).order_by('fecha_hora')
+        try:
+            limite = min(int(request.GET.get('limite', self.KARDEX_LIMITE)), self.KARDEX_LIMITE_MAXIMO)
+            cursor = decodificar_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not movimientos.exists():
-            # Si no hay movimientos, solo devolvemos el stock actual
-            stock_actual_total = Stock.objects.filter(producto=producto).aggregate(total=Sum('cantidad'))['total'] or 0
-            return Response({
-                'producto_cod_venta': producto.cod_venta,
-                'producto_descripcion': producto.descripcion,
-                'stock_inicial': stock_actual_total, # Si no hay movimientos, el stock inicial es el actual
-                'stock_actual': stock_actual_total,
-                'movimientos': [],
-            }, status=status.HTTP_200_OK)
+        movimientos = MovimientoInventario.objects.filter(producto=producto)
 
-        # 2. Calcular el stock inicial ANTES del primer movimiento
-        # Obtenemos el stock ACTUAL total
+        # 1. Stock inicial (antes del primer movimiento) y stock actual; el
+        #    inicial se calcula desde el cierre de stock más cercano
         stock_actual_total = Stock.objects.filter(producto=producto).aggregate(total=Sum('cantidad'))['total'] or 0
-        
-        # Calculamos el cambio neto de TODOS los movimientos
-        cambio_neto_total = 0
-        for mov in movimientos:
-            if mov.tipo in ['venta', 'transferencia_salida', 'merma']:
-                cambio_neto_total -= mov.cantidad
-            elif mov.tipo in ['entrada_compra', 'transferencia_entrada', 'ajuste_positivo']:
-                cambio_neto_total += mov.cantidad
-        
-        # El stock inicial es el stock actual menos todo el cambio que ha ocurrido
-        stock_inicial = stock_actual_total - cambio_neto_total
-
-        # 3. Construir la lista de trazabilidad (Kardex) con el stock corrido
-        trazabilidad_data = []
-        stock_corrido = stock_inicial
-
-        for mov in movimientos:
-            # Determinar el efecto del movimiento en el stock
-            if mov.tipo in ['venta', 'transferencia_salida', 'merma']:
-                efecto = -mov.cantidad
-            elif mov.tipo in ['entrada_compra', 'transferencia_entrada', 'ajuste_positivo']:
-                efecto = mov.cantidad
-            else: # Ajustes negativos, devoluciones de venta, etc.
-                efecto = -mov.cantidad
-            
-            stock_corrido += efecto
-
-            # Serializar los datos del movimiento
-            serializer = self.get_serializer(mov)
-            movimiento_data = serializer.data
-            
-            # Añadir el stock calculado a los datos del movimiento
-            movimiento_data['stock_resultante'] = stock_corrido
-            
-            trazabilidad_data.append(movimiento_data)
-        
+        stock_inicial = stock_producto_en(producto)
+
+        # 2. Stock justo antes de la página pedida
+        saldo_anterior = stock_inicial
+        if cursor:
+            saldo_anterior = stock_producto_en(producto, cursor)
+            movimientos = despues_del_cursor(movimientos, cursor)
+
+        # 3. Página de movimientos con el stock corrido calculado por la base de datos
+        pagina = list(
+            con_saldo_acumulado(movimientos)
+            .select_related('producto', 'usuario', 'ubicacion_origen', 'ubicacion_destino')[:limite + 1]
+        )
+        siguiente = None
+        if len(pagina) > limite:
+            pagina = pagina[:limite]
+            siguiente = codificar_cursor(pagina[-1].fecha_hora, pagina[-1].pk)
+
+        trazabilidad_data = self.get_serializer(pagina, many=True).data
+        for movimiento_data, mov in zip(trazabilidad_data, pagina):
+            movimiento_data['stock_resultante'] = saldo_anterior + mov.saldo_acumulado
+
         # 4. Estructurar la respuesta final
         response_data = {
             'producto_cod_venta': producto.cod_venta,
             'producto_descripcion': producto.descripcion,
-            'stock_inicial': stock_inicial, # <-- CAMBIO CLAVE
+            'stock_inicial': stock_inicial,
             'stock_actual': stock_actual_total,
             'movimientos': trazabilidad_data,
+            'siguiente': siguiente,
         }
 
         return Response(response_data, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+def stock_historico(request):
+    """
+    Endpoint para consultar el stock de una ubicación al cierre de una fecha.
+    Parámetros: ubicacion_id y fecha (AAAA-MM-DD) obligatorios; producto (cod_venta) opcional.
+    """
+    try:
+        ubicacion = Ubicacion.objects.get(pk=request.GET['ubicacion_id'])
+        fecha = datetime.strptime(request.GET['fecha'], '%Y-%m-%d').date()
+    except (KeyError, ValueError, Ubicacion.DoesNotExist):
+        return Response({'error': 'Se requieren una ubicacion_id válida y una fecha con formato AAAA-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Fin del día pedido, en la zona horaria del proyecto
+    momento = timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+    base, saldos = stock_en_ubicacion(ubicacion, momento, producto=request.GET.get('producto') or None)
+
+    return Response({
+        'ubicacion': ubicacion.nombre,
+        'fecha': fecha.isoformat(),
+        'calculado_desde': base,
+        'stock': [
+            {'producto_cod': cod_venta, 'cantidad': cantidad}
+            for cod_venta, cantidad in sorted(saldos.items())
+        ],
+    })
+
+
 from django.db.models import Sum, Count
 from django.db.models.functions import TruncMonth
+from .models import VentaDiaria
+from .cache_dashboard import obtener_dashboard, version_dashboard
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
@@ -395,21 +388,31 @@ from rest_framework.response import Response
 def dashboard_data(request):
     """
     Endpoint para obtener los datos resumidos para el Dashboard Ejecutivo.
+    Las ventas se leen del resumen VentaDiaria, no de los movimientos.
+
+    La respuesta se guarda en cache hasta que cambian los datos y lleva un
+    ETag: si el cliente envía If-None-Match con el valor vigente recibe 304.
     """
-    # 1. Evolución de Ventas Mensuales
-    ventas_mensuales = MovimientoInventario.objects.filter(
-        tipo=MovimientoInventario.TIPO_VENTA
-    ).annotate(
-        mes=TruncMonth('fecha_hora')
+    version = version_dashboard()
+    etag = f'"dashboard-{version}"'
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    data = obtener_dashboard(version, _calcular_dashboard)
+    return Response(data, headers={'ETag': etag})
+
+
+def _calcular_dashboard():
+    # 1. Evolución de Ventas Mensuales (desde el resumen diario de ventas)
+    ventas_mensuales = VentaDiaria.objects.annotate(
+        mes=TruncMonth('fecha')
     ).values('mes').annotate(
-        total_ventas=Sum('cantidad')
+        total_ventas=Sum('unidades')
     ).order_by('mes')
 
     # 2. Top 5 Productos Más Vendidos
-    top_vendidos = MovimientoInventario.objects.filter(
-        tipo=MovimientoInventario.TIPO_VENTA
-    ).values('producto__descripcion', 'producto__cod_venta').annotate(
-        total_vendido=Sum('cantidad')
+    top_vendidos = VentaDiaria.objects.values('producto__descripcion', 'producto__cod_venta').annotate(
+        total_vendido=Sum('unidades')
     ).order_by('-total_vendido')[:5]
 
     # 3. Distribución de Stock por Ubicación
@@ -427,11 +430,12 @@ def dashboard_data(request):
         'stock_por_ubicacion': list(stock_por_ubicacion),
     }
 
-    return Response(data)
+    return data
 
 # ... (código anterior) ...
 
 from django.contrib.auth import authenticate, login, logout
+from .sesiones import renovar_expiracion
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
@@ -452,6 +456,8 @@ def api_login(request):
 
     if user is not None:
         login(request, user)
+        # Expiración absoluta; RenovarSesionMiddleware la extiende si la sesión sigue en uso
+        renovar_expiracion(request.session)
         # Devolvemos información básica del usuario
         return Response({
             'message': 'Inicio de sesión exitoso.',
@@ -473,6 +479,30 @@ def api_logout(request):
     return Response({'message': 'Sesión cerrada exitosamente.'}, status=status.HTTP_200_OK)
 
 
+from rest_framework.exceptions import ValidationError
+from .models import ProductoStockTotal
+from .serializers import AlertaStockSerializer
+
+class AlertasStockAPIView(generics.ListAPIView):
+    """
+    Productos que necesitan reposición: stock total bajo el mínimo, o bajo el
+    crítico con ?nivel=critico. Los más escasos primero.
+
+    El filtro coincide con la condición de los índices parciales de
+    ProductoStockTotal, así la consulta recorre solo esos productos.
+    """
+    serializer_class = AlertaStockSerializer
+
+    def get_queryset(self):
+        nivel = self.request.query_params.get('nivel', 'minimo')
+        if nivel not in ('minimo', 'critico'):
+            raise ValidationError({'error': "El parámetro 'nivel' debe ser 'minimo' o 'critico'."})
+        umbral = 'stock_critico' if nivel == 'critico' else 'stock_minimo'
+        return ProductoStockTotal.objects.filter(
+            cantidad__lt=F(umbral),
+        ).select_related('producto').order_by('cantidad', 'producto_id')
+
+
 # ... (código anterior) ...
 from django.db.models import Q
 from datetime import datetime
@@ -480,133 +510,204 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import MovimientoInventario, Producto, Ubicacion
 
-@api_view(['GET'])
-def reportes_avanzados(request):
-    """
-    Endpoint para generar reportes avanzados con filtros dinámicos.
-    Acepta parámetros de consulta (query params) para filtrar.
-    """
-    queryset = MovimientoInventario.objects.select_related('producto', 'usuario', 'ubicacion_origen', 'ubicacion_destino').all()
-
-    # --- Filtros Dinámicos ---
-    # Filtro por rango de fechas
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
-    if fecha_inicio:
-        queryset = queryset.filter(fecha_hora__gte=fecha_inicio)
-    if fecha_fin:
-        queryset = queryset.filter(fecha_hora__lte=fecha_fin)
-
-    # Filtro por producto (búsqueda parcial)
-    producto_id = request.GET.get('producto_id')
-    if producto_id:
-        queryset = queryset.filter(producto__cod_venta__icontains=producto_id)
-
-    # Filtro por tipo de movimiento
-    tipo_movimiento = request.GET.get('tipo_movimiento')
-    if tipo_movimiento:
-        queryset = queryset.filter(tipo=tipo_movimiento)
-
-    # Filtro por ubicación (origen o destino)
-    ubicacion_id = request.GET.get('ubicacion_id')
-    if ubicacion_id:
-         queryset = queryset.filter(
-            Q(ubicacion_origen__id=ubicacion_id) | Q(ubicacion_destino__id=ubicacion_id)
-        )
+import json
+from django.http import StreamingHttpResponse
+from .paginacion import codificar_cursor, decodificar_cursor, despues_del_cursor
 
-    # Ordenar por fecha descendente
-    queryset = queryset.order_by('-fecha_hora')
-
-    # Serializar los resultados
-    # Usamos un serializador simple para este reporte
-    data = [
-        {
-            "fecha_hora": mov.fecha_hora.strftime('%Y-%m-%d %H:%M:%S'),
-            "producto_cod": mov.producto.cod_venta,
-            "producto_desc": mov.producto.descripcion,
-            "tipo_display": mov.get_tipo_display(),
-            "cantidad": mov.cantidad,
-            "usuario": mov.usuario.username if mov.usuario else 'Sistema',
-            "origen": mov.ubicacion_origen.nombre if mov.ubicacion_origen else 'N/A',
-            "destino": mov.ubicacion_destino.nombre if mov.ubicacion_destino else 'N/A',
-            "detalle": mov.detalle,
-        }
-        for mov in queryset
-    ]
+from .metricas import midiendo_serializacion
+from .reportes import CAMPOS_REPORTE, REPORTE_CHUNK, fila_reporte, filtrar_reporte
+
+REPORTE_LIMITE = 500
+REPORTE_LIMITE_MAXIMO = 5000
+
+
+def _lineas_reporte(queryset):
+    for mov in queryset.values(*CAMPOS_REPORTE).iterator(chunk_size=REPORTE_CHUNK):
+        yield json.dumps(fila_reporte(mov), ensure_ascii=False) + '\n'
 
-    return Response(data)
 
 @api_view(['GET'])
 def reportes_avanzados(request):
     """
     Endpoint para generar reportes avanzados con filtros dinámicos.
+
+    Devuelve {'results': [...], 'next': cursor} con páginas de ?limite= filas
+    (máximo REPORTE_LIMITE_MAXIMO); 'next' se envía como ?cursor= para pedir
+    la página siguiente y es null en la última. Con ?formato=jsonl devuelve
+    todas las filas como JSON lines en streaming, sin cargarlas en memoria.
     """
-    print("--- INICIO DE REPORTE ---")
-    print("Parámetros recibidos:", request.GET)
+    logger.debug('Reporte solicitado con los parámetros %s', dict(request.GET))
+
+    try:
+        queryset = filtrar_reporte(request.GET)
+        limite = min(int(request.GET.get('limite', REPORTE_LIMITE)), REPORTE_LIMITE_MAXIMO)
+        cursor = decodificar_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if cursor:
+        queryset = despues_del_cursor(queryset, cursor, descendente=True)
+
+    if request.GET.get('formato') == 'jsonl':
+        return StreamingHttpResponse(_lineas_reporte(queryset), content_type='application/x-ndjson')
+
+    pagina = list(queryset.values(*CAMPOS_REPORTE)[:limite + 1])
+    siguiente = None
+    if len(pagina) > limite:
+        pagina = pagina[:limite]
+        siguiente = codificar_cursor(pagina[-1]['fecha_hora'], pagina[-1]['id'])
+
+    with midiendo_serializacion():
+        filas = [fila_reporte(mov) for mov in pagina]
+    return Response({'results': filas, 'next': siguiente})
+
+from django.http import FileResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.views import APIView
+from .reportes import ExportacionNoDisponible, exportar_parquet, exportar_xlsx, lineas_csv
+
+
+class _ArchivoRenderer(BaseRenderer):
+    # Solo sirven para que ?format= elija el tipo de archivo: la vista
+    # devuelve el archivo ya generado y estos renderers no llegan a usarse.
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class CSVRenderer(_ArchivoRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
 
+class XLSXRenderer(_ArchivoRenderer):
+    media_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    format = 'xlsx'
+
+
+class ParquetRenderer(_ArchivoRenderer):
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
+
+
+class ExportarReporteAPIView(APIView):
     """
-    Endpoint para generar reportes avanzados con filtros dinámicos.
+    Exporta el reporte de movimientos con los mismos filtros que
+    reportes_avanzados: ?format=csv (por defecto), xlsx o parquet.
+    El CSV se envía a medida que se lee de la base de datos.
     """
-    queryset = MovimientoInventario.objects.select_related('producto', 'usuario', 'ubicacion_origen', 'ubicacion_destino').all()
+    renderer_classes = [CSVRenderer, XLSXRenderer, ParquetRenderer]
 
-    # --- Filtros Dinámicos ---
-    # Filtro por rango de fechas (CORREGIDO)
-    fecha_inicio_str = request.GET.get('fecha_inicio')
-    fecha_fin_str = request.GET.get('fecha_fin')
+    def get(self, request, *args, **kwargs):
+        try:
+            queryset = filtrar_reporte(request.GET)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    if fecha_inicio_str:
-        # Convertimos el string a un objeto de fecha aware (consciente de la zona horaria)
-        fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date()
-        queryset = queryset.filter(fecha_hora__date__gte=fecha_inicio)
+        formato = request.accepted_renderer.format
+        nombre = f'reporte_facboa.{formato}'
+        if formato == 'csv':
+            respuesta = StreamingHttpResponse(lineas_csv(queryset), content_type='text/csv; charset=utf-8')
+            respuesta['Content-Disposition'] = f'attachment; filename="{nombre}"'
+            return respuesta
 
-    if fecha_fin_str:
-        fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date()
-        queryset = queryset.filter(fecha_hora__date__lte=fecha_fin)
+        try:
+            archivo = exportar_xlsx(queryset) if formato == 'xlsx' else exportar_parquet(queryset)
+        except ExportacionNoDisponible as e:
+            return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        return FileResponse(archivo, as_attachment=True, filename=nombre, content_type=request.accepted_media_type)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Los errores se devuelven en JSON aunque se haya pedido un archivo
+        if isinstance(response, Response):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework.exceptions import PermissionDenied
+from .metricas import registro
+
+
+from .reposicion import (
+    DIAS_COBERTURA,
+    DIAS_VENTANA,
+    destinos_reposicion,
+    nombre_archivo_transferencia,
+    plan_a_csv,
+    planificar_reposicion,
+)
+
+
+def _dias(request, nombre, por_defecto):
+    valor = request.query_params.get(nombre)
+    if valor is None:
+        return por_defecto
+    if not valor.isdigit() or int(valor) < 1:
+        raise ValueError(f"El parámetro '{nombre}' debe ser un número de días mayor que 0.")
+    return int(valor)
 
 
-    # Filtro por producto (búsqueda parcial)
-    producto_id = request.GET.get('producto_id')
-    if producto_id:
-        queryset = queryset.filter(producto__cod_venta__icontains=producto_id)
+@api_view(['GET'])
+def reposicion(request):
+    """
+    Sugiere transferencias desde la bodega principal según la velocidad de venta
+    (ver inventario/reposicion.py). Parámetros: ?ubicacion_id (por defecto todos
+    los puntos activos), ?dias_ventana y ?dias_cobertura. Con ?formato=csv y una
+    ubicacion_id devuelve el archivo tras_bod_LUGAR_AAAAMMDD.csv listo para subir.
+    """
+    try:
+        dias_ventana = _dias(request, 'dias_ventana', DIAS_VENTANA)
+        dias_cobertura = _dias(request, 'dias_cobertura', DIAS_COBERTURA)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Filtro por tipo de movimiento
-    tipo_movimiento = request.GET.get('tipo_movimiento')
-    print(f"Filtro de tipo recibido: {tipo_movimiento}")
-    if tipo_movimiento:
-        queryset = queryset.filter(tipo=tipo_movimiento)
+    try:
+        bodega_principal = Ubicacion.objects.get(tipo=Ubicacion.TIPO_BODEGA_PRINCIPAL)
+    except Ubicacion.DoesNotExist:
+        return Response({'error': 'No se ha definido una "Bodega Principal" en el sistema.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Filtro por ubicación (origen o destino)
-    ubicacion_id = request.GET.get('ubicacion_id')
+    destinos = destinos_reposicion()
+    ubicacion_id = request.query_params.get('ubicacion_id')
     if ubicacion_id:
-         queryset = queryset.filter(
-            Q(ubicacion_origen__id=ubicacion_id) | Q(ubicacion_destino__id=ubicacion_id)
-        )
+        destinos = [ubicacion for ubicacion in destinos if str(ubicacion.pk) == ubicacion_id]
+        if not destinos:
+            return Response({'error': 'La ubicación no existe, no está activa o es la bodega principal.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    formato = request.query_params.get('formato')
+    if formato == 'csv' and not ubicacion_id:
+        return Response({'error': 'Para descargar el CSV de transferencia indica una ubicacion_id.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    plan = planificar_reposicion(bodega_principal, destinos, dias_ventana, dias_cobertura)
+
+    if formato == 'csv':
+        respuesta = HttpResponse(plan_a_csv(plan), content_type='text/csv; charset=utf-8')
+        respuesta['Content-Disposition'] = f'attachment; filename="{nombre_archivo_transferencia(destinos[0])}"'
+        return respuesta
+
+    nombres = {ubicacion.pk: ubicacion.nombre for ubicacion in destinos}
+    plan['ubicacion'] = plan['ubicacion_id'].map(nombres)
+    return Response({
+        'dias_ventana': dias_ventana,
+        'dias_cobertura': dias_cobertura,
+        'results': plan.to_dict('records'),
+    })
 
-    # Ordenar por fecha descendente
-    queryset = queryset.order_by('-fecha_hora')
-    
-    print(f"Cantidad de resultados encontrados: {queryset.count()}")
-    print("--- FIN DE REPORTE ---")
-
-    # Serializar los resultados
-    # Usamos un serializador simple para este reporte
-    data = [
-        {
-            "id": mov.id,
-            "fecha_hora": mov.fecha_hora.strftime('%Y-%m-%d %H:%M:%S'),
-            "producto_cod": mov.producto.cod_venta,
-            "producto_desc": mov.producto.descripcion,
-            "tipo_display": mov.get_tipo_display(),
-            "cantidad": mov.cantidad,
-            "usuario": mov.usuario.username if mov.usuario else 'Sistema',
-            "origen": mov.ubicacion_origen.nombre if mov.ubicacion_origen else 'N/A',
-            "destino": mov.ubicacion_destino.nombre if mov.ubicacion_destino else 'N/A',
-            "detalle": mov.detalle,
-        }
-        for mov in queryset
-    ]
 
-    return Response(data)
+@api_view(['GET'])
+def metricas(request):
+    """
+    Métricas por vista en el formato de texto de Prometheus (ver inventario/metricas.py).
+    Solo existe si METRICAS_EXPONER está activo y solo la ven usuarios staff:
+    Prometheus debe autenticarse con uno (por ejemplo, con un token Bearer).
+    """
+    if not getattr(settings, 'METRICAS_EXPONER', False):
+        raise Http404
+    if not request.user.is_staff:
+        raise PermissionDenied('Las métricas solo están disponibles para usuarios staff.')
+    return HttpResponse(registro.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 class UsuarioViewSet(viewsets.ModelViewSet):
     """
@@ -625,23 +726,27 @@ from rest_framework.response import Response
 from django.db.models import Q
 from .models import Producto
 from .serializers import ProductoSerializer # Asegúrate de tener este serializador
+from .busqueda import BUSQUEDA_LIMITE, BUSQUEDA_LIMITE_MAXIMO, buscar_productos
 
 class ProductoBuscarView(APIView):
     """
-    Endpoint para buscar productos por código de venta o código de fábrica.
-    Acepta un query parameter 'q'.
+    Endpoint para buscar productos por código de venta, código de fábrica o descripción.
+    Acepta un query parameter 'q' y opcionalmente 'limite' (máximo BUSQUEDA_LIMITE_MAXIMO).
+    Los resultados vienen ordenados por relevancia (ver inventario/busqueda.py).
     Ejemplo: /api/productos/buscar/?q=BI0001
     """
     def get(self, request, *args, **kwargs):
-        query = request.GET.get('q', '')
+        query = request.GET.get('q', '').strip()
 
         if len(query) < 2: # No buscar si la consulta es muy corta
             return Response({'results': []})
 
-        # Buscar en cod_venta o id_fabrica, sin distinguir mayúsculas/minúsculas
-        productos = Producto.objects.filter(
-            Q(cod_venta__icontains=query) | Q(id_fabrica__icontains=query)
-        )
+        try:
+            limite = min(int(request.GET.get('limite', BUSQUEDA_LIMITE)), BUSQUEDA_LIMITE_MAXIMO)
+        except ValueError:
+            return Response({'error': "El parámetro 'limite' debe ser un número entero."}, status=status.HTTP_400_BAD_REQUEST)
+
+        productos = buscar_productos(query, max(limite, 1))
 
         serializer = ProductoSerializer(productos, many=True)
         return Response({'results': serializer.data})
@@ -668,14 +773,49 @@ class ProductoViewSet(viewsets.ModelViewSet):
 from rest_framework import viewsets
 from .models import MovimientoInventario
 from .serializers import MovimientoInventarioSerializer # Ya tienes este serializador
+from .serializers import MovimientoEscrituraSerializer, MovimientoLecturaSerializer
+from .servicios import StockInsuficiente, registrar_movimiento
+from .paginacion import PaginacionPorCursor
+from rest_framework.exceptions import ValidationError
 
 class MovimientoViewSet(viewsets.ModelViewSet):
     """
     ViewSet para el modelo de MovimientoInventario.
     Permite crear, leer, actualizar y eliminar movimientos de stock de forma manual.
+
+    El listado acepta los mismos filtros que reportes_avanzados (?fecha_inicio,
+    ?fecha_fin, ?producto_id, ?tipo_movimiento, ?ubicacion_id) y se pagina por
+    cursor (?limite, ?cursor). Trae las relaciones con select_related, así
+    cada página se obtiene con una sola consulta.
     """
-    queryset = MovimientoInventario.objects.all().order_by('-fecha_hora')
+    queryset = MovimientoInventario.objects.select_related(
+        'producto', 'usuario', 'ubicacion_origen', 'ubicacion_destino',
+    ).order_by('-fecha_hora', '-id')
     serializer_class = MovimientoInventarioSerializer
+    pagination_class = PaginacionPorCursor
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            try:
+                queryset = filtrar_reporte(self.request.query_params, queryset)
+            except ValueError as e:
+                raise ValidationError({'error': str(e)})
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve'):
+            return MovimientoLecturaSerializer
+        if self.action == 'create':
+            return MovimientoEscrituraSerializer
+        return MovimientoInventarioSerializer
+
+    def perform_create(self, serializer):
+        # El stock se modifica con UPDATE condicionales (ver inventario/servicios.py)
+        usuario_id = self.request.user.pk if self.request.user.is_authenticated else None
+        try:
+            serializer.instance = registrar_movimiento(usuario_id=usuario_id, **serializer.validated_data)
+        except StockInsuficiente as e:
+            raise ValidationError({'error': str(e)})
     
-    # Usamos la misma configuración que ya funciona para el ProductoViewSet
     # permission_classes = [permissions.IsAuthenticated] # <-- Comentado para que funcione
\ No newline at end of file
@@ -22,6 +22,18 @@ function CsvUploadSection() {
     setter(event.target.files[0]);
   };
 
+  // Consulta el estado de una importación en segundo plano hasta que termine
+  const esperarImportacion = async (jobId) => {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const { data } = await axios.get(`http://127.0.0.1:8000/api/import-jobs/${jobId}/`);
+      if (data.estado === 'completado' || data.estado === 'error') {
+        return data;
+      }
+      setMessage(`Procesando... ${data.filas_procesadas} filas procesadas.`);
+    }
+  };
+
   const handleUpload = async (endpoint, file, filename) => {
     if (!file) {
       setMessage('Por favor, selecciona un archivo.');
@@ -39,7 +51,15 @@ function CsvUploadSection() {
           'Content-Type': 'multipart/form-data',
         },
       });
-      setMessage(response.data.message);
+      // Un archivo repetido que se importa en la misma petición no tiene trabajo que consultar
+      if (response.status === 202 && response.data.job_id) {
+        setMessage(response.data.message);
+        const trabajo = await esperarImportacion(response.data.job_id);
+        const errores = trabajo.errores.length ? ` (${trabajo.errores.length} filas con errores)` : '';
+        setMessage(trabajo.estado === 'error' ? `Error: ${trabajo.mensaje}` : `${trabajo.mensaje}${errores}`);
+      } else {
+        setMessage(response.data.message);
+      }
       // Limpiar el campo de archivo después de una carga exitosa
       if (endpoint === 'carga-inicial-csv') setCargaInicialFile(null);
       if (endpoint === 'transferencia-csv') setTransferenciaFile(null);
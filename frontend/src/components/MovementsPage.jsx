@@ -33,6 +33,8 @@ const TIPO_MOVIMIENTO_OPCIONES = [
 
 function MovementsPage() {
   const [movements, setMovements] = useState([]);
+  // Cursor de la página siguiente de movimientos (null si no hay más)
+  const [siguiente, setSiguiente] = useState(null);
   const [productos, setProductos] = useState([]);
   const [ubicaciones, setUbicaciones] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -58,13 +60,28 @@ function MovementsPage() {
         axios.get('http://127.0.0.1:8000/api/productos/'),
         axios.get('http://127.0.0.1:8000/api/ubicaciones/'),
       ]);
-      setMovements(movimientosRes.data);
+      setMovements(movimientosRes.data.results);
+      setSiguiente(movimientosRes.data.next);
       setProductos(productosRes.data);
       setUbicaciones(ubicacionesRes.data);
     };
     fetchData();
   }, []);
 
+  // Agrega la página siguiente a los movimientos ya cargados
+  const handleLoadMore = async () => {
+    setLoading(true);
+    try {
+      const response = await axios.get(`http://127.0.0.1:8000/api/movimientos/?cursor=${siguiente}`);
+      setMovements((prev) => [...prev, ...response.data.results]);
+      setSiguiente(response.data.next);
+    } catch (error) {
+      console.error("Error al cargar más movimientos:", error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const handleInputChange = (e) => {
     const { name, value } = e.target;
     setNewMovement((prev) => ({ ...prev, [name]: value }));
@@ -89,7 +106,8 @@ function MovementsPage() {
       });
       // Recargar la lista de movimientos
       const response = await axios.get('http://127.0.0.1:8000/api/movimientos/');
-      setMovements(response.data);
+      setMovements(response.data.results);
+      setSiguiente(response.data.next);
     } catch (error) {
       console.error("Error al crear el movimiento:", error);
       alert('Hubo un error al crear el movimiento.');
@@ -189,6 +207,13 @@ function MovementsPage() {
           getRowId={(row) => row.id}
         />
       </Paper>
+      {siguiente && (
+        <Box sx={{ mt: 2, display: 'flex', justifyContent: 'center' }}>
+          <Button variant="outlined" onClick={handleLoadMore} disabled={loading}>
+            {loading ? <CircularProgress size={24} color="inherit" /> : 'Cargar más movimientos'}
+          </Button>
+        </Box>
+      )}
     </Container>
   );
 }
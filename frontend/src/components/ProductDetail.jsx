@@ -18,6 +18,7 @@ import {
   TableRow,
   CircularProgress,
   Alert,
+  Button,
 } from '@mui/material';
 
 function ProductDetail() {
@@ -47,6 +48,17 @@ function ProductDetail() {
     fetchTrazabilidad();
   }, [cod_venta]);
 
+  // El Kardex viene paginado: 'siguiente' es el cursor de la página que sigue
+  const cargarMas = async () => {
+    const response = await axios.get(`http://127.0.0.1:8000/api/trazabilidad/${cod_venta}/`, {
+      params: { cursor: data.siguiente },
+    });
+    setData({
+      ...response.data,
+      movimientos: [...data.movimientos, ...response.data.movimientos],
+    });
+  };
+
   // --- Estados de Renderizado ---
 
   if (loading) {
@@ -107,7 +119,7 @@ function ProductDetail() {
             <TableBody>
               {data.movimientos.length > 0 ? (
                 data.movimientos.map((mov) => (
-                  <TableRow key={mov.fecha_hora}>
+                  <TableRow key={mov.id}>
                     <TableCell>{new Date(mov.fecha_hora).toLocaleString()}</TableCell>
                     <TableCell>{mov.tipo_display}</TableCell>
                     <TableCell>{mov.cantidad}</TableCell>
@@ -133,6 +145,11 @@ function ProductDetail() {
             </TableBody>
           </Table>
         </TableContainer>
+        {data.siguiente && (
+          <Box display="flex" justifyContent="center" mt={2}>
+            <Button variant="outlined" onClick={cargarMas}>Cargar más movimientos</Button>
+          </Box>
+        )}
       </Paper>
     </Container>
   );
@@ -33,6 +33,8 @@ function ReportsPage() {
   const { user } = useAuth();
   const [reportesData, setReportesData] = useState([]);
   const [loading, setLoading] = useState(false);
+  // Cursor de la página siguiente del reporte (null si no hay más)
+  const [siguiente, setSiguiente] = useState(null);
   const [productos, setProductos] = useState([]);
   const [ubicaciones, setUbicaciones] = useState([]);
 
@@ -66,19 +68,27 @@ function ReportsPage() {
     });
   };
 
-  // Función para generar el reporte
-  const handleGenerateReport = async () => {
+  // Parámetros de filtro que se envían al backend
+  const buildParams = () => {
+    const params = new URLSearchParams();
+    if (filtros.fechaInicio) params.append('fecha_inicio', filtros.fechaInicio);
+    if (filtros.fechaFin) params.append('fecha_fin', filtros.fechaFin);
+    if (filtros.productoId) params.append('producto_id', filtros.productoId);
+    if (filtros.tipoMovimiento) params.append('tipo_movimiento', filtros.tipoMovimiento);
+    if (filtros.ubicacionId) params.append('ubicacion_id', filtros.ubicacionId);
+    return params;
+  };
+
+  // Pide una página del reporte; con cursor, agrega las filas a las ya cargadas
+  const fetchReportPage = async (cursor = null) => {
     setLoading(true);
     try {
-      const params = new URLSearchParams();
-      if (filtros.fechaInicio) params.append('fecha_inicio', filtros.fechaInicio);
-      if (filtros.fechaFin) params.append('fecha_fin', filtros.fechaFin);
-      if (filtros.productoId) params.append('producto_id', filtros.productoId);
-      if (filtros.tipoMovimiento) params.append('tipo_movimiento', filtros.tipoMovimiento);
-      if (filtros.ubicacionId) params.append('ubicacion_id', filtros.ubicacionId);
+      const params = buildParams();
+      if (cursor) params.append('cursor', cursor);
 
       const response = await axios.get(`http://127.0.0.1:8000/api/reportes/?${params.toString()}`);
-      setReportesData(response.data);
+      setReportesData(prev => (cursor ? [...prev, ...response.data.results] : response.data.results));
+      setSiguiente(response.data.next);
     } catch (error) {
       console.error("Error al generar el reporte", error);
       // Aquí podrías mostrar un mensaje de error al usuario
@@ -86,28 +96,16 @@ function ReportsPage() {
       setLoading(false);
     }
   };
-  
-  // Función para exportar a CSV
-  const handleExportCSV = () => {
-    const headers = ['Fecha Hora', 'Producto Código', 'Producto Descripción', 'Tipo', 'Cantidad', 'Usuario', 'Origen', 'Destino', 'Detalle'];
-    const csvRows = reportesData.map(row => [
-      row.fecha_hora,
-      row.producto_cod,
-      row.producto_desc,
-      row.tipo_display,
-      row.cantidad,
-      row.usuario,
-      row.origen,
-      row.destino,
-      row.detalle,
-    ]);
 
-    const csvContent = [headers, ...csvRows].map(e => e.join(",")).join("\n");
-    const blob = new Blob([csvContent], { type: 'text/csv;charset=utf-8;' });
+  // Función para generar el reporte
+  const handleGenerateReport = () => fetchReportPage();
+  
+  // Exportar: el archivo lo genera el servidor con los mismos filtros del reporte
+  const handleExport = (formato) => {
+    const params = buildParams();
+    params.append('format', formato);
     const link = document.createElement("a");
-    const url = URL.createObjectURL(blob);
-    link.setAttribute("href", url);
-    link.setAttribute("download", "reporte_facboa.csv");
+    link.setAttribute("href", `http://127.0.0.1:8000/api/reportes/export/?${params.toString()}`);
     link.style.visibility = 'hidden';
     document.body.appendChild(link);
     link.click();
@@ -252,10 +250,18 @@ function ReportsPage() {
       </Paper>
       
       {reportesData.length > 0 && (
-         <Box sx={{ mt: 2, display: 'flex', justifyContent: 'flex-end' }}>
-            <Button variant="outlined" onClick={handleExportCSV}>
+         <Box sx={{ mt: 2, display: 'flex', justifyContent: 'flex-end', gap: 2 }}>
+            {siguiente && (
+              <Button variant="text" onClick={() => fetchReportPage(siguiente)} disabled={loading}>
+                Cargar más resultados
+              </Button>
+            )}
+            <Button variant="outlined" onClick={() => handleExport('csv')}>
               Exportar a CSV
             </Button>
+            <Button variant="outlined" onClick={() => handleExport('xlsx')}>
+              Exportar a Excel
+            </Button>
          </Box>
       )}
 